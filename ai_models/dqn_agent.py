@@ -73,16 +73,19 @@ class ReplayBuffer:
 class DQNAgent:
     """DQN Agent for Load Balancing"""
     
-    def __init__(self, state_size, action_size, hidden_layers=[128, 64]):
+    def __init__(self, state_size, action_size, hidden_layers=[128, 64], verbose=True):
         """
         Initialize DQN Agent
         Args:
             state_size: dimension of network state (e.g., number of links)
             action_size: number of possible routing paths
             hidden_layers: hidden layer sizes
+            verbose: print the device and network size
         """
         self.state_size = state_size
+        self.verbose = verbose
         self.action_size = action_size
+        self.hidden_layers = hidden_layers
         
         # Get configuration
         config = AI_MODELS['dqn']
@@ -115,9 +118,10 @@ class DQNAgent:
         self.losses = []
         self.update_count = 0
         
-        print(f"DQN Agent initialized on {self.device}")
-        print(f"State size: {state_size}, Action size: {action_size}")
-        print(f"Policy network parameters: {sum(p.numel() for p in self.policy_net.parameters())}")
+        if verbose:
+            print(f"DQN Agent initialized on {self.device}")
+            print(f"State size: {state_size}, Action size: {action_size}")
+            print(f"Policy network parameters: {sum(p.numel() for p in self.policy_net.parameters())}")
     
     def select_action(self, state, training=True):
         """
@@ -138,6 +142,31 @@ class DQNAgent:
                 q_values = self.policy_net(state_tensor)
                 return q_values.argmax().item()
     
+    def states_to_tensor(self, states):
+        """
+        Convert a batch of state vectors to a tensor on the agent's device
+        Args:
+            states: array of shape (batch, state_size)
+        Returns:
+            float tensor (shares memory with a float32 CPU array)
+        """
+        return torch.as_tensor(np.asarray(states, dtype=np.float32)).to(self.device)
+    
+    def select_actions(self, states):
+        """
+        Greedy actions for a batch of states in a single forward pass
+        Args:
+            states: array or tensor of shape (batch, state_size)
+        Returns:
+            list of action indices
+        """
+        if not torch.is_tensor(states):
+            states = self.states_to_tensor(states)
+        
+        with torch.no_grad():
+            q_values = self.policy_net(states)
+            return q_values.argmax(dim=1).tolist()
+    
     def store_experience(self, state, action, reward, next_state, done):
         """Store experience in replay buffer"""
         self.memory.push(state, action, reward, next_state, done)
@@ -331,7 +360,8 @@ class DQNAgent:
         self.epsilon = checkpoint['epsilon']
         self.episode_rewards = checkpoint['episode_rewards']
         self.losses = checkpoint['losses']
-        print(f"Agent loaded from {filepath}")
+        if self.verbose:
+            print(f"Agent loaded from {filepath}")
 
 
 class NetworkEnvironment:
@@ -53,8 +53,9 @@ class LSTMPredictor(nn.Module):
 class TrafficPredictor:
     """Traffic Prediction System using LSTM"""
     
-    def __init__(self, sequence_length=10, hidden_size=64, num_layers=2):
+    def __init__(self, sequence_length=10, hidden_size=64, num_layers=2, verbose=True):
         self.sequence_length = sequence_length
+        self.verbose = verbose
         self.hidden_size = hidden_size
         self.num_layers = num_layers
         
@@ -85,8 +86,9 @@ class TrafficPredictor:
         self.train_losses = []
         self.val_losses = []
         
-        print(f"Traffic Predictor initialized on {self.device}")
-        print(f"Model parameters: {sum(p.numel() for p in self.model.parameters())} total")
+        if verbose:
+            print(f"Traffic Predictor initialized on {self.device}")
+            print(f"Model parameters: {sum(p.numel() for p in self.model.parameters())} total")
     
     def prepare_sequences(self, data, sequence_length):
         """
@@ -250,7 +252,19 @@ class TrafficPredictor:
             dict with congestion info
         """
         future_predictions = self.predict_future(sequence, steps=5)
-        
+        return self.congestion_from_predictions(sequence, future_predictions, threshold)
+    
+    @staticmethod
+    def congestion_from_predictions(sequence, future_predictions, threshold=80.0):
+        """
+        Build the congestion report for predictions computed elsewhere (e.g. an inference worker)
+        Args:
+            sequence: recent traffic data
+            future_predictions: predicted values
+            threshold: congestion threshold
+        Returns:
+            dict with congestion info
+        """
         congestion_detected = any(pred > threshold for pred in future_predictions)
         max_predicted = max(future_predictions)
         
@@ -258,7 +272,7 @@ class TrafficPredictor:
             'congestion_detected': congestion_detected,
             'max_predicted_utilization': max_predicted,
             'predictions': future_predictions,
-            'current_utilization': sequence[-1] if sequence else 0
+            'current_utilization': sequence[-1] if len(sequence) else 0
         }
     
     def save_model(self, filepath):
@@ -283,7 +297,8 @@ class TrafficPredictor:
         self.data_max = checkpoint['data_max']
         self.train_losses = checkpoint['train_losses']
         self.val_losses = checkpoint['val_losses']
-        print(f"Model loaded from {filepath}")
+        if self.verbose:
+            print(f"Model loaded from {filepath}")
 
 
 def generate_sample_traffic_data(num_samples=1000):
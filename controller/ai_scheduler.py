@@ -0,0 +1,283 @@
+"""
+AI Scheduler - Bộ lập lịch AI theo sự kiện
+Chạy dự đoán nghẽn khi có port stats mới hoặc mức sử dụng link tăng đột biến, chỉ cho các link có dữ liệu thay đổi
+"""
+
+import time
+from collections import deque
+
+from ryu.lib import hub
+
+
+class AIScheduler:
+    """
+    Event-driven congestion prediction
+    Every port stats reply marks the links whose utilization changed as
+    dirty; the samples themselves are kept by the monitor, which returns
+    each link's last `sequence_length` polling epochs as one row of a
+    (links, sequence_length) window. A reply schedules a prediction run
+    `coalesce_window` seconds later, so the replies of one polling round
+    (which arrive staggered across switches) share a run; a utilization jump
+    of at least `jump_threshold` points schedules it immediately. Runs are at
+    least `min_spacing` seconds apart and triggers arriving while a run is
+    pending are coalesced into it. Each run predicts only the dirty links.
+    Detection-to-action latency is measured from the arrival of the oldest
+    unprocessed sample of a link to the congestion callback for that link.
+    """
+    
+    def __init__(self, check_congestion, on_congestion, windows, sequence_length=10,
+                 min_spacing=1.0, coalesce_window=0.5, jump_threshold=20.0,
+                 request_timeout=1.0, history=1000, logger=None):
+        """
+        Args:
+            check_congestion: callable(sequence) -> Future resolving to a congestion report
+                              (TrafficPredictor.congestion_from_predictions format)
+            on_congestion: callable(link, report) for each link predicted to congest
+            windows: callable(sequence_length, links) -> (links, array (len(links), sequence_length))
+                     of the links with enough history (NetworkMonitor.get_traffic_data_for_prediction)
+            sequence_length: samples per link fed to the predictor
+            min_spacing: minimum seconds between two prediction runs
+            coalesce_window: delay of a run triggered by a regular stats epoch
+            jump_threshold: utilization change (percentage points) that triggers a run at once
+            request_timeout: seconds to wait for one prediction
+            history: detection-to-action latency samples kept
+            logger: logger for errors
+        """
+        self.check_congestion = check_congestion
+        self.on_congestion = on_congestion
+        self.windows = windows
+        self.sequence_length = sequence_length
+        self.min_spacing = min_spacing
+        self.coalesce_window = coalesce_window
+        self.jump_threshold = jump_threshold
+        self.request_timeout = request_timeout
+        self.logger = logger
+        
+        self._last = {}  # {(dpid, port): latest utilization}
+        self._dirty = {}  # {(dpid, port): arrival time of the oldest unprocessed sample}
+        self.reports = {}  # {(dpid, port): latest congestion report}
+        
+        self._due = None  # monotonic time of the pending run
+        self._last_run = float('-inf')
+        self._wakeup = hub.Event()
+        
+        # Statistics
+        self.epoch_triggers = 0
+        self.jump_triggers = 0
+        self.coalesced = 0
+        self.runs = 0
+        self.links_predicted = 0
+        self.errors = 0
+        self._latencies = deque(maxlen=history)
+        
+        self._thread = hub.spawn(self._run)
+    
+    def on_port_stats(self, dpid, utilization, now=None):
+        """
+        Record a port stats epoch of one switch (NetworkMonitor stats listener)
+        Args:
+            dpid: switch the reply came from
+            utilization: {port_no: avg_utilization}
+            now: monotonic arrival time (defaults to time.monotonic())
+        """
+        if now is None:
+            now = time.monotonic()
+        
+        jump = False
+        changed = False
+        for port_no, value in utilization.items():
+            link = (dpid, port_no)
+            previous = self._last.get(link)
+            self._last[link] = value
+            if previous is not None and value == previous:
+                continue
+            if previous is not None and abs(value - previous) >= self.jump_threshold:
+                jump = True
+            self._dirty.setdefault(link, now)
+            changed = True
+        
+        if not changed:
+            return
+        if jump:
+            self.jump_triggers += 1
+            self._schedule(now)
+        else:
+            self.epoch_triggers += 1
+            self._schedule(now + self.coalesce_window)
+    
+    def _schedule(self, at):
+        """Request a run no earlier than `at`, merging with a pending one"""
+        at = max(at, self._last_run + self.min_spacing)
+        if self._due is not None:
+            self.coalesced += 1
+            if self._due <= at:
+                return
+        self._due = at
+        self._wakeup.set()
+    
+    def _run(self):
+        """Wait for the pending run to become due"""
+        while True:
+            self._wakeup.clear()
+            if self._due is None:
+                self._wakeup.wait()
+                continue
+            
+            delay = self._due - time.monotonic()
+            if delay > 0:
+                # Woken early if a jump moves the run forward
+                self._wakeup.wait(timeout=delay)
+                continue
+            
+            self._due = None
+            self._last_run = time.monotonic()
+            try:
+                self._predict_dirty()
+            except Exception as e:
+                if self.logger:
+                    self.logger.error(f"Error in AI scheduler run: {e}")
+    
+    def _predict_dirty(self):
+        """Predict every link whose samples changed since the last run"""
+        dirty, self._dirty = self._dirty, {}
+        if not dirty:
+            return
+        self.runs += 1
+        
+        # Links without enough history yet are left out of the window
+        links, window = self.windows(self.sequence_length, list(dirty))
+        
+        # Submit everything first so worker predictions overlap
+        pending = []
+        for link, sequence in zip(links, window.tolist()):
+            pending.append((link, dirty[link], self.check_congestion(sequence)))
+        self.links_predicted += len(pending)
+        
+        for link, since, future in pending:
+            try:
+                report = future.result(timeout=self.request_timeout)
+            except Exception as e:
+                self.errors += 1
+                if self.logger:
+                    self.logger.error(f"Congestion prediction failed for link {link}: {e}")
+                continue
+            
+            self.reports[link] = report
+            if report['congestion_detected']:
+                self.on_congestion(link, report)
+                self._latencies.append(time.monotonic() - since)
+    
+    def remove_switch(self, dpid):
+        """Forget the links of a disconnected switch"""
+        for table in (self._last, self._dirty, self.reports):
+            for link in [link for link in table if link[0] == dpid]:
+                del table[link]
+    
+    def get_statistics(self):
+        """
+        Trigger counts and detection-to-action latency distribution
+        Returns:
+            dict of counters and latency percentiles in ms
+        """
+        latencies = sorted(self._latencies)
+        
+        def percentile(p):
+            if not latencies:
+                return 0.0
+            return latencies[min(len(latencies) - 1, int(p * len(latencies)))] * 1000
+        
+        return {
+            'epoch_triggers': self.epoch_triggers,
+            'jump_triggers': self.jump_triggers,
+            'coalesced': self.coalesced,
+            'runs': self.runs,
+            'links_tracked': len(self._last),
+            'links_predicted': self.links_predicted,
+            'errors': self.errors,
+            'actions': len(latencies),
+            'latency_p50_ms': percentile(0.50),
+            'latency_p90_ms': percentile(0.90),
+            'latency_p99_ms': percentile(0.99),
+            'latency_max_ms': latencies[-1] * 1000 if latencies else 0.0
+        }
+
+
+if __name__ == "__main__":
+    # Simulation with time scaled 1:100 (5 s polling -> 50 ms): 4 switches x 8 ports,
+    # port 1 of switch 1 ramping towards congestion. The fixed loop checks every
+    # link each 10 s (100 ms); the scheduler reacts to the stats epochs. Latency is
+    # measured from the first sample that predicts congestion to the action.
+    import random
+    import numpy as np
+    from controller.futures import Future
+    
+    SCALE = 100.0
+    INTERVAL = 5.0 / SCALE
+    THRESHOLD = 80.0
+    HOT_LINK = (1, 1)
+    
+    def check(sequence):
+        # Linear extrapolation stands in for the LSTM
+        future = Future()
+        slope = sequence[-1] - sequence[-2]
+        predictions = [sequence[-1] + slope * step for step in range(1, 6)]
+        future.set_result({'congestion_detected': max(predictions) > THRESHOLD,
+                           'max_predicted_utilization': max(predictions),
+                           'predictions': predictions})
+        return future
+    
+    def simulate(use_scheduler, seed):
+        random.seed(seed)
+        history = {}
+        detected_at = []
+        acted_at = []
+        
+        def windows(length, links):
+            links = [link for link in links if len(history.get(link, ())) >= length]
+            return links, np.array([history[link][-length:] for link in links]).reshape(-1, length)
+        
+        def on_congestion(link, report):
+            if link == HOT_LINK and not acted_at:
+                acted_at.append(time.monotonic())
+        
+        if use_scheduler:
+            scheduler = AIScheduler(check, on_congestion, windows, min_spacing=1.0 / SCALE,
+                                    coalesce_window=0.5 / SCALE)
+            thread = scheduler._thread
+        else:
+            def fixed_loop():
+                while True:
+                    hub.sleep(10.0 / SCALE)
+                    for link, samples in history.items():
+                        if len(samples) >= 10 and check(samples[-10:]).result()['congestion_detected']:
+                            on_congestion(link, None)
+            
+            thread = hub.spawn(fixed_loop)
+        
+        hub.sleep(random.random() * INTERVAL)
+        ramp_start = random.randint(10, 14)
+        for epoch in range(40):
+            for dpid in (1, 2, 3, 4):
+                utilization = {port: 20.0 + random.random() for port in range(1, 9)}
+                if dpid == 1:
+                    utilization[1] = 30.0 + max(0, epoch - ramp_start) * 8.0
+                for port, value in utilization.items():
+                    history.setdefault((dpid, port), []).append(value)
+                if use_scheduler:
+                    scheduler.on_port_stats(dpid, utilization)
+                
+                samples = history[HOT_LINK]
+                if dpid == 1 and not detected_at and len(samples) >= 10 and \
+                        check(samples[-10:]).result()['congestion_detected']:
+                    detected_at.append(time.monotonic())
+                hub.sleep(INTERVAL / 4)  # replies of one round arrive staggered
+            if acted_at:
+                break
+        
+        hub.kill(thread)
+        return (acted_at[0] - detected_at[0]) * SCALE
+    
+    for name, use_scheduler in [('Fixed 10 s loop', False), ('Event-driven  ', True)]:
+        latencies = sorted(simulate(use_scheduler, seed) for seed in range(10))
+        print(f"{name}: detection-to-action median {latencies[len(latencies) // 2]:.2f} s, "
+              f"max {latencies[-1]:.2f} s (10 runs)")
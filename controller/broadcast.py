@@ -0,0 +1,269 @@
+"""
+Broadcast - Quảng bá theo cây khung bằng group table và ARP proxy
+Cây quảng bá được cài vào switch dưới dạng group ALL; controller trả lời ARP từ bảng vị trí host
+"""
+
+from controller.packet_parser import ETH_TYPE_ARP, ARP_REQUEST, ARP_REPLY, build_arp
+
+BROADCAST_MAC = 'ff:ff:ff:ff:ff:ff'
+
+
+class ArpProxy:
+    """
+    Answers ARP requests from the global host table
+    A request for an address whose owner the controller has already seen
+    is answered with a PacketOut on the requester's port, so it is never
+    broadcast. Requests for unknown addresses, gratuitous ARP and tagged
+    frames are left to the broadcast path.
+    """
+    
+    def __init__(self, host_table):
+        """
+        Args:
+            host_table: HostTable mapping IPv4 addresses to hosts
+        """
+        self.host_table = host_table
+        
+        # Statistics
+        self.answered = 0
+        self.unknown = 0
+    
+    def reply(self, headers):
+        """
+        ARP reply to a request, when the target is known
+        Args:
+            headers: PacketHeaders of an ARP frame
+        Returns:
+            reply frame bytes, or None if the request has to be broadcast
+        """
+        if headers.arp_op != ARP_REQUEST or headers.vlan_id is not None or \
+                headers.ip_src == headers.ip_dst:
+            return None
+        
+        owner = self.host_table.lookup_ip(headers.ip_dst)
+        if owner is None or owner[0] == headers.eth_src:
+            self.unknown += 1
+            return None
+        
+        self.answered += 1
+        return build_arp(ARP_REPLY, owner[0], headers.ip_dst, headers.eth_src, headers.ip_src)
+    
+    def get_statistics(self):
+        """Get answered / broadcast request counts"""
+        return {'answered': self.answered, 'unknown': self.unknown}
+
+
+class BroadcastGroups:
+    """
+    Broadcast tree installed in the switches
+    Each switch gets an ALL group with one bucket per port of the broadcast
+    tree (tree inter-switch ports and host ports) and entries sending
+    broadcast frames to it, so a broadcast crosses the network in the
+    datapath instead of causing a PacketIn at every switch. A switch never
+    outputs a packet on its ingress port, and broadcasts arriving on
+    inter-switch ports off the tree are dropped, so meshes cannot loop.
+    With the ARP proxy, ARP broadcasts from hosts go to the controller
+    first; it answers them or releases them into the group.
+    sync() compares a switch with what was last installed and only emits
+    the group and entries that changed.
+    """
+    
+    def __init__(self, topology, group_id=1, priority=20, table_id=0, arp_to_controller=True):
+        """
+        Args:
+            topology: TopologyGraph (broadcast tree and port roles)
+            group_id: group id used on every switch
+            priority: base priority of the broadcast entries (uses priority..priority+2)
+            table_id: table holding the entries (forwarding table of the pipeline)
+            arp_to_controller: send ARP broadcasts from hosts to the controller
+        """
+        self.topology = topology
+        self.group_id = group_id
+        self.priority = priority
+        self.table_id = table_id
+        self.arp_to_controller = arp_to_controller
+        
+        self._installed = {}  # {dpid: {'buckets': [port], 'ports': {switch port: on tree}}}
+        
+        # Statistics
+        self.group_mods = 0
+        self.flow_mods = 0
+    
+    def installed(self, dpid):
+        """True if the switch has the broadcast group"""
+        return dpid in self._installed
+    
+    def forget(self, dpid):
+        """Switch reconnected or left: its group and entries are gone"""
+        self._installed.pop(dpid, None)
+    
+    def sync(self, datapath):
+        """
+        Messages bringing a switch's group and entries up to date
+        Returns:
+            list of OFPGroupMod / OFPFlowMod (empty if nothing changed or
+            the switch's ports are not known yet)
+        """
+        dpid = datapath.id
+        ofproto = datapath.ofproto
+        parser = datapath.ofproto_parser
+        
+        buckets = self.topology.flood_ports(dpid)
+        if buckets is None:
+            return []
+        tree = self.topology.broadcast_ports(dpid)
+        ports = {port: port in tree for port in self.topology.ports.get(dpid, ())
+                 if self.topology.is_switch_port(dpid, port)}
+        
+        previous = self._installed.get(dpid)
+        mods = []
+        to_group = [parser.OFPActionGroup(self.group_id)]
+        
+        if previous is None:
+            # The group may survive from an earlier connection or another shard
+            mods.append(parser.OFPGroupMod(datapath, ofproto.OFPGC_DELETE, ofproto.OFPGT_ALL,
+                                           self.group_id, []))
+            mods.append(self._group_mod(datapath, ofproto.OFPGC_ADD, buckets))
+            if self.arp_to_controller:
+                mods.append(self._flow(datapath, self.priority + 1,
+                                       parser.OFPMatch(eth_type=ETH_TYPE_ARP, eth_dst=BROADCAST_MAC),
+                                       [parser.OFPActionOutput(ofproto.OFPP_CONTROLLER,
+                                                               ofproto.OFPCML_NO_BUFFER)], apply=True))
+            mods.append(self._flow(datapath, self.priority, parser.OFPMatch(eth_dst=BROADCAST_MAC),
+                                   to_group))
+        elif previous['buckets'] != buckets:
+            mods.append(self._group_mod(datapath, ofproto.OFPGC_MODIFY, buckets))
+        
+        # Inter-switch ports: copies on the tree go on through the group, others are dropped
+        old_ports = previous['ports'] if previous else {}
+        for port, on_tree in ports.items():
+            if old_ports.get(port) != on_tree:
+                mods.append(self._flow(datapath, self.priority + 2,
+                                       parser.OFPMatch(in_port=port, eth_dst=BROADCAST_MAC),
+                                       to_group if on_tree else []))
+        for port in old_ports.keys() - ports.keys():
+            mods.append(parser.OFPFlowMod(datapath=datapath, table_id=self.table_id,
+                                          command=ofproto.OFPFC_DELETE_STRICT,
+                                          priority=self.priority + 2,
+                                          match=parser.OFPMatch(in_port=port, eth_dst=BROADCAST_MAC),
+                                          out_port=ofproto.OFPP_ANY, out_group=ofproto.OFPG_ANY))
+        
+        self._installed[dpid] = {'buckets': buckets, 'ports': ports}
+        self.group_mods += sum(1 for mod in mods if type(mod).__name__ == 'OFPGroupMod')
+        self.flow_mods += sum(1 for mod in mods if type(mod).__name__ == 'OFPFlowMod')
+        return mods
+    
+    def _group_mod(self, datapath, command, ports):
+        parser = datapath.ofproto_parser
+        buckets = [parser.OFPBucket(actions=[parser.OFPActionOutput(port)]) for port in ports]
+        return parser.OFPGroupMod(datapath, command, datapath.ofproto.OFPGT_ALL, self.group_id, buckets)
+    
+    def _flow(self, datapath, priority, match, actions, apply=False):
+        """
+        Broadcast entry; in a later table of the pipeline the output is
+        written to the action set so the QoS queue set in table 0 applies
+        """
+        ofproto = datapath.ofproto
+        parser = datapath.ofproto_parser
+        if not actions:
+            inst = []
+        elif apply or self.table_id == 0:
+            inst = [parser.OFPInstructionActions(ofproto.OFPIT_APPLY_ACTIONS, actions)]
+        else:
+            inst = [parser.OFPInstructionActions(ofproto.OFPIT_WRITE_ACTIONS, actions)]
+        return parser.OFPFlowMod(datapath=datapath, table_id=self.table_id, priority=priority,
+                                 match=match, instructions=inst)
+    
+    def get_statistics(self):
+        """Get switches with the broadcast group and messages sent"""
+        return {
+            'switches': len(self._installed),
+            'group_mods': self.group_mods,
+            'flow_mods': self.flow_mods
+        }
+
+
+if __name__ == "__main__":
+    # PacketIns of the `normal` traffic scenario (traffic_generator.py) on the
+    # create_simple_topology mesh, two hosts per switch on ports 1-2. Every flow
+    # starts with the client's ARP request, the server's unicast reply, then the
+    # first packet in each direction; a unicast PacketIn installs the path on
+    # every hop (per in_port/src/dst entries, as _install_path does). Run twice:
+    # the second round after the hosts' ARP caches and idle rules expired.
+    from controller.topology import TopologyGraph
+    from controller.host_table import HostTable
+    from controller.packet_parser import parse_packet
+    
+    LINKS = [(1, 3, 2, 3), (2, 4, 3, 3), (3, 4, 4, 3), (1, 4, 3, 5), (2, 5, 4, 4)]
+    FLOWS = [('h1', 'h3'), ('h2', 'h4'), ('h5', 'h7'), ('h6', 'h8')]
+    hosts = {f'h{i}': {'mac': f'00:00:00:00:00:{i:02x}', 'ip': f'10.0.0.{i}',
+                       'dpid': (i + 1) // 2, 'port': 2 - i % 2} for i in range(1, 9)}
+    
+    topology = TopologyGraph()
+    for dpid in range(1, 5):
+        topology.add_switch(dpid, [1, 2] + [pa for a, pa, _, _ in LINKS if a == dpid] +
+                            [pb for _, _, b, pb in LINKS if b == dpid])
+    for a, pa, b, pb in LINKS:
+        topology.add_link(a, b, pa, pb)
+        topology.add_link(b, a, pb, pa)
+    
+    def neighbor(dpid, port):
+        for a, pa, b, pb in LINKS:
+            if (a, pa) == (dpid, port):
+                return b, pb
+            if (b, pb) == (dpid, port):
+                return a, pa
+        return None
+    
+    def broadcast_switches(dpid, in_port):
+        """Switches a broadcast entering at (dpid, in_port) reaches along the tree"""
+        reached = []
+        pending = [(dpid, in_port)]
+        while pending:
+            switch, port = pending.pop()
+            reached.append(switch)
+            for out_port in topology.broadcast_ports(switch) - {port}:
+                pending.append(neighbor(switch, out_port))
+        return reached
+    
+    def run(groups_and_proxy, rounds=2):
+        table = HostTable()
+        proxy = ArpProxy(table)
+        counts = []
+        for _ in range(rounds):
+            rules = set()  # (src, dst) with a path installed
+            packet_ins = 0
+            
+            def unicast(src, dst):
+                nonlocal packet_ins
+                if (src['mac'], dst['mac']) not in rules:
+                    packet_ins += 1
+                    table.learn(src['mac'], src['dpid'], src['port'], 0, ip=src['ip'])
+                    rules.add((src['mac'], dst['mac']))
+            
+            for client, server in FLOWS:
+                client, server = hosts[client], hosts[server]
+                request = parse_packet(build_arp(ARP_REQUEST, client['mac'], client['ip'],
+                                                 '00:00:00:00:00:00', server['ip'], eth_dst=BROADCAST_MAC))
+                # Edge switch PacketIn (table-miss, or the ARP entry)
+                packet_ins += 1
+                table.learn(client['mac'], client['dpid'], client['port'], 0, ip=client['ip'])
+                if groups_and_proxy and proxy.reply(request) is not None:
+                    answered = True
+                else:
+                    answered = False
+                    if not groups_and_proxy:
+                        # Controller floods along the tree: one PacketIn per further switch
+                        packet_ins += len(broadcast_switches(client['dpid'], client['port'])) - 1
+                if not answered:
+                    unicast(server, client)  # ARP reply
+                unicast(client, server)
+                unicast(server, client)
+            counts.append(packet_ins)
+        return counts, proxy.answered
+    
+    before, _ = run(False)
+    after, answered = run(True)
+    print(f"`normal` scenario on the 4-switch mesh ({len(FLOWS)} flows), PacketIns per round:")
+    print(f"  Tree flooding through the controller:  {before}")
+    print(f"  Broadcast groups + ARP proxy:          {after} ({answered} ARP requests answered)")
@@ -0,0 +1,84 @@
+"""
+Decision Cache - Bộ nhớ đệm quyết định chuyển tiếp
+LRU + TTL cache đặt trước bước phân loại QoS và định tuyến DQN
+"""
+
+import time
+from collections import OrderedDict
+
+
+class DecisionCache:
+    """Bounded LRU cache of forwarding decisions with per-entry TTL"""
+    
+    def __init__(self, max_size=4096, ttl=2.0):
+        """
+        Args:
+            max_size: maximum number of cached decisions
+            ttl: seconds a decision stays valid
+        """
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries = OrderedDict()  # {key: (expires_at, actions)}
+        
+        # Counters
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+    
+    @staticmethod
+    def make_key(dpid, in_port, headers):
+        """Cache key: (dpid, in_port, MAC pair + 5-tuple)"""
+        return (dpid, in_port) + headers.flow_key()
+    
+    def get(self, key):
+        """
+        Look up a cached decision
+        Returns:
+            cached action list, or None on miss/expiry
+        """
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        
+        expires_at, actions = entry
+        if expires_at < time.monotonic():
+            del self._entries[key]
+            self.evictions += 1
+            self.misses += 1
+            return None
+        
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return actions
+    
+    def put(self, key, actions):
+        """Store the full action list for a decision"""
+        self._entries[key] = (time.monotonic() + self.ttl, actions)
+        self._entries.move_to_end(key)
+        
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+    
+    def invalidate(self):
+        """Drop every cached decision (topology change, model reload)"""
+        if self._entries:
+            self._entries.clear()
+        self.invalidations += 1
+    
+    def __len__(self):
+        return len(self._entries)
+    
+    def get_statistics(self):
+        """Get cache counters"""
+        lookups = self.hits + self.misses
+        return {
+            'size': len(self._entries),
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+            'evictions': self.evictions,
+            'invalidations': self.invalidations
+        }
@@ -0,0 +1,312 @@
+"""
+Flow Tracker - Theo dõi flow theo cookie, tốc độ tính từ chênh lệch bộ đếm
+Mỗi rule do controller cài mang cookie riêng; bảng trạng thái cập nhật tại chỗ, elephant flow xác định theo tốc độ và thời gian duy trì
+"""
+
+import numpy as np
+
+# High bits of the cookies of forwarding rules; low bits number the rules
+COOKIE_FLOW = 0x464c << 48
+COOKIE_ID_MASK = (1 << 48) - 1
+
+# OFPFlowRemoved reasons (OpenFlow 1.3)
+REMOVED_REASONS = {0: 'idle_timeout', 1: 'hard_timeout', 2: 'delete', 3: 'group_delete'}
+
+
+class FlowTracker:
+    """
+    Per-flow state table keyed by (dpid, cookie)
+    Every rule the controller installs carries a cookie from
+    allocate_cookie() (or a reroute cookie), so a flow stats entry maps to
+    one row of the table. Rows hold the counters of the previous reply and
+    the byte / packet rates computed from the deltas, in preallocated NumPy
+    columns updated in place with one vectorized pass per reply; a row's
+    first rate is its average since the rule was installed. Rows are freed
+    on OFPFlowRemoved, and rules missing from a complete (multipart) reply
+    are treated as expired.
+    A flow is an elephant once its byte rate has stayed at or above
+    elephant_rate for elephant_duration seconds, so a long-lived trickle
+    never qualifies and a new burst does after elephant_duration.
+    The byte deltas of every reply also go to an optional HeavyHitterSketch,
+    which ranks the flows by recent rate without scanning the table.
+    """
+    
+    def __init__(self, elephant_rate, elephant_duration, capacity=1024, sketch=None):
+        """
+        Args:
+            elephant_rate: byte rate (bytes/s) of an elephant flow
+            elephant_duration: seconds the rate must be sustained
+            capacity: initial number of rows (doubles when full)
+            sketch: HeavyHitterSketch fed with the byte deltas (optional)
+        """
+        self.elephant_rate = elephant_rate
+        self.elephant_duration = elephant_duration
+        self.sketch = sketch
+        
+        self._next_id = 0
+        self._rows = {}  # {(dpid, cookie): row}
+        self._info = [None] * capacity  # row -> (dpid, cookie, table_id, priority, match)
+        self._free = list(range(capacity - 1, -1, -1))
+        self._by_switch = {}  # {dpid: set of rows}
+        self._seen = {}  # {dpid: rows in the parts of the reply received so far}
+        
+        self._bytes = np.zeros(capacity, dtype=np.uint64)
+        self._packets = np.zeros(capacity, dtype=np.uint64)
+        self._byte_rate = np.zeros(capacity)
+        self._packet_rate = np.zeros(capacity)
+        self._installed = np.zeros(capacity)  # time the rule was installed
+        self._updated = np.zeros(capacity)  # time of the counters in _bytes / _packets
+        self._hot_since = np.full(capacity, np.nan)  # start of the current run above elephant_rate
+        self._elephant = np.zeros(capacity, dtype=bool)
+        
+        # Statistics
+        self.cookies_allocated = 0
+        self.removed = {reason: 0 for reason in REMOVED_REASONS.values()}
+        self.expired = 0
+        self.elephants_detected = 0
+    
+    def _columns(self):
+        return ('_bytes', '_packets', '_byte_rate', '_packet_rate', '_installed', '_updated',
+                '_hot_since', '_elephant')
+    
+    def allocate_cookie(self):
+        """Cookie for a new rule"""
+        self._next_id = (self._next_id + 1) & COOKIE_ID_MASK
+        self.cookies_allocated += 1
+        return COOKIE_FLOW | self._next_id
+    
+    def _grow(self):
+        capacity = len(self._info)
+        self._info.extend([None] * capacity)
+        self._free.extend(range(2 * capacity - 1, capacity - 1, -1))
+        for name in self._columns():
+            column = getattr(self, name)
+            fill = np.nan if name == '_hot_since' else 0
+            setattr(self, name, np.concatenate([column, np.full(capacity, fill, dtype=column.dtype)]))
+    
+    def _allocate(self, key, stat, installed):
+        if not self._free:
+            self._grow()
+        row = self._free.pop()
+        self._rows[key] = row
+        self._info[row] = key + (stat.table_id, stat.priority, stat.match)
+        self._by_switch.setdefault(key[0], set()).add(row)
+        # No previous reply: the first rate is the average since installation
+        self._bytes[row] = 0
+        self._packets[row] = 0
+        self._byte_rate[row] = 0.0
+        self._packet_rate[row] = 0.0
+        self._installed[row] = installed
+        self._updated[row] = installed
+        self._hot_since[row] = np.nan
+        self._elephant[row] = False
+        return row
+    
+    def _release(self, row):
+        dpid, cookie = self._info[row][:2]
+        del self._rows[(dpid, cookie)]
+        self._by_switch[dpid].discard(row)
+        self._info[row] = None
+        self._free.append(row)
+        if self.sketch is not None:
+            self.sketch.forget(dpid, cookie)
+    
+    def update(self, dpid, stats, now, more=False):
+        """
+        Record one part of a flow stats reply
+        Args:
+            dpid: switch
+            stats: OFPFlowStats entries (entries with cookie 0 are not ours and skipped)
+            now: time of the reply
+            more: further parts of the same reply follow (OFPMPF_REPLY_MORE)
+        Returns:
+            list of (dpid, cookie) that became elephants
+        """
+        seen = self._seen.setdefault(dpid, set())
+        rows = []
+        cookies = []
+        byte_counts = []
+        packet_counts = []
+        durations = []
+        for stat in stats:
+            if not stat.cookie:
+                continue
+            duration = stat.duration_sec + stat.duration_nsec * 1e-9
+            key = (dpid, stat.cookie)
+            row = self._rows.get(key)
+            if row is None:
+                row = self._allocate(key, stat, now - duration)
+            rows.append(row)
+            cookies.append(stat.cookie)
+            byte_counts.append(stat.byte_count)
+            packet_counts.append(stat.packet_count)
+            durations.append(duration)
+            seen.add(row)
+        
+        became = []
+        if rows:
+            became = self._update_rows(dpid, cookies, np.array(rows),
+                                       np.array(byte_counts, dtype=np.uint64),
+                                       np.array(packet_counts, dtype=np.uint64),
+                                       now - np.array(durations), now)
+        
+        if not more:
+            # Complete reply: rules that were not in it are gone
+            del self._seen[dpid]
+            for row in self._by_switch.get(dpid, set()) - seen:
+                self._release(row)
+                self.expired += 1
+        return became
+    
+    def _update_rows(self, dpid, cookies, rows, new_bytes, new_packets, installed, now):
+        """Vectorized rate and elephant update of the rows of one reply"""
+        # A rule re-added under the same cookie restarts its counters
+        old_bytes = self._bytes[rows]
+        old_packets = self._packets[rows]
+        since = self._updated[rows]
+        reset = (new_bytes < old_bytes) | (new_packets < old_packets)
+        old_bytes[reset] = 0
+        old_packets[reset] = 0
+        since[reset] = installed[reset]
+        
+        elapsed = now - since
+        measured = elapsed > 0
+        elapsed[~measured] = 1.0
+        byte_delta = new_bytes - old_bytes
+        byte_rate = np.where(measured, byte_delta / elapsed, self._byte_rate[rows])
+        packet_rate = np.where(measured, (new_packets - old_packets) / elapsed, self._packet_rate[rows])
+        
+        self._bytes[rows] = new_bytes
+        self._packets[rows] = new_packets
+        self._byte_rate[rows] = byte_rate
+        self._packet_rate[rows] = packet_rate
+        self._updated[rows] = np.where(measured, now, since)
+        self._installed[rows] = installed
+        if self.sketch is not None:
+            self.sketch.update(dpid, cookies, byte_delta, now, np.where(measured, elapsed, 0.0))
+        
+        # The run above the elephant rate starts with the interval that first exceeded it
+        hot = byte_rate >= self.elephant_rate
+        hot_since = self._hot_since[rows]
+        hot_since = np.where(hot, np.where(np.isnan(hot_since), since, hot_since), np.nan)
+        self._hot_since[rows] = hot_since
+        elephant = hot & (now - hot_since >= self.elephant_duration)
+        
+        became = rows[elephant & ~self._elephant[rows]]
+        self._elephant[rows] = elephant
+        self.elephants_detected += len(became)
+        return [self._info[row][:2] for row in became.tolist()]
+    
+    def remove(self, dpid, cookie, reason):
+        """
+        Rule removed by the switch (OFPFlowRemoved)
+        Returns:
+            final state of the flow (see flows()), or None if it was not tracked
+        """
+        row = self._rows.get((dpid, cookie))
+        if row is None:
+            return None
+        flow = self._flow(row)
+        self._release(row)
+        name = REMOVED_REASONS.get(reason, 'delete')
+        self.removed[name] += 1
+        return flow
+    
+    def forget_switch(self, dpid):
+        """Switch disconnected: its rules are gone"""
+        for row in list(self._by_switch.get(dpid, ())):
+            self._release(row)
+        self._by_switch.pop(dpid, None)
+        self._seen.pop(dpid, None)
+    
+    def _flow(self, row):
+        dpid, cookie, table_id, priority, match = self._info[row]
+        return {
+            'dpid': dpid,
+            'cookie': cookie,
+            'table_id': table_id,
+            'priority': priority,
+            'match': match,
+            'byte_count': int(self._bytes[row]),
+            'packet_count': int(self._packets[row]),
+            'duration_sec': float(self._updated[row] - self._installed[row]),
+            'byte_rate': float(self._byte_rate[row]),
+            'packet_rate': float(self._packet_rate[row]),
+            'elephant': bool(self._elephant[row]),
+            'timestamp': float(self._updated[row])
+        }
+    
+    def get(self, dpid, cookie):
+        """State of one flow (see flows()), or None"""
+        row = self._rows.get((dpid, cookie))
+        return None if row is None else self._flow(row)
+    
+    def flows(self, dpid=None):
+        """
+        State of the tracked flows
+        Args:
+            dpid: only the flows of this switch
+        Returns:
+            list of dicts (counters, byte_rate / packet_rate per second, elephant flag)
+        """
+        rows = self._rows.values() if dpid is None else self._by_switch.get(dpid, ())
+        return [self._flow(row) for row in sorted(rows)]
+    
+    def elephants(self):
+        """State of the flows currently classified as elephants"""
+        return [self._flow(row) for row in np.flatnonzero(self._elephant).tolist()
+                if self._info[row] is not None]
+    
+    def __len__(self):
+        return len(self._rows)
+    
+    def get_statistics(self):
+        """Get tracked flows, elephants and removals"""
+        return {
+            'flows': len(self._rows),
+            'capacity': len(self._info),
+            'elephants': len(self.elephants()),
+            'elephants_detected': self.elephants_detected,
+            'cookies_allocated': self.cookies_allocated,
+            'removed': dict(self.removed),
+            'expired': self.expired
+        }
+
+
+if __name__ == "__main__":
+    # Flow stats polled every 5 s for 60 s: a long-lived trickle (50 kB/s), a
+    # steady elephant (1 MB/s), a transfer that ends at 20 s and a burst starting
+    # at 30 s. Old rule: cumulative byte_count > 1 MB; new rule: rate >= 1 MB / 5 s
+    # sustained for 5 s.
+    from collections import namedtuple
+    
+    Stat = namedtuple('Stat', 'cookie table_id priority match byte_count packet_count '
+                              'duration_sec duration_nsec')
+    FLOWS = {'trickle': (0, 60, 50e3), 'elephant': (0, 60, 1e6),
+             'finished': (0, 20, 1e6), 'burst': (30, 60, 2e6)}  # start, stop, bytes/s
+    
+    tracker = FlowTracker(elephant_rate=1000000 / 5, elephant_duration=5)
+    cookies = {name: tracker.allocate_cookie() for name in FLOWS}
+    names = {cookie: name for name, cookie in cookies.items()}
+    old_detected = {}
+    new_detected = {}
+    for now in range(5, 65, 5):
+        stats = []
+        for name, (start, stop, rate) in FLOWS.items():
+            if now > start:
+                sent = int(rate * (min(now, stop) - start))
+                stats.append(Stat(cookies[name], 0, 1, {}, sent, sent // 1000, now - start, 0))
+                if sent > 1000000:
+                    old_detected.setdefault(name, now)
+        for _, cookie in tracker.update(1, stats, float(now)):
+            new_detected.setdefault(names[cookie], now)
+    
+    current = {names[flow['cookie']] for flow in tracker.elephants()}
+    print("Flow      Rate         Cumulative bytes          Rate + duration")
+    for name, (start, stop, rate) in FLOWS.items():
+        old = old_detected.get(name)
+        new = new_detected.get(name)
+        old_text = f"from {old} s" if old else "never"
+        new_text = f"from {new} s" if new else "never"
+        print(f"{name:9s} {rate / 1e3:5.0f} kB/s   {old_text:9s} (at 60 s: {'yes' if old else 'no':3s})   "
+              f"{new_text:9s} (at 60 s: {'yes' if name in current else 'no'})")
@@ -0,0 +1,68 @@
+"""
+Futures - Future tương thích green thread của Ryu
+Dùng chung cho hàng đợi FlowMod và worker suy luận AI
+"""
+
+from ryu.lib import hub
+
+
+class Future:
+    """
+    Completion handle resolved from a Ryu green thread
+    Waiting with result() only blocks the calling green thread; callbacks
+    run in whichever green thread resolves the future.
+    """
+    
+    def __init__(self):
+        self._done = False
+        self._result = None
+        self._exception = None
+        self._callbacks = []
+        self._event = None
+    
+    def done(self):
+        return self._done
+    
+    def result(self, timeout=None):
+        """
+        Wait for completion (green-thread friendly)
+        Returns:
+            the result; raises the exception the future failed with
+        """
+        if not self._done:
+            if self._event is None:
+                self._event = hub.Event()
+            if not self._event.wait(timeout=timeout):
+                raise TimeoutError("future not resolved")
+        if self._exception is not None:
+            raise self._exception
+        return self._result
+    
+    def exception(self):
+        """Exception the future failed with (None if pending or successful)"""
+        return self._exception
+    
+    def add_done_callback(self, callback):
+        """Call callback(future) on completion (immediately if already done)"""
+        if self._done:
+            callback(self)
+        else:
+            self._callbacks.append(callback)
+    
+    def set_result(self, result):
+        self._resolve(result, None)
+    
+    def set_exception(self, exception):
+        self._resolve(None, exception)
+    
+    def _resolve(self, result, exception):
+        if self._done:
+            return
+        self._done = True
+        self._result = result
+        self._exception = exception
+        if self._event is not None:
+            self._event.set()
+        callbacks, self._callbacks = self._callbacks, []
+        for callback in callbacks:
+            callback(self)
@@ -0,0 +1,263 @@
+"""
+Host Table - Bảng vị trí host toàn cục có aging
+Ánh xạ MAC/IP -> (edge dpid, port) lưu trong mảng NumPy, thay cho việc học MAC riêng trên từng switch
+"""
+
+from array import array
+
+import numpy as np
+
+# learn() results
+HOST_REFRESHED = 0
+HOST_NEW = 1
+HOST_MOVED = 2
+
+
+class HostTable:
+    """
+    Global host location table
+    One row per host, learned at its edge port only, instead of one MAC
+    table entry per host on every switch it was flooded through. Locations
+    and last-seen times live in preallocated typed arrays (scalar reads
+    return ints directly; aging and switch removal scan them as zero-copy
+    NumPy views); the only Python objects per host are the MAC (and IP) keys
+    of the lookup dicts. Rows of expired or removed hosts are reused, and
+    the columns double when full.
+    Pinned hosts (learned by another controller shard) do not age here.
+    """
+    
+    def __init__(self, capacity=1024, max_age=300.0):
+        """
+        Args:
+            capacity: initial number of rows
+            max_age: seconds without traffic before a host is forgotten
+        """
+        self.max_age = max_age
+        
+        self._rows = {}  # {mac: row}
+        self._ip_rows = {}  # {ip: row}
+        self._macs = [None] * capacity  # row -> mac
+        self._ips = [None] * capacity  # row -> ip
+        self._free = list(range(capacity - 1, -1, -1))
+        
+        self._dpid = array('Q', bytes(8 * capacity))
+        self._port = array('I', bytes(4 * capacity))
+        self._seen = array('d', bytes(8 * capacity))
+        self._used = array('B', bytes(capacity))
+        self._pinned = array('B', bytes(capacity))
+        
+        # Statistics
+        self.learned = 0
+        self.moves = 0
+        self.expired = 0
+    
+    def _grow(self):
+        capacity = len(self._macs)
+        self._macs.extend([None] * capacity)
+        self._ips.extend([None] * capacity)
+        self._free.extend(range(2 * capacity - 1, capacity - 1, -1))
+        for column in self._columns():
+            column.extend(array(column.typecode, bytes(column.itemsize * capacity)))
+    
+    def _columns(self):
+        return self._dpid, self._port, self._seen, self._used, self._pinned
+    
+    def learn(self, mac, dpid, port, now, ip=None, pinned=False):
+        """
+        Record a host seen on an edge port
+        Args:
+            mac: host MAC address
+            dpid, port: attachment point
+            now: time of the observation (time.time())
+            ip: IPv4 address seen from the host, if any
+            pinned: exempt from aging (location owned by another shard)
+        Returns:
+            HOST_NEW, HOST_MOVED or HOST_REFRESHED
+        """
+        row = self._rows.get(mac)
+        if row is None:
+            if not self._free:
+                self._grow()
+            row = self._free.pop()
+            self._rows[mac] = row
+            self._macs[row] = mac
+            self._used[row] = 1
+            result = HOST_NEW
+            self.learned += 1
+        elif self._dpid[row] != dpid or self._port[row] != port:
+            result = HOST_MOVED
+            self.moves += 1
+        else:
+            result = HOST_REFRESHED
+        
+        if result != HOST_REFRESHED:
+            self._dpid[row] = dpid
+            self._port[row] = port
+        self._seen[row] = now
+        self._pinned[row] = 1 if pinned else 0
+        
+        if ip is not None and self._ips[row] != ip:
+            self._set_ip(row, ip)
+        return result
+    
+    def _set_ip(self, row, ip):
+        old = self._ips[row]
+        if old is not None and self._ip_rows.get(old) == row:
+            del self._ip_rows[old]
+        previous = self._ip_rows.get(ip)
+        if previous is not None:
+            # Address taken over by another host
+            self._ips[previous] = None
+        self._ip_rows[ip] = row
+        self._ips[row] = ip
+    
+    def get(self, mac, default=None):
+        """(dpid, port) of a host"""
+        row = self._rows.get(mac)
+        if row is None:
+            return default
+        return self._dpid[row], self._port[row]
+    
+    def lookup_ip(self, ip):
+        """
+        Host owning an IPv4 address
+        Returns:
+            (mac, dpid, port) or None
+        """
+        row = self._ip_rows.get(ip)
+        if row is None:
+            return None
+        return self._macs[row], self._dpid[row], self._port[row]
+    
+    def __contains__(self, mac):
+        return mac in self._rows
+    
+    def __len__(self):
+        return len(self._rows)
+    
+    def _release(self, row):
+        mac = self._macs[row]
+        del self._rows[mac]
+        ip = self._ips[row]
+        if ip is not None and self._ip_rows.get(ip) == row:
+            del self._ip_rows[ip]
+        self._macs[row] = self._ips[row] = None
+        self._used[row] = 0
+        self._free.append(row)
+        return mac
+    
+    def pop(self, mac, default=None):
+        """Forget a host; returns its (dpid, port)"""
+        location = self.get(mac)
+        if location is None:
+            return default
+        self._release(self._rows[mac])
+        return location
+    
+    def remove_switch(self, dpid):
+        """
+        Forget every host attached to a switch
+        Returns:
+            list of MACs removed
+        """
+        rows = np.flatnonzero(np.frombuffer(self._used, dtype=bool) &
+                              (np.frombuffer(self._dpid, dtype=np.uint64) == dpid))
+        return [self._release(row) for row in rows.tolist()]
+    
+    def expire(self, now):
+        """
+        Forget unpinned hosts not seen for max_age seconds
+        Returns:
+            list of MACs removed
+        """
+        rows = np.flatnonzero(np.frombuffer(self._used, dtype=bool) &
+                              ~np.frombuffer(self._pinned, dtype=bool) &
+                              (np.frombuffer(self._seen) < now - self.max_age))
+        self.expired += len(rows)
+        return [self._release(row) for row in rows.tolist()]
+    
+    def items(self):
+        """[(mac, (dpid, port))]"""
+        return [(mac, (self._dpid[row], self._port[row]))
+                for mac, row in list(self._rows.items())]
+    
+    def get_statistics(self):
+        """Get table size, churn counters and column memory"""
+        return {
+            'hosts': len(self._rows),
+            'capacity': len(self._macs),
+            'learned': self.learned,
+            'moves': self.moves,
+            'expired': self.expired,
+            'column_bytes': sum(column.itemsize * len(column) for column in self._columns())
+        }
+
+
+if __name__ == "__main__":
+    # 100k hosts behind the 32 edge switches of a k=8 fat-tree (80 switches).
+    # Old layout: host_locations {mac: (dpid, port)} plus a mac_to_port dict
+    # on every switch the host was flooded through.
+    import gc
+    import random
+    import time
+    import tracemalloc
+    
+    NUM_HOSTS = 100000
+    NUM_SWITCHES = 80
+    EDGES = list(range(3000, 3032))
+    
+    random.seed(1)
+    hosts = []
+    for i in range(NUM_HOSTS):
+        mac = f'02:00:{i >> 24 & 0xff:02x}:{i >> 16 & 0xff:02x}:{i >> 8 & 0xff:02x}:{i & 0xff:02x}'
+        hosts.append((mac, random.choice(EDGES), random.randint(1, 4), f'10.{i >> 16}.{i >> 8 & 0xff}.{i & 0xff}'))
+    
+    def measure(build):
+        gc.collect()
+        tracemalloc.start()
+        table = build()
+        size = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        return table, size
+    
+    def build_old():
+        host_locations = {}
+        mac_to_port = {}
+        for mac, dpid, port, _ in hosts:
+            host_locations[mac] = (dpid, port)
+            for switch in range(NUM_SWITCHES):
+                mac_to_port.setdefault(switch, {})[mac] = port
+        return host_locations, mac_to_port
+    
+    def build_new():
+        table = HostTable(capacity=1024)
+        now = time.time()
+        for mac, dpid, port, ip in hosts:
+            table.learn(mac, dpid, port, now, ip=ip)
+        return table
+    
+    # The MAC/IP strings exist in both cases (they come from parsed packets)
+    (old_locations, old_mac_to_port), old_size = measure(build_old)
+    table, new_size = measure(build_new)
+    
+    probes = [random.choice(hosts)[0] for _ in range(200000)]
+    
+    began = time.perf_counter()
+    for mac in probes:
+        old_locations.get(mac)
+    old_lookup = (time.perf_counter() - began) / len(probes) * 1e9
+    
+    began = time.perf_counter()
+    for mac in probes:
+        table.get(mac)
+    new_lookup = (time.perf_counter() - began) / len(probes) * 1e9
+    
+    began = time.perf_counter()
+    removed = table.expire(time.time() + table.max_age + 1)
+    expire_ms = (time.perf_counter() - began) * 1000
+    
+    print(f"{NUM_HOSTS} hosts, {NUM_SWITCHES} switches")
+    print(f"  Per-switch MAC learning: {old_size / NUM_HOSTS:7.0f} B/host, lookup {old_lookup:.0f} ns")
+    print(f"  Global host table:       {new_size / NUM_HOSTS:7.0f} B/host, lookup {new_lookup:.0f} ns "
+          f"(with IP index)")
+    print(f"  Aging all {len(removed)} hosts: {expire_ms:.1f} ms")
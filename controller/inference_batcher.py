@@ -0,0 +1,143 @@
+"""
+Inference Batcher - Gom các yêu cầu định tuyến DQN thành batch
+Chạy một lần forward pass cho nhiều elephant flow trong cùng cửa sổ thời gian
+"""
+
+import time
+import numpy as np
+
+from ryu.lib import hub
+
+
+class RouteInferenceBatcher:
+    """
+    Micro-batching queue in front of DQNAgent
+    Routing requests are gathered for up to `window_ms` (or until `max_batch`
+    requests are waiting) and answered from a single forward pass. All
+    requests in a flush share the state tensor of the current monitoring
+    epoch. No request waits longer than `max_delay_ms`: if the event loop is
+    too busy to wake the flusher in time, the next submit flushes inline.
+    """
+    
+    def __init__(self, agent, state_provider, window_ms=2, max_batch=32,
+                 max_delay_ms=5, logger=None, inference_pool=None):
+        """
+        Args:
+            agent: DQNAgent used for inference
+            state_provider: callable returning (epoch, state_vector)
+            window_ms: gather window for a batch
+            max_batch: flush as soon as this many requests are queued
+            max_delay_ms: latency cap for a single request
+            logger: logger for errors
+            inference_pool: InferencePool running the forward pass off the event loop
+        """
+        self.agent = agent
+        self.inference_pool = inference_pool
+        self.state_provider = state_provider
+        self.max_delay = max_delay_ms / 1000.0
+        self.window = min(window_ms / 1000.0, self.max_delay)
+        self.max_batch = max_batch
+        self.logger = logger
+        
+        self._queue = []  # [(enqueued_at, callback)]
+        self._wakeup = hub.Event()
+        
+        # State tensor shared by every request of a monitoring epoch
+        self._state_epoch = None
+        self._state_tensor = None
+        
+        # Statistics
+        self.requests = 0
+        self.batches = 0
+        self.max_wait = 0.0
+        
+        self._thread = hub.spawn(self._run)
+    
+    def submit(self, callback):
+        """
+        Queue a routing request
+        Args:
+            callback: called with the selected action (None if inference failed)
+        """
+        now = time.monotonic()
+        self._queue.append((now, callback))
+        self.requests += 1
+        
+        if len(self._queue) >= self.max_batch or now - self._queue[0][0] >= self.max_delay:
+            self.flush()
+        else:
+            self._wakeup.set()
+    
+    def _run(self):
+        """Flush each batch when its gather window closes"""
+        while True:
+            self._wakeup.wait()
+            self._wakeup.clear()
+            
+            while self._queue:
+                remaining = self._queue[0][0] + self.window - time.monotonic()
+                if remaining > 0:
+                    hub.sleep(remaining)
+                self.flush()
+    
+    def flush(self):
+        """Run one forward pass for every queued request and dispatch the decisions"""
+        if not self._queue:
+            return
+        
+        batch, self._queue = self._queue, []
+        now = time.monotonic()
+        self.max_wait = max(self.max_wait, now - batch[0][0])
+        self.batches += 1
+        
+        try:
+            epoch, state = self.state_provider()
+            if self.inference_pool is not None:
+                self.inference_pool.select_action(state).add_done_callback(
+                    lambda future: self._dispatch(batch, future))
+                return
+            
+            if epoch != self._state_epoch or self._state_tensor is None:
+                self._state_tensor = self.agent.states_to_tensor(state[np.newaxis, :])
+                self._state_epoch = epoch
+            
+            action = self.agent.select_actions(self._state_tensor)[0]
+        except Exception as e:
+            if self.logger:
+                self.logger.error(f"Error in batched DQN inference: {e}")
+            action = None
+        
+        for _, callback in batch:
+            callback(action)
+    
+    def _dispatch(self, batch, future):
+        """Answer a batch from a completed inference pool request"""
+        action = None
+        if future.exception() is not None:
+            if self.logger:
+                self.logger.error(f"Error in batched DQN inference: {future.exception()}")
+        else:
+            action = future.result()
+        
+        for _, callback in batch:
+            callback(action)
+    
+    def set_agent(self, agent):
+        """Run the next batches on another agent (model swap)"""
+        self.agent = agent
+        self.reset()
+    
+    def reset(self):
+        """Drop the cached state tensor (e.g. after a model swap)"""
+        self._state_epoch = None
+        self._state_tensor = None
+    
+    def get_statistics(self):
+        """Get batching statistics"""
+        return {
+            'requests': self.requests,
+            'batches': self.batches,
+            'avg_batch_size': self.requests / self.batches if self.batches else 0.0,
+            'max_wait_ms': self.max_wait * 1000,
+            'queued': len(self._queue)
+        }
@@ -0,0 +1,520 @@
+"""
+Inference Pool - Chạy suy luận DQN/LSTM trong tiến trình worker riêng
+Trao đổi dữ liệu qua shared memory, trả về Future không chặn event loop của Ryu
+"""
+
+import os
+import pickle
+import tempfile
+import time
+import multiprocessing as mp
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from ryu.lib import hub
+
+from controller.futures import Future
+
+# Request kinds
+KIND_DQN = 1  # input: state vector -> output: [action]
+KIND_PREDICT = 2  # input: sequence, arg: steps -> output: predictions
+
+# Slot header columns
+_H_KIND = 0
+_H_ARG = 1
+_H_LEN = 2
+_H_STATUS = 3
+
+STATUS_OK = 1
+STATUS_ERROR = 2
+
+_READY = -1  # slot id a worker sends once its models are loaded: [_READY, version, ok]
+_RELOAD = -2  # [_RELOAD, version], followed by the path of the pickled model state
+
+
+class InferenceError(Exception):
+    """An inference request failed in the worker or the worker went away"""
+
+
+class _PipeIdle(Exception):
+    """No response arrived within the collector's wait period"""
+
+
+class _SlotArrays:
+    """Numpy views over a worker's shared-memory block"""
+    
+    def __init__(self, buf, slots, max_in, max_out):
+        offset = 0
+        self.header = np.ndarray((slots, 4), dtype=np.int32, buffer=buf, offset=offset)
+        offset += self.header.nbytes
+        self.inputs = np.ndarray((slots, max_in), dtype=np.float32, buffer=buf, offset=offset)
+        offset += self.inputs.nbytes
+        self.outputs = np.ndarray((slots, max_out), dtype=np.float32, buffer=buf, offset=offset)
+    
+    @staticmethod
+    def size(slots, max_in, max_out):
+        return slots * (4 * 4 + max_in * 4 + max_out * 4)
+
+
+def _load_model_state(predictor, agent, model_state):
+    """Copy pickled weights (InferencePool._model_state()) into a worker's models"""
+    _, lstm_state, _, dqn_state = model_state
+    predictor.model.load_state_dict(lstm_state['model'])
+    if lstm_state['data_min'] is not None:
+        predictor.data_min = lstm_state['data_min']
+        predictor.data_max = lstm_state['data_max']
+    agent.policy_net.load_state_dict(dqn_state)
+
+
+def _worker_main(index, shm_name, slots, max_in, max_out, conn, model_state):
+    """
+    Worker process: load the models, then serve slot ids received on `conn`
+    All DQN requests pending at once are answered with a single forward pass.
+    A reload message swaps the weights after the requests received before it.
+    """
+    import torch
+    from ai_models.traffic_predictor import TrafficPredictor
+    from ai_models.dqn_agent import DQNAgent
+    
+    torch.set_num_threads(1)
+    shm = shared_memory.SharedMemory(name=shm_name)
+    arrays = _SlotArrays(shm.buf, slots, max_in, max_out)
+    
+    lstm_config, _, dqn_config, _ = model_state
+    predictor = TrafficPredictor(**lstm_config, verbose=False)
+    agent = DQNAgent(**dqn_config, verbose=False)
+    _load_model_state(predictor, agent, model_state)
+    
+    conn.send_bytes(np.array([_READY, 0, 1], dtype=np.int32).tobytes())
+    
+    try:
+        while True:
+            data = conn.recv_bytes()
+            if not data:
+                break
+            message = np.frombuffer(data, dtype=np.int32).tolist()
+            pending = []
+            reload = None
+            while True:
+                if message[0] == _RELOAD:
+                    reload = (message[1], conn.recv_bytes().decode())
+                    break
+                pending.extend(message)
+                if not conn.poll():
+                    break
+                message = np.frombuffer(conn.recv_bytes(), dtype=np.int32).tolist()
+            
+            header = arrays.header
+            dqn_slots = [slot for slot in pending if header[slot, _H_KIND] == KIND_DQN]
+            if dqn_slots:
+                try:
+                    state_size = int(header[dqn_slots[0], _H_LEN])
+                    actions = agent.select_actions(arrays.inputs[dqn_slots, :state_size])
+                    for slot, action in zip(dqn_slots, actions):
+                        arrays.outputs[slot, 0] = action
+                        header[slot, _H_STATUS] = STATUS_OK
+                except Exception:
+                    header[dqn_slots, _H_STATUS] = STATUS_ERROR
+            
+            for slot in pending:
+                if header[slot, _H_KIND] != KIND_PREDICT:
+                    continue
+                try:
+                    sequence = arrays.inputs[slot, :header[slot, _H_LEN]].tolist()
+                    steps = int(header[slot, _H_ARG])
+                    arrays.outputs[slot, :steps] = predictor.predict_future(sequence, steps=steps)
+                    header[slot, _H_STATUS] = STATUS_OK
+                except Exception:
+                    header[slot, _H_STATUS] = STATUS_ERROR
+            
+            if pending:
+                conn.send_bytes(np.array(pending, dtype=np.int32).tobytes())
+            
+            if reload is not None:
+                version, path = reload
+                try:
+                    with open(path, 'rb') as f:
+                        _load_model_state(predictor, agent, pickle.load(f))
+                    ok = 1
+                except Exception:
+                    ok = 0  # keep serving the previous weights
+                conn.send_bytes(np.array([_READY, version, ok], dtype=np.int32).tobytes())
+    except (EOFError, KeyboardInterrupt):
+        pass
+    finally:
+        del arrays
+        shm.close()
+
+
+class InferencePool:
+    """
+    Pool of worker processes holding copies of the LSTM and DQN models
+    Requests are written into a free slot of a worker's shared-memory block
+    and only the slot id crosses the pipe; a collector green thread per
+    worker waits on the pipe (without blocking other green threads) and
+    resolves the Future. Until the workers are ready, when every slot is
+    busy, or after a worker dies, requests run synchronously on the local
+    models instead. update_models() swaps the weights in every worker
+    behind the requests it has already queued.
+    """
+    
+    def __init__(self, traffic_predictor, dqn_agent, num_workers=1, slots=64,
+                 max_input=256, max_output=32, request_timeout=1.0, logger=None):
+        """
+        Args:
+            traffic_predictor: local TrafficPredictor (copied to workers, used for fallback)
+            dqn_agent: local DQNAgent (copied to workers, used for fallback)
+            num_workers: worker processes
+            slots: concurrent requests per worker
+            max_input, max_output: floats per request / response
+            request_timeout: seconds before a request fails
+            logger: logger for errors
+        """
+        self.traffic_predictor = traffic_predictor
+        self.dqn_agent = dqn_agent
+        self.slots = slots
+        self.max_input = max_input
+        self.max_output = max_output
+        self.request_timeout = request_timeout
+        self.logger = logger
+        
+        self._workers = []
+        self.model_version = 0
+        self._reload_files = {}  # {version: pickled model state awaiting worker acks}
+        
+        # Statistics
+        self.submitted = 0
+        self.fallbacks = 0
+        self.errors = 0
+        self.latency_total = 0.0
+        self.latency_max = 0.0
+        
+        model_state = self._model_state()
+        ctx = mp.get_context('spawn')
+        for index in range(num_workers):
+            shm = shared_memory.SharedMemory(
+                create=True, size=_SlotArrays.size(slots, max_input, max_output))
+            parent_conn, child_conn = ctx.Pipe()
+            process = ctx.Process(
+                target=_worker_main, name=f'inference-worker-{index}', daemon=True,
+                args=(index, shm.name, slots, max_input, max_output, child_conn, model_state))
+            process.start()
+            child_conn.close()
+            
+            worker = {
+                'index': index,
+                'process': process,
+                'shm': shm,
+                'arrays': _SlotArrays(shm.buf, slots, max_input, max_output),
+                'conn': parent_conn,
+                'free': list(range(slots)),
+                'pending': {},  # {slot: (future, kind, submitted_at)}
+                'ready': False,
+                'alive': True,
+                'version': 0,  # model version served
+                'acked': 0  # last model version the worker answered for
+            }
+            self._workers.append(worker)
+            worker['thread'] = hub.spawn(self._collect, worker)
+        
+        self._expiry_thread = hub.spawn(self._expire_loop)
+    
+    def _model_state(self):
+        """CPU copies of the model weights and normalization for the workers"""
+        predictor = self.traffic_predictor
+        lstm_config = {'sequence_length': predictor.sequence_length,
+                       'hidden_size': predictor.hidden_size,
+                       'num_layers': predictor.num_layers}
+        lstm_state = {
+            'model': {k: v.cpu() for k, v in predictor.model.state_dict().items()},
+            'data_min': getattr(predictor, 'data_min', None),
+            'data_max': getattr(predictor, 'data_max', None)
+        }
+        
+        agent = self.dqn_agent
+        dqn_config = {'state_size': agent.state_size, 'action_size': agent.action_size,
+                      'hidden_layers': agent.hidden_layers}
+        dqn_state = {k: v.cpu() for k, v in agent.policy_net.state_dict().items()}
+        return lstm_config, lstm_state, dqn_config, dqn_state
+    
+    def update_models(self, traffic_predictor, dqn_agent):
+        """
+        Serve new models: the local fallbacks at once, each worker once it has
+        answered the requests already sent to it
+        The weights go through a temporary file so that the pipe only carries
+        its path and a busy or still-starting worker never blocks the event loop.
+        """
+        self.traffic_predictor = traffic_predictor
+        self.dqn_agent = dqn_agent
+        self.model_version += 1
+        
+        fd, path = tempfile.mkstemp(prefix='sdn-models-', suffix='.pkl')
+        with os.fdopen(fd, 'wb') as f:
+            pickle.dump(self._model_state(), f, protocol=pickle.HIGHEST_PROTOCOL)
+        self._reload_files[self.model_version] = path
+        
+        message = np.array([_RELOAD, self.model_version], dtype=np.int32).tobytes()
+        for worker in self._workers:
+            if not worker['alive']:
+                continue
+            try:
+                worker['conn'].send_bytes(message)
+                worker['conn'].send_bytes(path.encode())
+            except (OSError, EOFError) as e:
+                self._worker_failed(worker, e)
+        self._release_reload_files()
+    
+    def _release_reload_files(self):
+        """Delete model state files every live worker has loaded"""
+        versions = [w['acked'] for w in self._workers if w['alive']]
+        loaded = min(versions) if versions else self.model_version
+        for version in [v for v in self._reload_files if v <= loaded]:
+            try:
+                os.unlink(self._reload_files.pop(version))
+            except OSError:
+                pass
+    
+    # Requests
+    
+    def select_action(self, state):
+        """
+        Greedy DQN action for a state vector
+        Returns:
+            Future resolved to the action index
+        """
+        state = np.asarray(state, dtype=np.float32)
+        return self._submit(KIND_DQN, state, 0,
+                            lambda: self.dqn_agent.select_actions(state[np.newaxis, :])[0])
+    
+    def predict_future(self, sequence, steps=5):
+        """
+        LSTM multi-step prediction
+        Returns:
+            Future resolved to the list of predicted values
+        """
+        sequence = np.asarray(sequence, dtype=np.float32)
+        return self._submit(KIND_PREDICT, sequence, steps,
+                            lambda: self.traffic_predictor.predict_future(list(sequence), steps=steps))
+    
+    def _submit(self, kind, values, arg, fallback):
+        self.submitted += 1
+        worker = self._pick_worker()
+        if worker is None or len(values) > self.max_input or \
+                (kind == KIND_PREDICT and arg > self.max_output):
+            return self._run_inline(fallback)
+        
+        slot = worker['free'].pop()
+        arrays = worker['arrays']
+        arrays.inputs[slot, :len(values)] = values
+        arrays.header[slot] = (kind, arg, len(values), 0)
+        
+        future = Future()
+        worker['pending'][slot] = (future, kind, time.monotonic())
+        try:
+            worker['conn'].send_bytes(np.array([slot], dtype=np.int32).tobytes())
+        except (OSError, EOFError) as e:
+            self._worker_failed(worker, e)
+        return future
+    
+    def _pick_worker(self):
+        """Ready worker with the most free slots, or None"""
+        best = None
+        for worker in self._workers:
+            if worker['ready'] and worker['alive'] and worker['free'] and \
+                    (best is None or len(worker['free']) > len(best['free'])):
+                best = worker
+        return best
+    
+    def _run_inline(self, fallback):
+        """Synchronous fallback on the local models"""
+        self.fallbacks += 1
+        future = Future()
+        try:
+            future.set_result(fallback())
+        except Exception as e:
+            self.errors += 1
+            future.set_exception(e)
+        return future
+    
+    # Responses
+    
+    def _collect(self, worker):
+        """Resolve the futures of completed slots (one green thread per worker)"""
+        from eventlet.hubs import trampoline
+        
+        conn = worker['conn']
+        arrays = worker['arrays']
+        while worker['alive']:
+            try:
+                if not conn.poll():
+                    # Yield until the pipe is readable instead of blocking the process
+                    trampoline(conn.fileno(), read=True, timeout=1.0, timeout_exc=_PipeIdle)
+                    continue
+                slots = np.frombuffer(conn.recv_bytes(), dtype=np.int32).tolist()
+            except _PipeIdle:
+                if not worker['process'].is_alive():
+                    self._worker_failed(worker, InferenceError("worker process exited"))
+                continue
+            except Exception as e:
+                self._worker_failed(worker, e)
+                return
+            
+            if slots[0] == _READY:
+                _, version, ok = slots
+                if not ok:
+                    # Stays on its previous weights
+                    if self.logger:
+                        self.logger.error(f"Inference worker {worker['index']} failed to load "
+                                          f"models of update {version}")
+                elif version:
+                    if self.logger:
+                        self.logger.info(f"Inference worker {worker['index']} switched to new models "
+                                         f"(update {version})")
+                elif self.logger:
+                    self.logger.info(f"Inference worker {worker['index']} ready "
+                                     f"(pid {worker['process'].pid})")
+                worker['ready'] = True
+                worker['acked'] = version
+                if ok:
+                    worker['version'] = version
+                self._release_reload_files()
+                continue
+            
+            now = time.monotonic()
+            for slot in slots:
+                entry = worker['pending'].pop(slot, None)
+                worker['free'].append(slot)
+                if entry is None:
+                    continue  # expired
+                future, kind, submitted_at = entry
+                
+                latency = now - submitted_at
+                self.latency_total += latency
+                self.latency_max = max(self.latency_max, latency)
+                
+                if arrays.header[slot, _H_STATUS] != STATUS_OK:
+                    self.errors += 1
+                    future.set_exception(InferenceError(f"worker {worker['index']} failed request"))
+                elif kind == KIND_DQN:
+                    future.set_result(int(arrays.outputs[slot, 0]))
+                else:
+                    steps = arrays.header[slot, _H_ARG]
+                    future.set_result(arrays.outputs[slot, :steps].tolist())
+    
+    def _expire_loop(self):
+        """Fail requests older than request_timeout"""
+        while True:
+            hub.sleep(self.request_timeout / 2)
+            deadline = time.monotonic() - self.request_timeout
+            for worker in self._workers:
+                for slot, (future, _, submitted_at) in list(worker['pending'].items()):
+                    if submitted_at < deadline:
+                        # The slot stays busy until the worker answers it
+                        del worker['pending'][slot]
+                        self.errors += 1
+                        future.set_exception(TimeoutError("inference request timed out"))
+    
+    def _worker_failed(self, worker, error):
+        """Take a worker out of rotation and fail its pending requests"""
+        if not worker['alive']:
+            return
+        worker['alive'] = False
+        if self.logger:
+            self.logger.error(f"Inference worker {worker['index']} failed: {error}")
+        
+        pending, worker['pending'] = worker['pending'], {}
+        for future, _, _ in pending.values():
+            self.errors += 1
+            future.set_exception(InferenceError(str(error)))
+    
+    def shutdown(self):
+        """Stop the workers and release the shared memory"""
+        for worker in self._workers:
+            worker['alive'] = False
+            try:
+                worker['conn'].close()
+            except OSError:
+                pass
+            worker['process'].join(timeout=2)
+            if worker['process'].is_alive():
+                worker['process'].terminate()
+            worker['arrays'] = None
+            worker['shm'].close()
+            worker['shm'].unlink()
+        hub.kill(self._expiry_thread)
+        for path in self._reload_files.values():
+            try:
+                os.unlink(path)
+            except OSError:
+                pass
+        self._reload_files = {}
+    
+    def get_statistics(self):
+        """Get pool statistics"""
+        completed = self.submitted - self.fallbacks - sum(len(w['pending']) for w in self._workers)
+        return {
+            'workers_ready': sum(1 for w in self._workers if w['ready'] and w['alive']),
+            'workers': len(self._workers),
+            'model_version': self.model_version,
+            'workers_current': sum(1 for w in self._workers
+                                   if w['alive'] and w['version'] == self.model_version),
+            'submitted': self.submitted,
+            'fallbacks': self.fallbacks,
+            'errors': self.errors,
+            'in_flight': sum(len(w['pending']) for w in self._workers),
+            'avg_latency_ms': self.latency_total / completed * 1000 if completed > 0 else 0.0,
+            'max_latency_ms': self.latency_max * 1000
+        }
+
+
+if __name__ == "__main__":
+    # Benchmark: PacketIn handling latency (1 PacketIn/ms) while a prediction
+    # cycle runs for 20 links, with the LSTM inline vs in a worker process
+    from ai_models.traffic_predictor import TrafficPredictor
+    from ai_models.dqn_agent import DQNAgent
+    
+    predictor = TrafficPredictor(sequence_length=10, hidden_size=64, num_layers=2)
+    predictor.data_min, predictor.data_max = 0.0, 100.0
+    agent = DQNAgent(state_size=20, action_size=4, hidden_layers=[128, 64])
+    sequences = [np.random.uniform(0, 100, 10).tolist() for _ in range(20)]
+    
+    def measure(predict, cycles=5):
+        latencies = []
+        done = []
+        
+        def packet_in_source():
+            arrival = time.monotonic()
+            while not done:
+                arrival += 0.001
+                hub.sleep(max(0.0, arrival - time.monotonic()))
+                # Handler runs once the event loop gets to it
+                latencies.append(time.monotonic() - arrival)
+        
+        source = hub.spawn(packet_in_source)
+        hub.sleep(0.05)
+        for _ in range(cycles):
+            for sequence in sequences:
+                predict(sequence)
+            hub.sleep(0.02)
+        done.append(True)
+        hub.joinall([source])
+        
+        latencies.sort()
+        return (latencies[len(latencies) // 2] * 1000,
+                latencies[int(len(latencies) * 0.99)] * 1000,
+                latencies[-1] * 1000)
+    
+    inline = measure(lambda sequence: predictor.predict_future(sequence, steps=5))
+    
+    pool = InferencePool(predictor, agent, num_workers=1, request_timeout=5.0)
+    while not pool.get_statistics()['workers_ready']:
+        hub.sleep(0.1)
+    offloaded = measure(lambda sequence: pool.predict_future(sequence, steps=5).result(timeout=5.0))
+    stats = pool.get_statistics()
+    pool.shutdown()
+    
+    print("PacketIn handling latency during a prediction cycle (p50 / p99 / max):")
+    print(f"  Inline LSTM:    {inline[0]:.2f} / {inline[1]:.2f} / {inline[2]:.2f} ms")
+    print(f"  Worker process: {offloaded[0]:.2f} / {offloaded[1]:.2f} / {offloaded[2]:.2f} ms "
+          f"(request latency avg {stats['avg_latency_ms']:.2f} ms, {stats['fallbacks']} fallbacks)")
@@ -0,0 +1,129 @@
+"""
+Link Index - Chỉ mục cố định (dpid, port) -> vị trí trong vector trạng thái
+Gán mỗi cổng switch một slot không đổi theo thứ tự xuất hiện, giữ nguyên qua các lần switch kết nối lại
+"""
+
+import json
+import os
+
+
+class LinkIndex:
+    """
+    Persistent (dpid, port) -> slot mapping for fixed-size NumPy arrays
+    A port gets the next free slot the first time it is seen and keeps it
+    for the lifetime of the controller, also when its switch disconnects
+    and reconnects, so a given array column always describes the same
+    port. Ports seen after all `capacity` slots are taken get no slot.
+    First-seen order depends on connection order and reply timing, so with
+    a `path` the mapping is saved whenever a slot is assigned and reloaded
+    by the next controller process: a port keeps its column across restarts,
+    matching the DQN weights trained on that layout. A path belongs to one
+    process (sharded controllers each use their own file).
+    """
+    
+    def __init__(self, capacity, path=None):
+        """
+        Args:
+            capacity: number of slots (length of the arrays indexed)
+            path: JSON file persisting the mapping (None: in memory only)
+        """
+        self.capacity = capacity
+        self.path = path
+        self._slots = {}  # {(dpid, port): slot}
+        self._keys = []  # slot -> (dpid, port)
+        self._by_switch = {}  # {dpid: [slot]}
+        self.overflow = 0  # ports refused for lack of slots
+        if path is not None:
+            self._load()
+    
+    def _load(self):
+        """Restore the slots saved by a previous process (a missing or unreadable file starts empty)"""
+        try:
+            with open(self.path) as f:
+                keys = json.load(f)
+        except (OSError, ValueError):
+            return
+        for dpid, port in keys[:self.capacity]:
+            self._add((int(dpid), int(port)))
+    
+    def _save(self):
+        """Write the mapping atomically (slot order), through a temporary file of this process"""
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = f'{self.path}.{os.getpid()}.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(self._keys, f)
+        os.replace(tmp_path, self.path)
+    
+    def _add(self, key):
+        slot = len(self._keys)
+        self._slots[key] = slot
+        self._keys.append(key)
+        self._by_switch.setdefault(key[0], []).append(slot)
+        return slot
+    
+    def slot(self, dpid, port, create=True):
+        """
+        Slot of a port
+        Args:
+            create: assign the next free slot to an unseen port
+        Returns:
+            slot number, or None (unseen and not created, or index full)
+        """
+        key = (dpid, port)
+        slot = self._slots.get(key)
+        if slot is not None or not create:
+            return slot
+        if len(self._keys) >= self.capacity:
+            self.overflow += 1
+            return None
+        
+        slot = self._add(key)
+        if self.path is not None:
+            self._save()
+        return slot
+    
+    def key(self, slot):
+        """(dpid, port) of a slot"""
+        return self._keys[slot]
+    
+    def switch_slots(self, dpid):
+        """Slots of every port of a switch seen so far"""
+        return list(self._by_switch.get(dpid, ()))
+    
+    def items(self):
+        """[((dpid, port), slot)] in slot order"""
+        return [(key, slot) for slot, key in enumerate(self._keys)]
+    
+    def __len__(self):
+        return len(self._keys)
+    
+    def __contains__(self, key):
+        return key in self._slots
+
+
+if __name__ == "__main__":
+    # Slots survive a reconnect in a different order
+    index = LinkIndex(capacity=8)
+    for dpid in (1, 2):
+        for port in (1, 2, 3):
+            index.slot(dpid, port)
+    before = index.items()
+    for dpid in (2, 1):
+        for port in (3, 2, 1):
+            index.slot(dpid, port)
+    print(f"Slots: {before}")
+    print(f"Unchanged after reconnect: {index.items() == before}")
+    print(f"Switch 2 slots: {index.switch_slots(2)}, new port: {index.slot(3, 1)}")
+    
+    # ... and a controller restart, with the mapping persisted
+    import tempfile
+    path = os.path.join(tempfile.mkdtemp(), 'link_index.json')
+    first = LinkIndex(capacity=8, path=path)
+    for dpid, port in ((2, 1), (1, 1), (2, 2)):
+        first.slot(dpid, port)
+    restarted = LinkIndex(capacity=8, path=path)
+    for dpid, port in ((1, 1), (2, 2), (2, 1)):
+        restarted.slot(dpid, port)
+    print(f"Unchanged after restart: {restarted.items() == first.items()}")
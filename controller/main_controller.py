@@ -9,12 +9,8 @@ from ryu.controller.handler import CONFIG_DISPATCHER, MAIN_DISPATCHER, DEAD_DISP
 from ryu.controller.handler import set_ev_cls
 from ryu.ofproto import ofproto_v1_3
 from ryu.lib import hub
-from ryu.lib.packet import packet, ethernet, ipv4, tcp, udp, ether_types
 from ryu.topology import event as topo_event
-from ryu.topology.api import get_switch, get_link
 
-import networkx as nx
-import numpy as np
 import time
 import os
 
@@ -23,93 +19,297 @@ sys.path.append('..')
 
 from controller.monitor import NetworkMonitor
 from controller.qos_manager import QoSManager
-from ai_models.traffic_predictor import TrafficPredictor
-from ai_models.dqn_agent import DQNAgent
-from environment.config import CONTROLLER, AI_MODELS, PATHS, TRAFFIC_CLASSIFICATION
+from controller.packet_parser import parse_packet, ETH_TYPE_LLDP, ETH_TYPE_PROBE, ETH_TYPE_ARP, IPPROTO_TCP
+from controller.decision_cache import DecisionCache
+from controller.inference_batcher import RouteInferenceBatcher
+from controller.inference_pool import InferencePool
+from controller.ai_scheduler import AIScheduler
+from controller.reroute import RerouteEngine
+from controller.futures import Future
+from controller.sharding import ShardCoordinator, NS_LINKS, NS_HOSTS
+from controller.state_store import create_store
+from controller.topology import TopologyGraph
+from controller.host_table import HostTable, HOST_NEW, HOST_MOVED
+from controller.metrics import REGISTRY, timed
+from controller.model_manager import ModelManager
+from controller.flow_queue import FlowModQueue
+from controller.admission import PacketInAdmission, ADMIT, MITIGATE
+from controller.pipeline import MultiTablePipeline, FORWARD_TABLE
+from controller.broadcast import ArpProxy, BroadcastGroups
+from controller.qos_manager import L4_CLASS_RULES
+from environment.config import CONTROLLER, AI_MODELS, PATHS, ADMISSION_CONTROL, \
+    REROUTE, TOPOLOGY, SHARDING, HOST_TABLE, METRICS, BROADCAST
+
+# Typical elephant flow ports: FTP, SSH, rsync, MySQL
+ELEPHANT_TCP_PORTS = frozenset([20, 21, 22, 873, 3306])
+
+# Forwarding rules sit above the metered controller entry of a flooding port
+# (ADMISSION_CONTROL['meter_priority']), which sits above the table-miss
+PATH_PRIORITY = 2
 
 
 class IntelligentSDNController(app_manager.RyuApp):
     OFP_VERSIONS = [ofproto_v1_3.OFP_VERSION]
+    # Monitor runs as a registered context app so it receives stats replies
+    _CONTEXTS = {
+        'network_monitor': NetworkMonitor
+    }
     
     def __init__(self, *args, **kwargs):
         super(IntelligentSDNController, self).__init__(*args, **kwargs)
         
-        self.mac_to_port = {}
         self.datapaths = {}
         
-        # Network topology graph
-        self.network_graph = nx.DiGraph()
+        # Host attachment points learned on edge ports (one entry per host for all switches)
+        self.host_locations = HostTable(capacity=HOST_TABLE['initial_capacity'],
+                                        max_age=HOST_TABLE['aging_time'])
+        self.host_aging_thread = hub.spawn(self._host_aging_loop)
+        self.flood_count = 0
+        
+        # Network topology graph, maintained from switch/link deltas
+        self.topology = TopologyGraph(k_paths=AI_MODELS['dqn']['action_size'])
+        self.network_graph = self.topology.graph
         self.topology_data = {}
         
+        # k-shortest paths between switches; DQN actions index these paths
+        self.path_table = self.topology.path_table
+        self._path_refresh_pending = False
+        
         # Initialize modules
         self.logger.info("Initializing Intelligent SDN Controller...")
         
         # Monitor
-        self.monitor = NetworkMonitor(*args, **kwargs)
+        self.monitor = kwargs['network_monitor']
+        
+        # Sharded deployment: this process handles the switches it owns on the hash ring
+        self.shard = None
+        if SHARDING['enabled']:
+            self.shard = ShardCoordinator(
+                os.environ.get(SHARDING['shard_id_env'], '0'),
+                create_store(SHARDING['store_backend'], SHARDING['store_path']),
+                virtual_nodes=SHARDING['virtual_nodes'],
+                heartbeat_interval=SHARDING['heartbeat_interval'],
+                member_timeout=SHARDING['member_timeout'],
+                sync_interval=SHARDING['sync_interval'],
+                logger=self.logger
+            )
+            self.shard.subscribe(NS_LINKS, self._on_shared_link)
+            self.shard.subscribe(NS_HOSTS, self._on_shared_host)
+            self.shard.add_ring_listener(self._on_shard_ring_change)
+            self.monitor.datapath_filter = self.shard.owns
+        
+        # Handler latency histograms and counters, scraped by Prometheus
+        self._congestion_latency = REGISTRY.histogram(
+            'detect_congestion', 'LSTM congestion check latency, submit to report')
+        self._register_metrics()
+        if METRICS['http_enabled']:
+            port = METRICS['http_port']
+            if self.shard is not None and self.shard.shard_id.isdigit():
+                port += int(self.shard.shard_id)
+            try:
+                REGISTRY.serve(METRICS['http_host'], port)
+                self.logger.info(f"Metrics endpoint: http://{METRICS['http_host']}:{port}/metrics")
+            except OSError as e:
+                self.logger.error(f"Error starting metrics endpoint: {e}")
+        
+        # Batched FlowMod/MeterMod writes with barrier-confirmed completion
+        self.flow_queue = FlowModQueue(
+            max_batch=CONTROLLER['flowmod_batch_size'],
+            flush_interval_ms=CONTROLLER['flowmod_flush_interval_ms'],
+            barrier_timeout=CONTROLLER['flowmod_barrier_timeout'],
+            logger=self.logger
+        )
         
         # QoS Manager
         self.qos_manager = QoSManager(*args, **kwargs)
+        self.qos_manager.flow_queue = self.flow_queue
+        
+        # Optional multi-table layout (classification / forwarding / overrides)
+        self.pipeline = None
+        if CONTROLLER['multi_table_pipeline']:
+            self.pipeline = MultiTablePipeline(L4_CLASS_RULES,
+                                               self.qos_manager.get_queue_id_for_class)
         
-        # AI Models
-        self._init_ai_models()
+        # ARP answered from the host table, broadcasts forwarded by per-switch groups
+        self.arp_proxy = ArpProxy(self.host_locations) if BROADCAST['arp_proxy'] else None
+        self.broadcast = None
+        if BROADCAST['group_table']:
+            self.broadcast = BroadcastGroups(
+                self.topology,
+                group_id=BROADCAST['group_id'],
+                priority=BROADCAST['priority'],
+                table_id=FORWARD_TABLE if self.pipeline is not None else 0,
+                arp_to_controller=self.arp_proxy is not None
+            )
+        
+        # Make-before-break rerouting of elephant flows off predicted hot links
+        self.reroute_engine = None
+        if REROUTE['enabled']:
+            self.reroute_engine = RerouteEngine(
+                self.path_table,
+                self.network_graph,
+                self._reroute_install,
+                self._reroute_delete,
+                self.flow_queue.flush,
+                flow_rates_provider=self._elephant_rates,
+                link_util_provider=self._link_utilization,
+                link_capacity=TOPOLOGY['link_bandwidth'],
+                max_reroutes=REROUTE['max_reroutes_per_cycle'],
+                min_gain=REROUTE['min_gain'],
+                hold_down=REROUTE['hold_down'],
+                phase_timeout=REROUTE['phase_timeout'],
+                logger=self.logger
+            )
+        
+        # PacketIn admission control (token buckets per switch and in_port)
+        self.admission = None
+        self.mitigation_meters = {}  # {(dpid, port): meter_id}
+        if ADMISSION_CONTROL['enabled']:
+            self.admission = PacketInAdmission(
+                switch_rate=ADMISSION_CONTROL['switch_rate'],
+                switch_burst=ADMISSION_CONTROL['switch_burst'],
+                port_rate=ADMISSION_CONTROL['port_rate'],
+                port_burst=ADMISSION_CONTROL['port_burst'],
+                policy=ADMISSION_CONTROL['policy'],
+                summary_interval=ADMISSION_CONTROL['summary_interval'],
+                mitigation_threshold=ADMISSION_CONTROL['mitigation_threshold'],
+                mitigation_duration=ADMISSION_CONTROL['mitigation_duration']
+            )
+            if ADMISSION_CONTROL['policy'] == 'summarize':
+                # Drained on a timer so the last interval of an attack is reported too
+                self.shed_summary_thread = hub.spawn(self._shed_summary_loop)
+        
+        # Forwarding decision cache (collapses duplicate PacketIns)
+        self.decision_cache = DecisionCache(
+            max_size=CONTROLLER['decision_cache_size'],
+            ttl=CONTROLLER['decision_cache_ttl']
+        )
+        
+        self.topology.add_listener(self._on_topology_change)
+        
+        # AI models, inference workers and DQN batching; until the models are
+        # loaded, routing uses shortest paths and QoS the static classifier
+        self.ai_enabled = False
+        self.traffic_predictor = None
+        self.dqn_agent = None
+        self.inference_pool = None
+        self.route_batcher = None
+        self.pending_ai_routes = {}  # {cache_key: [(datapath, msg)]}
+        # Duplicate PacketIns of a flow whose path awaits its barriers: {cache_key: [(datapath, msg)]}
+        self.pending_paths = {}
+        
+        # End-to-end path installation (one PacketIn per new flow)
+        self.proactive_enabled = CONTROLLER['proactive_path_install']
         
         # Control flags
-        self.ai_enabled = True
         self.qos_enabled = True
         self.load_balancing_enabled = True
         
         # Statistics
         self.packet_in_count = 0
         self.flow_installed_count = 0
+        self.proactive_path_count = 0
         self.congestion_events = 0
         
-        # Start AI decision thread
-        self.ai_thread = hub.spawn(self._ai_decision_loop)
+        # Congestion prediction driven by port stats epochs
+        scheduler_config = AI_MODELS['scheduler']
+        self.ai_scheduler = AIScheduler(
+            self._check_congestion,
+            self._on_predicted_congestion,
+            self.monitor.get_traffic_data_for_prediction,
+            sequence_length=AI_MODELS['lstm']['sequence_length'],
+            min_spacing=scheduler_config['min_spacing'],
+            coalesce_window=scheduler_config['coalesce_window'],
+            jump_threshold=scheduler_config['jump_threshold'],
+            request_timeout=AI_MODELS['inference_workers']['request_timeout'],
+            logger=self.logger
+        )
+        self.monitor.add_stats_listener(self._on_port_stats)
+        
+        # AI Models (torch is imported by the loader, not at controller import)
+        self.model_manager = ModelManager(
+            AI_MODELS['lstm'],
+            AI_MODELS['dqn'],
+            PATHS['models'],
+            self._on_models_ready,
+            warmup=AI_MODELS['warmup'],
+            logger=self.logger
+        )
+        if AI_MODELS['background_loading']:
+            self.logger.info("Loading AI models in the background (shortest-path routing until ready)...")
+            self.model_manager.start()
+        else:
+            self.logger.info("Loading AI models...")
+            self.model_manager.load()
+        if AI_MODELS['hot_reload']['enabled']:
+            self.model_manager.watch(AI_MODELS['hot_reload']['poll_interval'])
+        
+        # Joined last: the first heartbeat may already change the ring, and the
+        # ring listener needs the broadcast groups, flow queue and caches
+        if self.shard is not None:
+            self.shard.start()
+            self.logger.info(f"Running as shard {self.shard.shard_id}")
         
         self.logger.info("✓ Intelligent SDN Controller initialized successfully!")
     
-    def _init_ai_models(self):
-        """Initialize AI models"""
-        try:
-            # Traffic Predictor (LSTM)
-            self.logger.info("Loading Traffic Predictor (LSTM)...")
-            lstm_config = AI_MODELS['lstm']
-            self.traffic_predictor = TrafficPredictor(
-                sequence_length=lstm_config['sequence_length'],
-                hidden_size=lstm_config['hidden_size'],
-                num_layers=lstm_config['num_layers']
-            )
-            
-            # Try to load pre-trained model
-            model_path = os.path.join(PATHS['models'], 'lstm_traffic_predictor.pth')
-            if os.path.exists(model_path):
-                self.traffic_predictor.load_model(model_path)
-                self.logger.info("✓ Pre-trained LSTM model loaded")
-            else:
-                self.logger.info("⚠ No pre-trained LSTM model found. Will use untrained model.")
-            
-            # DQN Agent for Load Balancing
-            self.logger.info("Loading DQN Agent...")
-            dqn_config = AI_MODELS['dqn']
-            self.dqn_agent = DQNAgent(
-                state_size=dqn_config['state_size'],
-                action_size=dqn_config['action_size'],
-                hidden_layers=dqn_config['hidden_layers']
+    def _on_models_ready(self, traffic_predictor, dqn_agent):
+        """Start inference on freshly loaded models, then switch AI routing on"""
+        if self.ai_enabled:
+            self._swap_models(traffic_predictor, dqn_agent)
+            return
+        
+        self.traffic_predictor = traffic_predictor
+        self.dqn_agent = dqn_agent
+        
+        # Worker processes running DQN/LSTM inference off the event loop
+        pool_config = AI_MODELS['inference_workers']
+        if pool_config['enabled']:
+            try:
+                self.inference_pool = InferencePool(
+                    traffic_predictor,
+                    dqn_agent,
+                    num_workers=pool_config['num_workers'],
+                    slots=pool_config['slots_per_worker'],
+                    request_timeout=pool_config['request_timeout'],
+                    logger=self.logger
+                )
+            except Exception as e:
+                self.logger.error(f"Error starting inference workers, running inline: {e}")
+        
+        # Batched DQN inference for elephant-flow routing (window 0 = inline)
+        dqn_config = AI_MODELS['dqn']
+        if dqn_config['inference_batch_window_ms'] > 0:
+            self.route_batcher = RouteInferenceBatcher(
+                dqn_agent,
+                self._get_dqn_state,
+                window_ms=dqn_config['inference_batch_window_ms'],
+                max_batch=dqn_config['inference_max_batch'],
+                max_delay_ms=dqn_config['inference_max_delay_ms'],
+                logger=self.logger,
+                inference_pool=self.inference_pool
             )
-            
-            # Try to load pre-trained agent
-            agent_path = os.path.join(PATHS['models'], 'dqn_load_balancer.pth')
-            if os.path.exists(agent_path):
-                self.dqn_agent.load(agent_path)
-                self.logger.info("✓ Pre-trained DQN agent loaded")
-            else:
-                self.logger.info("⚠ No pre-trained DQN agent found. Will use untrained agent.")
-            
-            self.logger.info("✓ AI models initialized")
-            
-        except Exception as e:
-            self.logger.error(f"Error initializing AI models: {e}")
-            self.ai_enabled = False
+        
+        # Decisions taken without the models are no longer valid
+        self.decision_cache.invalidate()
+        self.ai_enabled = True
+        self.logger.info("✓ AI routing enabled")
+    
+    def _swap_models(self, traffic_predictor, dqn_agent):
+        """
+        Replace the models in service (hot reload or rollback)
+        Runs on the event loop between two inferences; requests already sent
+        to the inference workers are answered by the old weights.
+        """
+        self.traffic_predictor = traffic_predictor
+        self.dqn_agent = dqn_agent
+        if self.inference_pool is not None:
+            self.inference_pool.update_models(traffic_predictor, dqn_agent)
+        if self.route_batcher is not None:
+            self.route_batcher.set_agent(dqn_agent)
+        
+        # Routing decisions of the old models
+        self.decision_cache.invalidate()
+        self.logger.info("✓ AI models swapped")
     
     @set_ev_cls(ofp_event.EventOFPSwitchFeatures, CONFIG_DISPATCHER)
     def switch_features_handler(self, ev):
@@ -120,11 +320,20 @@ class IntelligentSDNController(app_manager.RyuApp):
         
         self.logger.info(f"Switch connected: {datapath.id:016x}")
         
-        # Install table-miss flow entry (send to controller)
-        match = parser.OFPMatch()
-        actions = [parser.OFPActionOutput(ofproto.OFPP_CONTROLLER,
-                                         ofproto.OFPCML_NO_BUFFER)]
-        self.add_flow(datapath, 0, match, actions)
+        if self.broadcast is not None:
+            # A reconnecting switch gets its group back once the topology is settled
+            self.broadcast.forget(datapath.id)
+        
+        if self.pipeline is not None:
+            # Classification, forwarding and override tables with their miss entries
+            for mod in self.pipeline.base_flows(datapath, self.qos_enabled):
+                self.flow_queue.send(datapath, mod)
+        else:
+            # Install table-miss flow entry (send to controller)
+            match = parser.OFPMatch()
+            actions = [parser.OFPActionOutput(ofproto.OFPP_CONTROLLER,
+                                             ofproto.OFPCML_NO_BUFFER)]
+            self.add_flow(datapath, 0, match, actions)
         
         # Configure QoS for this switch
         if self.qos_enabled:
@@ -147,53 +356,207 @@ class IntelligentSDNController(app_manager.RyuApp):
             if datapath.id not in self.datapaths:
                 self.logger.info(f'Register datapath: {datapath.id:016x}')
                 self.datapaths[datapath.id] = datapath
+                if self.shard is not None:
+                    self._apply_shard_ownership(datapath)
         elif ev.state == DEAD_DISPATCHER:
             if datapath.id in self.datapaths:
                 self.logger.info(f'Unregister datapath: {datapath.id:016x}')
                 del self.datapaths[datapath.id]
+                self.flow_queue.remove_datapath(datapath.id)
+                if self.admission is not None:
+                    self.admission.remove_switch(datapath.id)
+                self.ai_scheduler.remove_switch(datapath.id)
+                if self.reroute_engine is not None:
+                    self.reroute_engine.forget_switch(datapath.id)
+                if self.broadcast is not None:
+                    self.broadcast.forget(datapath.id)
     
     @set_ev_cls(topo_event.EventSwitchEnter)
-    def get_topology_data(self, ev):
-        """Discover network topology"""
-        switch_list = get_switch(self, None)
-        switches = [switch.dp.id for switch in switch_list]
-        
-        links_list = get_link(self, None)
-        links = [(link.src.dpid, link.dst.dpid, {
-            'port': link.src.port_no,
-            'dst_port': link.dst.port_no
-        }) for link in links_list]
-        
-        # Build network graph
-        self.network_graph.clear()
-        self.network_graph.add_nodes_from(switches)
-        self.network_graph.add_edges_from(links)
-        
-        self.logger.info(f"Topology discovered: {len(switches)} switches, {len(links)} links")
-    
-    def add_flow(self, datapath, priority, match, actions, buffer_id=None, idle_timeout=0, hard_timeout=0):
-        """Add flow entry to switch"""
+    def _switch_enter_handler(self, ev):
+        """Add a joining switch to the topology"""
+        dpid = ev.switch.dp.id
+        if self.topology.add_switch(dpid, [port.port_no for port in ev.switch.ports]):
+            self.logger.info(f"Switch joined topology: {dpid:016x} "
+                             f"(version {self.topology.version})")
+    
+    @set_ev_cls(topo_event.EventSwitchLeave)
+    def _switch_leave_handler(self, ev):
+        """Remove a leaving switch and its links"""
+        dpid = ev.switch.dp.id
+        if self.shard is not None and dpid in self.network_graph:
+            for src, dst in list(self.network_graph.in_edges(dpid)) + list(self.network_graph.out_edges(dpid)):
+                self.shard.withdraw(NS_LINKS, f'{src}:{dst}')
+        if self.topology.remove_switch(dpid):
+            self.logger.info(f"Switch left topology: {dpid:016x} "
+                             f"(version {self.topology.version})")
+        for mac in self.host_locations.remove_switch(dpid):
+            if self.shard is not None:
+                self.shard.withdraw(NS_HOSTS, mac)
+    
+    @set_ev_cls(topo_event.EventPortAdd)
+    def _port_add_handler(self, ev):
+        self.topology.add_port(ev.port.dpid, ev.port.port_no)
+        self._on_topology_change(self.topology.version)
+    
+    @set_ev_cls(topo_event.EventPortDelete)
+    def _port_delete_handler(self, ev):
+        self.topology.remove_port(ev.port.dpid, ev.port.port_no)
+        self._on_topology_change(self.topology.version)
+    
+    def _host_aging_loop(self):
+        """Forget hosts that have been silent for HOST_TABLE['aging_time']"""
+        while True:
+            hub.sleep(HOST_TABLE['aging_interval'])
+            expired = self.host_locations.expire(time.time())
+            if not expired:
+                continue
+            if self.shard is not None:
+                for mac in expired:
+                    self.shard.withdraw(NS_HOSTS, mac)
+            self.logger.info(f"Aged out {len(expired)} hosts ({len(self.host_locations)} known)")
+    
+    @set_ev_cls(topo_event.EventLinkAdd)
+    def _link_add_handler(self, ev):
+        """Add a discovered link (requires --observe-links)"""
+        link = ev.link
+        if self.topology.add_link(link.src.dpid, link.dst.dpid,
+                                  link.src.port_no, link.dst.port_no) and self.shard is not None:
+            self.shard.publish(NS_LINKS, f'{link.src.dpid}:{link.dst.dpid}',
+                               [link.src.port_no, link.dst.port_no])
+    
+    @set_ev_cls(topo_event.EventLinkDelete)
+    def _link_delete_handler(self, ev):
+        """Remove a link that went down"""
+        link = ev.link
+        if self.topology.remove_link(link.src.dpid, link.dst.dpid) and self.shard is not None:
+            self.shard.withdraw(NS_LINKS, f'{link.src.dpid}:{link.dst.dpid}')
+    
+    def _on_shared_link(self, key, value):
+        """Apply a link discovered or lost by another shard"""
+        src, dst = map(int, key.split(':'))
+        if value is None:
+            self.topology.remove_link(src, dst)
+        else:
+            self.topology.add_link(src, dst, value[0], value[1])
+    
+    def _on_shared_host(self, mac, value):
+        """Apply a host location learned by another shard"""
+        if value is None:
+            self.host_locations.pop(mac, None)
+        elif self.host_locations.learn(mac, value[0], value[1], time.time(), pinned=True) == HOST_MOVED:
+            self.decision_cache.invalidate()
+    
+    def _on_shard_ring_change(self):
+        """Live shards changed: claim or release switches"""
+        for datapath in list(self.datapaths.values()):
+            self._apply_shard_ownership(datapath)
+        self._sync_broadcast()
+    
+    def _apply_shard_ownership(self, datapath):
+        """
+        Deliver a switch's PacketIns and flow-removed messages only to its owner shard
+        The connection keeps the EQUAL role, so every shard can still install
+        the hops of its paths on switches it does not own.
+        """
         ofproto = datapath.ofproto
         parser = datapath.ofproto_parser
         
-        inst = [parser.OFPInstructionActions(ofproto.OFPIT_APPLY_ACTIONS, actions)]
+        packet_in = flow_removed = 0
+        if self.shard.owns(datapath.id):
+            packet_in = (1 << ofproto.OFPR_NO_MATCH | 1 << ofproto.OFPR_ACTION |
+                         1 << ofproto.OFPR_INVALID_TTL)
+            flow_removed = (1 << ofproto.OFPRR_IDLE_TIMEOUT | 1 << ofproto.OFPRR_HARD_TIMEOUT |
+                            1 << ofproto.OFPRR_DELETE | 1 << ofproto.OFPRR_GROUP_DELETE)
+        port_status = 1 << ofproto.OFPPR_ADD | 1 << ofproto.OFPPR_DELETE | 1 << ofproto.OFPPR_MODIFY
+        
+        datapath.send_msg(parser.OFPSetAsync(datapath, [packet_in, 0], [port_status, port_status],
+                                             [flow_removed, 0]))
+    
+    def _on_topology_change(self, version):
+        """Invalidate derived state and schedule a path table refresh"""
+        self.decision_cache.invalidate()
+        
+        if not self._path_refresh_pending:
+            self._path_refresh_pending = True
+            hub.spawn(self._refresh_paths)
+    
+    def _refresh_paths(self):
+        """Recompute invalidated paths once the topology has been quiet for a while"""
+        delay = CONTROLLER['path_refresh_delay']
+        version = None
+        while version != self.topology.version:
+            version = self.topology.version
+            hub.sleep(delay)
+        
+        self._path_refresh_pending = False
+        
+        # Compute in chunks so PacketIn handling is not blocked for seconds
+        while not self.path_table.refresh(limit=CONTROLLER['path_refresh_chunk']):
+            hub.sleep(0)
+        
+        stats = self.topology.get_statistics()
+        self.logger.info(f"Topology version {stats['version']}: {stats['switches']} switches, "
+                         f"{stats['links']} links, {self.path_table.get_statistics()['pairs']} "
+                         f"switch pairs with paths")
+        
+        self._sync_broadcast()
+    
+    def _sync_broadcast(self):
+        """Bring the broadcast groups of the switches this controller owns in line with the tree"""
+        if self.broadcast is None:
+            return
+        for dpid, datapath in list(self.datapaths.items()):
+            if self.shard is not None and not self.shard.owns(dpid):
+                self.broadcast.forget(dpid)
+                continue
+            for mod in self.broadcast.sync(datapath):
+                self.flow_queue.send(datapath, mod)
+    
+    @set_ev_cls(ofp_event.EventOFPPortStatus, MAIN_DISPATCHER)
+    def _port_status_handler(self, ev):
+        """Handle port add/delete/modify"""
+        msg = ev.msg
+        self.logger.info(f"Port {msg.desc.port_no} changed on switch {msg.datapath.id:016x} "
+                         f"(reason {msg.reason})")
+        self.decision_cache.invalidate()
+    
+    def add_flow(self, datapath, priority, match, actions, buffer_id=None, idle_timeout=0, hard_timeout=0,
+                 table_id=0, instructions=None, cookie=0):
+        """
+        Add flow entry to switch (through the batched FlowMod queue)
+        Args:
+            instructions: explicit instruction list (replaces apply-actions of `actions`)
+            cookie: opaque rule identifier (per-flow, see FlowTracker; versioned by the
+                    reroute engine); rules with a cookie report their removal
+        Returns:
+            Future resolved once the switch has confirmed the rule
+        """
+        ofproto = datapath.ofproto
+        parser = datapath.ofproto_parser
+        flags = ofproto.OFPFF_SEND_FLOW_REM if cookie else 0
+        
+        inst = instructions
+        if inst is None:
+            inst = [parser.OFPInstructionActions(ofproto.OFPIT_APPLY_ACTIONS, actions)]
         
         if buffer_id:
-            mod = parser.OFPFlowMod(datapath=datapath, buffer_id=buffer_id,
-                                   priority=priority, match=match,
+            mod = parser.OFPFlowMod(datapath=datapath, buffer_id=buffer_id, cookie=cookie,
+                                   table_id=table_id, priority=priority, match=match,
                                    instructions=inst,
                                    idle_timeout=idle_timeout,
-                                   hard_timeout=hard_timeout)
+                                   hard_timeout=hard_timeout, flags=flags)
         else:
-            mod = parser.OFPFlowMod(datapath=datapath, priority=priority,
+            mod = parser.OFPFlowMod(datapath=datapath, table_id=table_id, cookie=cookie,
+                                   priority=priority,
                                    match=match, instructions=inst,
                                    idle_timeout=idle_timeout,
-                                   hard_timeout=hard_timeout)
+                                   hard_timeout=hard_timeout, flags=flags)
         
-        datapath.send_msg(mod)
         self.flow_installed_count += 1
+        return self.flow_queue.send(datapath, mod)
     
     @set_ev_cls(ofp_event.EventOFPPacketIn, MAIN_DISPATCHER)
+    @timed('packet_in', 'PacketIn handler latency')
     def packet_in_handler(self, ev):
         """Handle PacketIn messages"""
         msg = ev.msg
@@ -202,61 +565,441 @@ class IntelligentSDNController(app_manager.RyuApp):
         parser = datapath.ofproto_parser
         in_port = msg.match['in_port']
         
-        pkt = packet.Packet(msg.data)
-        eth = pkt.get_protocol(ethernet.ethernet)
+        # Owned by another shard (ring changed before the switch's async config did)
+        if self.shard is not None and not self.shard.owns(datapath.id):
+            return
         
-        if eth.ethertype == ether_types.ETH_TYPE_LLDP:
-            # Ignore LLDP packets
+        # Shed PacketIns over the switch/port budget before doing any work
+        if self.admission is not None:
+            verdict = self.admission.admit(datapath.id, in_port, msg.total_len)
+            if verdict != ADMIT:
+                if verdict == MITIGATE:
+                    self._mitigate_port(datapath, in_port)
+                return
+        
+        # Decode headers once; shared by elephant detection and QoS classification
+        headers = parse_packet(msg.data)
+        if headers is None:
+            return
+        
+        if headers.ethertype in (ETH_TYPE_LLDP, ETH_TYPE_PROBE):
+            # Ignore LLDP packets and latency probes (handled by the monitor)
             return
         
         dpid = datapath.id
-        self.mac_to_port.setdefault(dpid, {})
         
         self.packet_in_count += 1
         
-        # Learn MAC address
-        self.mac_to_port[dpid][eth.src] = in_port
+        # Learn the host at its edge port (transit switches only see it on inter-switch ports)
+        if not self._is_switch_port(dpid, in_port):
+            # 0.0.0.0: ARP probes and DHCP from hosts without an address yet
+            ip = headers.ip_src if headers.ip_src != '0.0.0.0' else None
+            learned = self.host_locations.learn(headers.eth_src, dpid, in_port, time.time(), ip=ip)
+            if learned == HOST_MOVED:
+                # Host moved - cached decisions towards it are stale
+                self.decision_cache.invalidate()
+            if learned in (HOST_NEW, HOST_MOVED) and self.shard is not None:
+                self.shard.publish(NS_HOSTS, headers.eth_src, [dpid, in_port])
+        
+        # Answer ARP requests for known hosts instead of broadcasting them
+        if headers.ethertype == ETH_TYPE_ARP and self.arp_proxy is not None:
+            reply = self.arp_proxy.reply(headers)
+            if reply is not None:
+                self._send_frame(datapath, in_port, reply)
+                return
+        
+        # Reuse a decision taken moments ago while its FlowMod is still in flight
+        cache_key = DecisionCache.make_key(dpid, in_port, headers)
+        actions = self.decision_cache.get(cache_key)
+        if actions is not None:
+            self._send_packet_out(datapath, msg, in_port, actions)
+            return
+        
+        # The flow's path is still being installed: released with the first packet
+        held = self.pending_paths.get(cache_key)
+        if held is not None:
+            held.append((datapath, msg))
+            return
         
         # Determine output port
-        if eth.dst in self.mac_to_port[dpid]:
-            out_port = self.mac_to_port[dpid][eth.dst]
-        else:
-            out_port = ofproto.OFPP_FLOOD
+        if headers.eth_dst not in self.host_locations:
+            # Unknown destination (or broadcast) - flood along the broadcast tree without installing a flow
+            self._flood(datapath, msg, in_port)
+            return
         
-        actions = [parser.OFPActionOutput(out_port)]
+        action = None
         
-        # Install flow if destination is known
-        if out_port != ofproto.OFPP_FLOOD:
-            # Check if this is an elephant flow
-            if self._is_elephant_flow(pkt):
-                self.logger.info(f"Elephant flow detected: {eth.src} -> {eth.dst}")
-                
-                # Use AI load balancing if enabled
-                if self.load_balancing_enabled and self.ai_enabled:
-                    out_port = self._ai_route_selection(datapath, eth.src, eth.dst, in_port)
-                    actions = [parser.OFPActionOutput(out_port)]
+        # Check if this is an elephant flow
+        if self._is_elephant_flow(headers):
+            self.logger.info(f"Elephant flow detected: {headers.eth_src} -> {headers.eth_dst}")
             
-            # Apply QoS if enabled
-            if self.qos_enabled:
-                qos_class = self.qos_manager.classify_traffic(pkt)
-                queue_id = self.qos_manager.get_queue_id_for_class(qos_class)
-                
-                # Add queue action
-                actions.insert(0, parser.OFPActionSetQueue(queue_id))
-                
-                self.logger.debug(f"QoS applied: class={qos_class}, queue={queue_id}")
-            
-            match = parser.OFPMatch(in_port=in_port, eth_dst=eth.dst, eth_src=eth.src)
+            # Use AI load balancing if enabled
+            if self.load_balancing_enabled and self.ai_enabled:
+                if self.route_batcher is not None or self.inference_pool is not None:
+                    # Decided off the event loop; the route is installed when the action arrives
+                    self._queue_ai_route(datapath, msg, in_port, headers, cache_key)
+                    return
+                action = self._ai_route_selection(datapath, headers.eth_src,
+                                                  headers.eth_dst, in_port)
+        
+        self._forward(datapath, msg, in_port, headers, action, cache_key)
+    
+    def _mitigate_port(self, datapath, in_port):
+        """Install a temporary drop or meter rule for a port flooding the controller"""
+        dpid = datapath.id
+        mode = ADMISSION_CONTROL['mitigation']
+        if not mode or self._is_switch_port(dpid, in_port):
+            # Never cut an inter-switch link
+            return
+        
+        ofproto = datapath.ofproto
+        parser = datapath.ofproto_parser
+        match = parser.OFPMatch(in_port=in_port)
+        duration = ADMISSION_CONTROL['mitigation_duration']
+        
+        if mode == 'meter':
+            # Let the port reach the controller at its admission rate only. The entry
+            # replaces the table-miss for this port: it sits below the forwarding rules,
+            # so flows that already have rules keep their data-plane path
+            meter_id = self.mitigation_meters.get((dpid, in_port))
+            if meter_id is None:
+                meter_id = self.qos_manager.get_next_meter_id(dpid)
+                self.mitigation_meters[(dpid, in_port)] = meter_id
+                bands = [parser.OFPMeterBandDrop(rate=int(ADMISSION_CONTROL['port_rate']),
+                                                 burst_size=int(ADMISSION_CONTROL['port_burst']))]
+                self.flow_queue.send(datapath, parser.OFPMeterMod(
+                    datapath=datapath, command=ofproto.OFPMC_ADD,
+                    flags=ofproto.OFPMF_PKTPS | ofproto.OFPMF_BURST,
+                    meter_id=meter_id, bands=bands))
             
-            if msg.buffer_id != ofproto.OFP_NO_BUFFER:
-                self.add_flow(datapath, 1, match, actions, msg.buffer_id,
-                            idle_timeout=CONTROLLER['flow_idle_timeout'])
+            inst = [parser.OFPInstructionMeter(meter_id),
+                    parser.OFPInstructionActions(ofproto.OFPIT_APPLY_ACTIONS, [
+                        parser.OFPActionOutput(ofproto.OFPP_CONTROLLER, ofproto.OFPCML_NO_BUFFER)])]
+            self.flow_queue.send(datapath, parser.OFPFlowMod(
+                datapath=datapath, table_id=FORWARD_TABLE if self.pipeline is not None else 0,
+                priority=ADMISSION_CONTROL['meter_priority'], match=match,
+                instructions=inst, hard_timeout=duration))
+            self.flow_installed_count += 1
+        else:
+            # No actions: drop everything arriving on the port
+            self.add_flow(datapath, ADMISSION_CONTROL['mitigation_priority'], match, [],
+                          hard_timeout=duration)
+        
+        self.logger.warning(f"PacketIn flood on switch {dpid:016x} port {in_port}: "
+                            f"{mode} rule installed for {duration}s")
+    
+    def _shed_summary_loop(self):
+        """Report shed PacketIns once per summary_interval, also after the flood stopped"""
+        while True:
+            hub.sleep(ADMISSION_CONTROL['summary_interval'])
+            self._log_shed_summary()
+    
+    def _log_shed_summary(self):
+        """Report PacketIns shed since the last summary ('summarize' policy)"""
+        summary = self.admission.drain_summary()
+        if not summary:
+            return
+        
+        top = sorted(summary.items(), key=lambda item: item[1][0], reverse=True)[:5]
+        self.logger.warning("PacketIn admission shed " + ", ".join(
+            f"{packets} pkts/{nbytes} B on {dpid:016x}:{port}"
+            for (dpid, port), (packets, nbytes) in top))
+    
+    def _forward(self, datapath, msg, in_port, headers, action, cache_key):
+        """
+        Install a forwarding decision, end to end when possible
+        Args:
+            action: DQN action (path index) or None for the default path
+        Returns:
+            action list used at this switch
+        """
+        if self.proactive_enabled:
+            actions = self._install_path(datapath, msg, in_port, headers, action, cache_key)
+            if actions is not None:
+                return actions
+        
+        out_port = self._action_to_port(action, datapath.id, in_port, headers.eth_dst)
+        if out_port is None:
+            # Destination known but not reachable from this switch (yet)
+            return self._flood(datapath, msg, in_port)
+        
+        return self._install_decision(datapath, msg, in_port, headers, out_port, cache_key,
+                                      override=action is not None)
+    
+    def _flood(self, datapath, msg, in_port):
+        """
+        Release a packet along the broadcast tree
+        The packet leaves through the switch's tree ports and host ports,
+        never the port it came in on; a copy arriving on an inter-switch port
+        off the tree is dropped, so flooding cannot loop on meshes. Falls
+        back to OFPP_FLOOD while the switch's ports are unknown. Once the
+        switch has its broadcast group, the packet is handed to the group
+        and the other switches forward it without PacketIns.
+        Returns:
+            action list used
+        """
+        dpid = datapath.id
+        parser = datapath.ofproto_parser
+        self.flood_count += 1
+        
+        ports = self.topology.flood_ports(dpid)
+        if ports is None:
+            actions = [parser.OFPActionOutput(datapath.ofproto.OFPP_FLOOD)]
+        elif self._is_switch_port(dpid, in_port) and in_port not in self.topology.broadcast_ports(dpid):
+            actions = []
+        elif self.broadcast is not None and self.broadcast.installed(dpid):
+            # The group never outputs on the ingress port
+            actions = [parser.OFPActionGroup(self.broadcast.group_id)]
+        else:
+            actions = [parser.OFPActionOutput(port) for port in ports if port != in_port]
+        
+        self._send_packet_out(datapath, msg, in_port, actions)
+        return actions
+    
+    def _install_decision(self, datapath, msg, in_port, headers, out_port, cache_key, override=False):
+        """
+        Build the action list for a forwarding decision, cache it,
+        install the flow and release the packet
+        Args:
+            override: DQN-routed flow (per-flow entry in the multi-table pipeline)
+        Returns:
+            action list
+        """
+        ofproto = datapath.ofproto
+        parser = datapath.ofproto_parser
+        
+        queue_id = self._qos_queue(headers)
+        actions = self._build_actions(parser, out_port, queue_id)
+        
+        self.decision_cache.put(cache_key, actions)
+        
+        if msg.buffer_id != ofproto.OFP_NO_BUFFER:
+            self._install_rule(datapath, in_port, headers.eth_src, headers.eth_dst, out_port,
+                               queue_id, override, msg.buffer_id)
+            return actions
+        
+        self._install_rule(datapath, in_port, headers.eth_src, headers.eth_dst, out_port,
+                           queue_id, override)
+        self._send_packet_out(datapath, msg, in_port, actions)
+        return actions
+    
+    def _install_rule(self, datapath, in_port, eth_src, eth_dst, out_port, queue_id, override=False,
+                      buffer_id=None, cookie=0):
+        """
+        Install the forwarding rule of one switch
+        Single table: (in_port, eth_src, eth_dst) -> [set_queue,] output.
+        Multi-table: destination entry in the forwarding table, or a per-flow
+        entry in the override table for DQN-routed flows; the queue is set
+        by the classification table.
+        Args:
+            cookie: rule cookie (a new one from the flow tracker if 0)
+        Returns:
+            Future of the FlowMod
+        """
+        idle_timeout = CONTROLLER['flow_idle_timeout']
+        if not cookie:
+            cookie = self.monitor.flow_tracker.allocate_cookie()
+        
+        if self.pipeline is None:
+            parser = datapath.ofproto_parser
+            match = parser.OFPMatch(in_port=in_port, eth_dst=eth_dst, eth_src=eth_src)
+            return self.add_flow(datapath, PATH_PRIORITY, match,
+                                 self._build_actions(parser, out_port, queue_id),
+                                 buffer_id, idle_timeout=idle_timeout, cookie=cookie)
+        
+        table_id, match, inst = self.pipeline.forwarding_entry(
+            datapath, in_port, eth_src, eth_dst, out_port, override)
+        return self.add_flow(datapath, PATH_PRIORITY, match, None, buffer_id, idle_timeout=idle_timeout,
+                             table_id=table_id, instructions=inst, cookie=cookie)
+    
+    def _qos_queue(self, headers):
+        """Queue id for the flow's traffic class (None if QoS is disabled)"""
+        if not self.qos_enabled:
+            return None
+        
+        qos_class = self.qos_manager.classify_traffic(headers)
+        queue_id = self.qos_manager.get_queue_id_for_class(qos_class)
+        
+        self.logger.debug(f"QoS applied: class={qos_class}, queue={queue_id}")
+        return queue_id
+    
+    def _build_actions(self, parser, out_port, queue_id):
+        """Output action, preceded by a set-queue action when QoS applies"""
+        actions = [parser.OFPActionOutput(out_port)]
+        if queue_id is not None:
+            actions.insert(0, parser.OFPActionSetQueue(queue_id))
+        return actions
+    
+    def _install_path(self, datapath, msg, in_port, headers, action, cache_key):
+        """
+        Install the flow on every switch of the path at once
+        Downstream hops are programmed last hop first and flushed at once; the
+        ingress rule is installed and the packet released only when every
+        downstream FlowMod is barrier-confirmed (or path_install_timeout
+        expires), so the packet never reaches a switch ahead of its rule.
+        Duplicate PacketIns are held until then too, and only then is the
+        decision cached.
+        Args:
+            action: DQN action selecting the path at the ingress switch
+        Returns:
+            ingress action list, or None if no multi-hop path is known
+        """
+        location = self.host_locations.get(headers.eth_dst)
+        if location is None:
+            return None
+        
+        dpid = datapath.id
+        dst_dpid, host_port = location
+        if dst_dpid == dpid:
+            return None
+        
+        # Alternate paths are only chosen at the ingress switch (see _action_to_port)
+        path_index = action if action is not None and not self._is_switch_port(dpid, in_port) else 0
+        path_id = self.path_table.get_path(dpid, dst_dpid, path_index)
+        if path_id is None:
+            return None
+        
+        hops = self.path_table.hops[path_id]
+        out_ports = self.path_table.out_ports[path_id] + (host_port,)
+        hop_datapaths = [self.datapaths.get(hop) for hop in hops[1:]]
+        if None in hop_datapaths:
+            return None
+        
+        parser = datapath.ofproto_parser
+        queue_id = self._qos_queue(headers)
+        # Shortest paths are shared destination entries; alternate paths are per-flow
+        override = path_index != 0
+        # One cookie for the flow's rule on every hop
+        cookie = self.monitor.flow_tracker.allocate_cookie()
+        
+        # Downstream switches, last hop first
+        confirmations = []
+        for i in range(len(hops) - 1, 0, -1):
+            hop_dp = hop_datapaths[i - 1]
+            hop_in_port = self.network_graph[hops[i - 1]][hops[i]]['dst_port']
+            confirmations.append(self._install_rule(hop_dp, hop_in_port, headers.eth_src,
+                                                    headers.eth_dst, out_ports[i], queue_id, override,
+                                                    cookie=cookie))
+            # Do not hold a path install for the batching interval
+            self.flow_queue.flush(hop_dp.id)
+        
+        # Ingress switch
+        actions = self._build_actions(parser, out_ports[0], queue_id)
+        # Not cached yet: a duplicate answered now could overtake the downstream rules
+        self.pending_paths[cache_key] = []
+        
+        pending = {'remaining': len(confirmations), 'released': False}
+        
+        def release():
+            if pending['released']:
                 return
+            pending['released'] = True
+            held = self.pending_paths.pop(cache_key, [])
+            if msg.buffer_id != datapath.ofproto.OFP_NO_BUFFER:
+                self._install_rule(datapath, in_port, headers.eth_src, headers.eth_dst,
+                                   out_ports[0], queue_id, override, msg.buffer_id, cookie)
             else:
-                self.add_flow(datapath, 1, match, actions,
-                            idle_timeout=CONTROLLER['flow_idle_timeout'])
+                self._install_rule(datapath, in_port, headers.eth_src, headers.eth_dst,
+                                   out_ports[0], queue_id, override, cookie=cookie)
+                self._send_packet_out(datapath, msg, in_port, actions)
+            
+            self.decision_cache.put(cache_key, actions)
+            for held_datapath, held_msg in held:
+                self._send_packet_out(held_datapath, held_msg, in_port, actions)
+        
+        def confirmed(future):
+            # Failed hops also count: the packet falls back to hop-by-hop PacketIns
+            pending['remaining'] -= 1
+            if pending['remaining'] == 0:
+                release()
+        
+        for future in confirmations:
+            future.add_done_callback(confirmed)
+        hub.spawn_after(CONTROLLER['path_install_timeout'], release)
+        
+        if self.reroute_engine is not None and not self._is_switch_port(dpid, in_port):
+            self.reroute_engine.track_flow(headers.eth_src, headers.eth_dst, in_port, hops,
+                                           out_ports, queue_id, override, cookie)
+        
+        self.proactive_path_count += 1
+        self.logger.debug(f"Installing path {hops} for {headers.eth_src} -> {headers.eth_dst}")
+        return actions
+    
+    @set_ev_cls(ofp_event.EventOFPBarrierReply, MAIN_DISPATCHER)
+    def _barrier_reply_handler(self, ev):
+        """Complete the FlowMod batch confirmed by a barrier"""
+        msg = ev.msg
+        self.flow_queue.barrier_reply(msg.datapath.id, msg.xid)
+    
+    @set_ev_cls(ofp_event.EventOFPErrorMsg, [CONFIG_DISPATCHER, MAIN_DISPATCHER])
+    def _error_msg_handler(self, ev):
+        """Fail the queued FlowMod/MeterMod a switch rejected"""
+        msg = ev.msg
+        if not self.flow_queue.error_reply(msg.datapath.id, msg.xid, msg.type, msg.code):
+            self.logger.warning(f"OpenFlow error from switch {msg.datapath.id:016x}: "
+                                f"type={msg.type}, code={msg.code}")
+    
+    def _queue_ai_route(self, datapath, msg, in_port, headers, cache_key):
+        """Hand an elephant flow to the batched or pooled DQN; duplicate PacketIns wait for the same decision"""
+        waiting = self.pending_ai_routes.get(cache_key)
+        if waiting is not None:
+            waiting.append((datapath, msg))
+            return
+        
+        self.pending_ai_routes[cache_key] = [(datapath, msg)]
+        complete = lambda action: self._complete_ai_route(cache_key, in_port, headers, action)
+        if self.route_batcher is not None:
+            self.route_batcher.submit(complete)
+        else:
+            self._request_ai_route(complete)
+    
+    def _request_ai_route(self, callback):
+        """
+        Ask an inference worker for a DQN action without waiting for it
+        Args:
+            callback: called with the action (None if inference failed)
+        """
+        start = time.perf_counter_ns()
+        
+        def done(future):
+            REGISTRY.histogram('ai_route_selection').observe(start)
+            if future.exception() is not None:
+                self.logger.error(f"Error in AI route selection: {future.exception()}")
+                callback(None)
+            else:
+                callback(future.result())
+        
+        try:
+            _, state_vector = self._get_dqn_state()
+            future = self.inference_pool.select_action(state_vector)
+        except Exception as e:
+            self.logger.error(f"Error in AI route selection: {e}")
+            callback(None)
+            return
+        future.add_done_callback(done)
+    
+    def _complete_ai_route(self, cache_key, in_port, headers, action):
+        """Install a batched or pooled DQN decision for every PacketIn waiting on it"""
+        waiting = self.pending_ai_routes.pop(cache_key, None)
+        if not waiting:
+            return
+        
+        datapath, msg = waiting[0]
+        self.logger.info(f"AI routing decision: action {action}")
+        
+        actions = self._forward(datapath, msg, in_port, headers, action, cache_key)
+        held = self.pending_paths.get(cache_key)
+        for datapath, msg in waiting[1:]:
+            if held is not None:
+                held.append((datapath, msg))  # released once the path is confirmed
+            else:
+                self._send_packet_out(datapath, msg, in_port, actions)
+    
+    def _send_packet_out(self, datapath, msg, in_port, actions):
+        """Release the PacketIn payload (or switch buffer) with the given actions"""
+        ofproto = datapath.ofproto
+        parser = datapath.ofproto_parser
         
-        # Send packet out
         data = None
         if msg.buffer_id == ofproto.OFP_NO_BUFFER:
             data = msg.data
@@ -265,124 +1008,263 @@ class IntelligentSDNController(app_manager.RyuApp):
                                  in_port=in_port, actions=actions, data=data)
         datapath.send_msg(out)
     
-    def _is_elephant_flow(self, pkt):
+    def _send_frame(self, datapath, out_port, data):
+        """Send a frame built by the controller out of a switch port"""
+        ofproto = datapath.ofproto
+        parser = datapath.ofproto_parser
+        out = parser.OFPPacketOut(datapath=datapath, buffer_id=ofproto.OFP_NO_BUFFER,
+                                  in_port=ofproto.OFPP_CONTROLLER,
+                                  actions=[parser.OFPActionOutput(out_port)], data=data)
+        datapath.send_msg(out)
+    
+    def _is_elephant_flow(self, headers):
         """Determine if flow is an elephant flow"""
         # Simplified detection - in practice, track flow statistics
-        # Here we check packet size as a heuristic
-        eth = pkt.get_protocol(ethernet.ethernet)
-        
         # Check if it's a TCP flow (more likely to be elephant)
-        tcp_pkt = pkt.get_protocol(tcp.tcp)
-        if tcp_pkt:
+        if headers.ip_proto == IPPROTO_TCP:
             # Check for typical elephant flow ports (file transfer, etc.)
-            if tcp_pkt.dst_port in [20, 21, 22, 873, 3306]:  # FTP, SSH, rsync, MySQL
+            if headers.dst_port in ELEPHANT_TCP_PORTS:
                 return True
         
         return False
     
+    @timed('ai_route_selection', 'DQN route selection latency')
     def _ai_route_selection(self, datapath, src_mac, dst_mac, in_port):
-        """Use DQN agent to select optimal route"""
+        """
+        Use the local DQN agent to select optimal route (no inference workers)
+        Returns:
+            DQN action (path index), or None to fall back to the default path
+        """
         try:
-            # Get current network state
-            network_state = self.monitor.get_network_state()
-            utilization = self.monitor.get_bandwidth_utilization()
-            
-            # Convert to state vector for DQN
-            state_vector = self._build_state_vector(network_state, utilization)
+            # Convert current network state to state vector for DQN
+            _, state_vector = self._get_dqn_state()
             
             # Get action from DQN agent
             action = self.dqn_agent.select_action(state_vector, training=False)
             
-            # Map action to output port (simplified)
-            # In practice, action represents path selection
-            # Here we use a simple mapping
-            available_ports = [1, 2, 3]
-            if action < len(available_ports):
-                out_port = available_ports[action]
-            else:
-                out_port = available_ports[0]
+            self.logger.info(f"AI routing decision: action {action}")
             
-            self.logger.info(f"AI routing decision: port {out_port} (action {action})")
-            
-            return out_port
+            return action
             
         except Exception as e:
             self.logger.error(f"Error in AI route selection: {e}")
-            return 1  # Fallback to default port
+            return None  # Fallback to default path
     
-    def _build_state_vector(self, network_state, utilization):
-        """Build state vector for DQN from network state"""
-        state_vector = []
-        
-        # Add link utilizations
-        for dpid, ports in utilization.items():
-            for port_no, util in ports.items():
-                state_vector.append(util['avg_utilization'])
+    def _action_to_port(self, action, dpid, in_port, dst_mac):
+        """
+        Map a DQN action to an output port
+        At the ingress switch the action selects one of the k shortest paths
+        towards the destination's edge switch. Transit switches follow the
+        shortest path so a flow can never loop between alternate paths.
+        Returns:
+            output port (shortest path if the action's path does not exist),
+            or None if the destination is unknown or unreachable
+        """
+        location = self.host_locations.get(dst_mac)
+        if location is None:
+            return None
         
-        # Pad or truncate to match DQN state size
-        state_size = AI_MODELS['dqn']['state_size']
-        while len(state_vector) < state_size:
-            state_vector.append(0.0)
+        dst_dpid, host_port = location
+        if dst_dpid == dpid:
+            return host_port
         
-        return np.array(state_vector[:state_size], dtype=np.float32)
+        path_index = action if action is not None and not self._is_switch_port(dpid, in_port) else 0
+        out_port = self.path_table.first_hop_port(dpid, dst_dpid, path_index)
+        if out_port is None and path_index:
+            out_port = self.path_table.first_hop_port(dpid, dst_dpid, 0)
+        return out_port
     
-    def _ai_decision_loop(self):
-        """AI decision loop running in background"""
-        while True:
+    def _is_switch_port(self, dpid, port):
+        """True if the port connects to another switch"""
+        return self.topology.is_switch_port(dpid, port)
+    
+    def _get_dqn_state(self):
+        """
+        DQN state vector for the current monitoring epoch
+        The monitor keeps per-port utilization in a preallocated array whose
+        columns are fixed per (dpid, port), so the vector is a view of it and
+        each DQN input always sees the same link, whatever order switches
+        connected in.
+        Returns:
+            (epoch, state_vector)
+        """
+        return self.monitor.stats_epoch, self.monitor.get_state_vector(AI_MODELS['dqn']['state_size'])
+    
+    def _on_port_stats(self, dpid, utilization):
+        """Feed a port stats epoch to the AI scheduler"""
+        if self.ai_enabled:
+            self.ai_scheduler.on_port_stats(dpid, utilization)
+    
+    def _check_congestion(self, sequence):
+        """
+        Run the LSTM congestion check for one link, in an inference worker when available
+        Returns:
+            Future resolving to the congestion report
+        """
+        scheduler_config = AI_MODELS['scheduler']
+        threshold = scheduler_config['congestion_threshold']
+        steps = scheduler_config['prediction_steps']
+        future = Future()
+        start = time.perf_counter_ns()
+        
+        if self.inference_pool is None:
+            future.set_result(self.traffic_predictor.congestion_from_predictions(
+                sequence, self.traffic_predictor.predict_future(sequence, steps=steps), threshold))
+            self._congestion_latency.observe(start)
+            return future
+        
+        def predicted(prediction):
             try:
-                hub.sleep(10)  # Run every 10 seconds
-                
-                if not self.ai_enabled:
-                    continue
-                
-                # Get current network state
-                network_state = self.monitor.get_network_state()
-                
-                # Get traffic data for prediction
-                traffic_data = self.monitor.get_traffic_data_for_prediction()
-                
-                if len(traffic_data) >= 10:
-                    # Predict future congestion
-                    sequence = traffic_data[-10:]
-                    congestion_info = self.traffic_predictor.detect_congestion(
-                        sequence, threshold=80.0
-                    )
-                    
-                    if congestion_info['congestion_detected']:
-                        self.logger.warning(
-                            f"⚠ Congestion predicted! "
-                            f"Max utilization will reach {congestion_info['max_predicted_utilization']:.1f}%"
-                        )
-                        self.congestion_events += 1
-                        
-                        # Take proactive action (e.g., reroute flows)
-                        self._handle_predicted_congestion(congestion_info)
-                
+                future.set_result(self.traffic_predictor.congestion_from_predictions(
+                    sequence, prediction.result(), threshold))
             except Exception as e:
-                self.logger.error(f"Error in AI decision loop: {e}")
+                future.set_exception(e)
+            self._congestion_latency.observe(start)
+        
+        self.inference_pool.predict_future(sequence, steps=steps).add_done_callback(predicted)
+        return future
+    
+    def _on_predicted_congestion(self, link, congestion_info):
+        """Act on a link the LSTM predicts will congest"""
+        dpid, port_no = link
+        self.logger.warning(
+            f"⚠ Congestion predicted on switch {dpid:016x} port {port_no}! "
+            f"Max utilization will reach {congestion_info['max_predicted_utilization']:.1f}%"
+        )
+        self.congestion_events += 1
+        
+        # Take proactive action: reroute elephant flows
+        self._handle_predicted_congestion(link, congestion_info)
+    
+    def _handle_predicted_congestion(self, link, congestion_info):
+        """Move elephant flows off a link predicted to congest"""
+        if self.reroute_engine is None:
+            return
+        
+        switch_link = self.reroute_engine.link_of_port(*link)
+        if switch_link is None:
+            # Host port: no alternate path exists
+            return
+        
+        self.reroute_engine.request(switch_link, congestion_info['max_predicted_utilization'])
+    
+    def _elephant_rates(self):
+        """
+        Current rate of the elephant flows, read from their ingress rule
+        Returns:
+            {(eth_src, eth_dst): Mbps}
+        """
+        rates = {}
+        flows = self.reroute_engine.flows
+        for flow in self.monitor.get_elephant_flows():
+            match = flow['match']
+            key = (match.get('eth_src'), match.get('eth_dst'))
+            record = flows.get(key)
+            if record is None:
+                continue
+            rule = record['rules'].get((record['hops'][0], record['ingress_port']))
+            if flow['dpid'] != record['hops'][0] or rule is None or rule[1] != flow['cookie']:
+                continue
+            rates[key] = flow['byte_rate'] * 8 / 1e6
+        return rates
+    
+    def _link_utilization(self):
+        """
+        Transmit utilization of every switch-to-switch link
+        Returns:
+            {(src_dpid, dst_dpid): utilization %}
+        """
+        utilization = self.monitor.get_bandwidth_utilization()
+        links = {}
+        for src, dst, data in self.network_graph.edges(data=True):
+            port = utilization.get(src, {}).get(data['port'])
+            if port is not None:
+                links[(src, dst)] = port['tx_utilization']
+        return links
     
-    def _handle_predicted_congestion(self, congestion_info):
-        """Handle predicted congestion proactively"""
-        self.logger.info("Taking proactive action for predicted congestion...")
+    def _reroute_install(self, dpid, in_port, eth_src, eth_dst, out_port, queue_id, cookie):
+        """Per-flow rule written by the reroute engine"""
+        datapath = self.datapaths.get(dpid)
+        if datapath is None:
+            future = Future()
+            future.set_exception(ConnectionError(f"switch {dpid:016x} disconnected"))
+            return future
         
-        # Get elephant flows
-        elephant_flows = self.monitor.get_elephant_flows()
+        if not self._is_switch_port(dpid, in_port):
+            # The ingress decision changed
+            self.decision_cache.invalidate()
+        return self._install_rule(datapath, in_port, eth_src, eth_dst, out_port, queue_id,
+                                  override=True, cookie=cookie)
+    
+    def _reroute_delete(self, dpid, in_port, eth_src, eth_dst, override, cookie):
+        """
+        Remove a rule left behind by a reroute, only if it still carries `cookie`
+        Returns:
+            Future of the FlowMod, None for shared destination entries (multi-table)
+        """
+        datapath = self.datapaths.get(dpid)
+        if datapath is None or (self.pipeline is not None and not override):
+            return None
+        
+        ofproto = datapath.ofproto
+        parser = datapath.ofproto_parser
+        if self.pipeline is None:
+            table_id = 0
+            match = parser.OFPMatch(in_port=in_port, eth_dst=eth_dst, eth_src=eth_src)
+        else:
+            table_id, match, _ = self.pipeline.forwarding_entry(
+                datapath, in_port, eth_src, eth_dst, 0, override=True)
         
-        # Reroute elephant flows to alternate paths
-        for flow in elephant_flows[:3]:  # Reroute top 3 elephant flows
-            self.logger.info(f"Rerouting elephant flow: {flow['byte_count']} bytes")
-            # In practice, compute alternate path and install new flows
+        mod = parser.OFPFlowMod(datapath=datapath, table_id=table_id, priority=PATH_PRIORITY, match=match,
+                                command=ofproto.OFPFC_DELETE_STRICT,
+                                cookie=cookie, cookie_mask=0xffffffffffffffff,
+                                out_port=ofproto.OFPP_ANY, out_group=ofproto.OFPG_ANY)
+        return self.flow_queue.send(datapath, mod)
+    
+    def _register_metrics(self):
+        """Export the controller counters next to the latency histograms"""
+        REGISTRY.add_value('packet_in_total', 'PacketIns processed',
+                           lambda: self.packet_in_count, 'counter')
+        REGISTRY.add_value('flows_installed_total', 'Flow entries installed',
+                           lambda: self.flow_installed_count, 'counter')
+        REGISTRY.add_value('congestion_events_total', 'Congestion events detected',
+                           lambda: self.congestion_events, 'counter')
+        REGISTRY.add_value('floods_total', 'Packets flooded along the broadcast tree',
+                           lambda: self.flood_count, 'counter')
+        REGISTRY.add_value('switches', 'Connected switches', lambda: len(self.datapaths))
+        REGISTRY.add_value('hosts', 'Known hosts', lambda: len(self.host_locations))
     
     def get_statistics(self):
         """Get controller statistics"""
         return {
             'packet_in_count': self.packet_in_count,
             'flow_installed_count': self.flow_installed_count,
+            'proactive_path_count': self.proactive_path_count,
             'congestion_events': self.congestion_events,
+            'flood_count': self.flood_count,
             'active_switches': len(self.datapaths),
             'ai_enabled': self.ai_enabled,
+            'models': self.model_manager.get_statistics(),
             'qos_enabled': self.qos_enabled,
-            'load_balancing_enabled': self.load_balancing_enabled
+            'load_balancing_enabled': self.load_balancing_enabled,
+            'decision_cache': self.decision_cache.get_statistics(),
+            'topology': self.topology.get_statistics(),
+            'hosts': self.host_locations.get_statistics(),
+            'arp_proxy': self.arp_proxy.get_statistics() if self.arp_proxy else None,
+            'broadcast': self.broadcast.get_statistics() if self.broadcast else None,
+            'path_table': self.path_table.get_statistics(),
+            'route_batcher': self.route_batcher.get_statistics() if self.route_batcher else None,
+            'flow_queue': self.flow_queue.get_statistics(),
+            'admission': self.admission.get_statistics() if self.admission else None,
+            'inference_pool': self.inference_pool.get_statistics() if self.inference_pool else None,
+            'ai_scheduler': self.ai_scheduler.get_statistics(),
+            'polling': self.monitor.get_polling_statistics(),
+            'flows': self.monitor.flow_tracker.get_statistics(),
+            'heavy_hitters': self.monitor.heavy_hitters.get_statistics(time.time()),
+            'link_latency': self.monitor.get_latency_statistics(),
+            'reroute': self.reroute_engine.get_statistics() if self.reroute_engine else None,
+            'shard': self.shard.get_statistics() if self.shard else None,
+            'latency': REGISTRY.snapshot()
         }
     
     def print_statistics(self):
@@ -393,11 +1275,87 @@ class IntelligentSDNController(app_manager.RyuApp):
         self.logger.info("Controller Statistics:")
         self.logger.info(f"  Packet-In processed: {stats['packet_in_count']}")
         self.logger.info(f"  Flows installed: {stats['flow_installed_count']}")
+        self.logger.info(f"  End-to-end paths installed: {stats['proactive_path_count']}")
         self.logger.info(f"  Congestion events detected: {stats['congestion_events']}")
         self.logger.info(f"  Active switches: {stats['active_switches']}")
-        self.logger.info(f"  AI enabled: {stats['ai_enabled']}")
+        hosts = stats['hosts']
+        self.logger.info(f"  Hosts: {hosts['hosts']} known ({hosts['moves']} moves, "
+                         f"{hosts['expired']} aged out), {stats['flood_count']} floods")
+        if stats['arp_proxy']:
+            self.logger.info(f"  ARP proxy: {stats['arp_proxy']['answered']} requests answered, "
+                             f"{stats['arp_proxy']['unknown']} broadcast")
+        if stats['broadcast']:
+            self.logger.info(f"  Broadcast groups: {stats['broadcast']['switches']} switches")
+        models = stats['models']
+        loaded = f", loaded in {models['load_seconds']:.2f}s" if models['load_seconds'] is not None else ''
+        self.logger.info(f"  AI enabled: {stats['ai_enabled']} (models {models['state']}, "
+                         f"version {models['version']}{loaded})")
         self.logger.info(f"  QoS enabled: {stats['qos_enabled']}")
         self.logger.info(f"  Load balancing enabled: {stats['load_balancing_enabled']}")
+        cache = stats['decision_cache']
+        self.logger.info(f"  Decision cache: {cache['hits']} hits, {cache['misses']} misses "
+                         f"({cache['hit_rate']*100:.1f}% hit rate, {cache['size']} entries)")
+        batcher = stats['route_batcher']
+        if batcher:
+            self.logger.info(f"  DQN batches: {batcher['batches']} "
+                             f"(avg size {batcher['avg_batch_size']:.1f}, "
+                             f"max wait {batcher['max_wait_ms']:.2f} ms)")
+        admission = stats['admission']
+        if admission:
+            self.logger.info(f"  PacketIn admission: {admission['admitted']} admitted, "
+                             f"{admission['shed_port'] + admission['shed_switch']} shed "
+                             f"({admission['shed_rate']*100:.1f}%), "
+                             f"{admission['mitigations']} mitigation rules")
+        pool = stats['inference_pool']
+        if pool:
+            self.logger.info(f"  Inference workers: {pool['workers_ready']}/{pool['workers']} ready, "
+                             f"{pool['submitted']} requests ({pool['fallbacks']} inline), "
+                             f"avg {pool['avg_latency_ms']:.2f} ms")
+        scheduler = stats['ai_scheduler']
+        self.logger.info(f"  AI scheduler: {scheduler['runs']} runs, {scheduler['links_predicted']} link predictions "
+                         f"({scheduler['epoch_triggers']} epoch / {scheduler['jump_triggers']} jump triggers, "
+                         f"{scheduler['coalesced']} coalesced), detection-to-action "
+                         f"p50 {scheduler['latency_p50_ms']:.0f} ms / p99 {scheduler['latency_p99_ms']:.0f} ms")
+        polling = stats['polling']
+        self.logger.info(f"  Stats polling: {polling['switches']} switches every "
+                         f"{polling['interval_min']:.1f}-{polling['interval_max']:.1f} s, "
+                         f"{polling['demand_per_sec']:.1f}/{polling['request_budget']:.0f} requests/s, "
+                         f"freshness p50 {polling['freshness_p50']:.1f} s / max {polling['freshness_max']:.1f} s")
+        flows = stats['flows']
+        self.logger.info(f"  Tracked flows: {flows['flows']} ({flows['elephants']} elephants), "
+                         f"{sum(flows['removed'].values())} removed / {flows['expired']} expired")
+        heavy = stats['heavy_hitters']
+        top = self.monitor.get_top_flows(1)
+        self.logger.info(f"  Heavy hitters: {heavy['candidates']} candidates in "
+                         f"{heavy['memory_bytes'] / 1024:.0f} KB ({heavy['depth']}x{heavy['width']}), "
+                         f"top flow {top[0]['rate_mbps'] if top else 0.0:.2f} Mbps "
+                         f"(+{heavy['error_bound_mbps']:.2f} Mbps bound)")
+        latency = stats['link_latency']
+        if latency:
+            self.logger.info(f"  Link latency: {latency['measured_links']}/{latency['links']} links, "
+                             f"avg {latency['avg_latency_ms']:.2f} ms / max {latency['max_latency_ms']:.2f} ms, "
+                             f"{latency['probes_per_sec']:.1f} probes/s "
+                             f"(every {latency['probe_interval']:.1f} s per link)")
+        reroute = stats['reroute']
+        if reroute:
+            self.logger.info(f"  Reroutes: {reroute['flows_moved']} flows moved in {reroute['cycles']} cycles "
+                             f"({reroute['failed_moves']} aborted), "
+                             f"avg MLU removed {reroute['avg_mlu_removed']:.1f} points")
+        shard = stats['shard']
+        if shard:
+            owned = sum(1 for dpid in self.datapaths if self.shard.owns(dpid))
+            self.logger.info(f"  Shard {shard['shard_id']}: owns {owned}/{len(self.datapaths)} switches, "
+                             f"live shards {shard['live_shards']}, "
+                             f"{shard['published']} published / {shard['applied']} applied updates")
+        for name, latency in stats['latency'].items():
+            self.logger.info(f"  Latency {name}: {latency['count']} samples, {latency['rate']}/s, "
+                             f"p50 {latency['p50_us']:.1f} us / p90 {latency['p90_us']:.1f} us / "
+                             f"p99 {latency['p99_us']:.1f} us / max {latency['max_us']:.1f} us")
+        for dpid, queue in stats['flow_queue'].items():
+            self.logger.info(f"  FlowMod queue {dpid:016x}: depth {queue['queue_depth']}, "
+                             f"{queue['messages']} msgs in {queue['flushes']} flushes, "
+                             f"flush latency avg {queue['avg_flush_latency_ms']:.2f} ms / "
+                             f"max {queue['max_flush_latency_ms']:.2f} ms")
         self.logger.info("="*60)
 
 
@@ -0,0 +1,385 @@
+"""
+Model Manager - Nạp mô hình AI ở chế độ nền và nạp lại nóng
+Import torch, dựng và nạp LSTM/DQN trong luồng riêng, kiểm tra trên đầu vào mẫu rồi hoán đổi mô hình (có rollback)
+"""
+
+import os
+import threading
+import time
+
+import numpy as np
+
+from ryu.lib import hub
+
+# Load states
+STATE_IDLE = 'idle'
+STATE_LOADING = 'loading'
+STATE_READY = 'ready'
+STATE_FAILED = 'failed'
+
+
+class ModelManager:
+    """
+    Builds the TrafficPredictor and DQNAgent off the event loop
+    Importing torch and constructing/loading both models takes seconds, so
+    in background mode it runs in an OS thread (Ryu leaves threading
+    unpatched) while the controller already answers switches with its
+    non-AI fallback. A green thread waits for the loader and hands the
+    warmed-up models to `on_ready` from the event loop, where the
+    controller swaps them in and enables AI in one step.
+    Reloads (on request or when a weight file changes) build fresh model
+    objects the same way while the current ones keep serving. New weights
+    must give finite outputs of the right shape on a canned input before
+    they are handed to `on_ready`; otherwise they are rejected and the
+    current version stays. The replaced version is kept for rollback().
+    """
+    
+    def __init__(self, lstm_config, dqn_config, models_dir, on_ready, warmup=True, logger=None):
+        """
+        Args:
+            lstm_config: AI_MODELS['lstm']
+            dqn_config: AI_MODELS['dqn']
+            models_dir: directory of the pre-trained weight files
+            on_ready: callable(traffic_predictor, dqn_agent), called on the event loop
+            warmup: run one inference per model before publishing them
+            logger: logger for progress and errors
+        """
+        self.lstm_config = lstm_config
+        self.dqn_config = dqn_config
+        self.models_dir = models_dir
+        self.on_ready = on_ready
+        self.warmup = warmup
+        self.logger = logger
+        
+        self.state = STATE_IDLE
+        self.error = None
+        self.load_seconds = None
+        self.reload_seconds = None
+        self.warmup_ms = None
+        self.pretrained = {}  # {'lstm': bool, 'dqn': bool}
+        self._thread = None
+        
+        # Published models: (version, predictor, agent) in service and the one it replaced
+        self.version = 0
+        self._current = None
+        self._previous = None
+        self._reloading = False
+        self._file_stamps = None  # weight file stamps of the last load attempt
+        self._watch_thread = None
+        
+        # Statistics
+        self.reloads = 0
+        self.rejected = 0
+        self.rollbacks = 0
+    
+    def load(self):
+        """Load synchronously (blocks the caller until the models are published)"""
+        self.state = STATE_LOADING
+        result = {}
+        self._build(result)
+        self._publish(result)
+    
+    def start(self):
+        """Load in the background; returns at once"""
+        self.state = STATE_LOADING
+        self._thread = hub.spawn(self._load_in_background)
+    
+    def reload(self):
+        """
+        Load the weight files again in the background and swap the new
+        models in once they pass validation
+        Returns:
+            False if a load is already in progress
+        """
+        if self.state == STATE_LOADING or self._reloading:
+            return False
+        self._reloading = True
+        self._thread = hub.spawn(self._load_in_background)
+        return True
+    
+    def rollback(self):
+        """
+        Put the models replaced by the last swap back in service
+        They stay in service until the weight files change again or reload()
+        is called.
+        Returns:
+            False if there is no previous version
+        """
+        if self._previous is None or self._reloading:
+            return False
+        previous_version, predictor, agent = self._previous
+        try:
+            self.on_ready(predictor, agent)
+        except Exception as e:
+            if self.logger:
+                self.logger.error(f"Error rolling back AI models: {e}")
+            return False
+        
+        if self.logger:
+            self.logger.info(f"AI models rolled back from version {self.version} to {previous_version}")
+        self._current, self._previous = self._previous, None
+        self.version = previous_version
+        self.rollbacks += 1
+        return True
+    
+    def watch(self, poll_interval=2.0):
+        """Reload whenever a weight file changes (polled from a green thread)"""
+        if self._watch_thread is None:
+            self._watch_thread = hub.spawn(self._watch_loop, poll_interval)
+    
+    def _watch_loop(self, poll_interval):
+        seen = None
+        while True:
+            hub.sleep(poll_interval)
+            stamps = self._stamp_files()
+            # Reload once a changed file looks the same on two polls (write finished)
+            if stamps != self._file_stamps and stamps == seen and \
+                    self.state != STATE_LOADING and not self._reloading:
+                if self.logger:
+                    self.logger.info("Model weight files changed, reloading...")
+                self.reload()
+            seen = stamps
+    
+    def _paths(self):
+        return (os.path.join(self.models_dir, 'lstm_traffic_predictor.pth'),
+                os.path.join(self.models_dir, 'dqn_load_balancer.pth'))
+    
+    def _stamp_files(self):
+        """(mtime, size) of each weight file, None if missing"""
+        stamps = []
+        for path in self._paths():
+            try:
+                stat = os.stat(path)
+                stamps.append((stat.st_mtime_ns, stat.st_size))
+            except OSError:
+                stamps.append(None)
+        return tuple(stamps)
+    
+    def _load_in_background(self, poll_interval=0.05):
+        result = {}
+        loader = threading.Thread(target=self._build, args=(result,), name='model-loader', daemon=True)
+        loader.start()
+        while loader.is_alive():
+            hub.sleep(poll_interval)
+        self._publish(result)
+    
+    def _build(self, result):
+        """
+        Import, construct, load and warm up both models (runs in the loader thread)
+        Args:
+            result: dict receiving 'models' or 'error'
+        """
+        began = time.monotonic()
+        try:
+            # torch is only imported here, never on the controller's startup path
+            from ai_models.traffic_predictor import TrafficPredictor
+            from ai_models.dqn_agent import DQNAgent
+            
+            self._file_stamps = self._stamp_files()
+            model_path, agent_path = self._paths()
+            pretrained = {'lstm': os.path.exists(model_path), 'dqn': os.path.exists(agent_path)}
+            if self._reloading and not all(pretrained.values()):
+                raise FileNotFoundError(f"weight files missing from {self.models_dir}")
+            
+            lstm_config = self.lstm_config
+            predictor = TrafficPredictor(
+                sequence_length=lstm_config['sequence_length'],
+                hidden_size=lstm_config['hidden_size'],
+                num_layers=lstm_config['num_layers'],
+                verbose=False
+            )
+            if pretrained['lstm']:
+                predictor.load_model(model_path)
+            
+            dqn_config = self.dqn_config
+            agent = DQNAgent(
+                state_size=dqn_config['state_size'],
+                action_size=dqn_config['action_size'],
+                hidden_layers=dqn_config['hidden_layers'],
+                verbose=False
+            )
+            if pretrained['dqn']:
+                agent.load(agent_path)
+            
+            if self.warmup or self._reloading:
+                # The validation passes also allocate the kernels' buffers
+                warmup_began = time.monotonic()
+                self._validate(predictor, agent)
+                result['warmup_ms'] = (time.monotonic() - warmup_began) * 1000
+            
+            result['models'] = (predictor, agent)
+            result['pretrained'] = pretrained
+        except Exception as e:
+            result['error'] = e
+        result['seconds'] = time.monotonic() - began
+    
+    def _validate(self, predictor, agent):
+        """
+        Run both models on canned inputs
+        Raises:
+            ValueError if an output has the wrong shape or is not finite
+        """
+        import torch
+        
+        sequence_length = self.lstm_config['sequence_length']
+        state_size = self.dqn_config['state_size']
+        with torch.no_grad():
+            # Normalized utilization ramp, and idle / half / fully loaded networks
+            sequence = torch.linspace(0.0, 1.0, sequence_length).reshape(1, sequence_length, 1)
+            prediction = predictor.model(sequence.to(predictor.device)).cpu().numpy()
+            states = np.repeat(np.array([[0.0], [0.5], [1.0]], dtype=np.float32), state_size, axis=1)
+            q_values = agent.policy_net(agent.states_to_tensor(states)).cpu().numpy()
+        
+        if prediction.shape != (1, 1) or not np.isfinite(prediction).all():
+            raise ValueError(f"LSTM output {prediction.tolist()} on the canned input is invalid")
+        if q_values.shape != (len(states), self.dqn_config['action_size']) or \
+                not np.isfinite(q_values).all():
+            raise ValueError("DQN Q-values on the canned input are invalid")
+    
+    def _publish(self, result):
+        """Hand the models to the controller (event loop side)"""
+        reloading, self._reloading = self._reloading, False
+        if 'error' in result:
+            self.error = result['error']
+            if reloading:
+                self.rejected += 1
+                if self.logger:
+                    self.logger.error(f"Rejected reloaded AI models, keeping version {self.version}: "
+                                      f"{self.error}")
+            else:
+                self.state = STATE_FAILED
+                if self.logger:
+                    self.logger.error(f"Error initializing AI models: {self.error}")
+            return
+        
+        predictor, agent = result['models']
+        pretrained = result['pretrained']
+        if self.logger:
+            lstm_params = sum(p.numel() for p in predictor.model.parameters())
+            dqn_params = sum(p.numel() for p in agent.policy_net.parameters())
+            self.logger.info(
+                f"✓ AI models version {self.version + 1} loaded in {result['seconds']:.2f}s on {agent.device} "
+                f"(LSTM {lstm_params} params, {'pre-trained' if pretrained['lstm'] else 'untrained'}; "
+                f"DQN {dqn_params} params, {'pre-trained' if pretrained['dqn'] else 'untrained'})")
+        try:
+            self.on_ready(predictor, agent)
+        except Exception as e:
+            self.error = e
+            if self.logger:
+                self.logger.error(f"Error enabling AI models: {e}")
+            if not reloading:
+                self.state = STATE_FAILED
+            elif self._current is not None:
+                # Half-swapped: put the serving version back everywhere
+                try:
+                    self.on_ready(*self._current[1:])
+                except Exception as e:
+                    if self.logger:
+                        self.logger.error(f"Error restoring AI models version {self.version}: {e}")
+            return
+        
+        self.version += 1
+        if self._current is not None:
+            self._previous = self._current
+            self.reloads += 1
+        self._current = (self.version, predictor, agent)
+        self.pretrained = pretrained
+        self.error = None
+        if reloading:
+            self.reload_seconds = result['seconds']
+        else:
+            self.load_seconds = result['seconds']
+            self.warmup_ms = result.get('warmup_ms')
+        self.state = STATE_READY
+    
+    def get_statistics(self):
+        """Get load state and timings"""
+        return {
+            'state': self.state,
+            'version': self.version,
+            'previous_version': self._previous[0] if self._previous else None,
+            'load_seconds': self.load_seconds,
+            'reload_seconds': self.reload_seconds,
+            'warmup_ms': self.warmup_ms,
+            'pretrained': dict(self.pretrained),
+            'reloading': self._reloading,
+            'reloads': self.reloads,
+            'rejected': self.rejected,
+            'rollbacks': self.rollbacks,
+            'error': str(self.error) if self.error else None
+        }
+
+
+class _BenchDatapath:
+    """Datapath stand-in recording when the first bytes are written"""
+    
+    def __init__(self, dpid):
+        from ryu.ofproto import ofproto_v1_3, ofproto_v1_3_parser
+        self.id = dpid
+        self.ofproto = ofproto_v1_3
+        self.ofproto_parser = ofproto_v1_3_parser
+        self.xid = 0
+        self.first_write = None
+    
+    def set_xid(self, msg):
+        self.xid += 1
+        msg.set_xid(self.xid)
+        return self.xid
+    
+    def send(self, buf):
+        if self.first_write is None:
+            self.first_write = time.perf_counter()
+        return True
+    
+    def send_msg(self, msg):
+        self.set_xid(msg)
+        msg.serialize()
+        return self.send(msg.buf)
+
+
+def _time_to_first_flowmod(background, results):
+    """
+    Fresh controller process: seconds from importing the controller to the
+    table-miss FlowMod of the first switch, and to AI routing being enabled
+    """
+    began = time.perf_counter()
+    from types import SimpleNamespace
+    from environment.config import AI_MODELS, METRICS
+    AI_MODELS['background_loading'] = background
+    METRICS['http_enabled'] = False
+    from controller.main_controller import IntelligentSDNController
+    from controller.monitor import NetworkMonitor
+    
+    controller = IntelligentSDNController(network_monitor=NetworkMonitor())
+    datapath = _BenchDatapath(1)
+    controller.switch_features_handler(SimpleNamespace(msg=SimpleNamespace(datapath=datapath)))
+    while datapath.first_write is None:
+        hub.sleep(0.001)
+    while not controller.ai_enabled and controller.model_manager.state == STATE_LOADING:
+        hub.sleep(0.01)
+    ready = time.perf_counter()
+    
+    results.put((datapath.first_write - began, ready - began, controller.model_manager.get_statistics()))
+    if controller.inference_pool is not None:
+        controller.inference_pool.shutdown()
+    os._exit(0)
+
+
+if __name__ == "__main__":
+    # Time to first FlowMod of a new controller process, synchronous model
+    # loading (previous behaviour) vs background loading
+    import multiprocessing
+    
+    ctx = multiprocessing.get_context('spawn')
+    for name, background in [('Synchronous loading', False), ('Background loading ', True)]:
+        runs = []
+        for _ in range(3):
+            results = ctx.Queue()
+            process = ctx.Process(target=_time_to_first_flowmod, args=(background, results))
+            process.start()
+            runs.append(results.get(timeout=300))
+            process.join()
+        first = sorted(run[0] for run in runs)[1]
+        ready = sorted(run[1] for run in runs)[1]
+        print(f"{name}: first FlowMod after {first * 1000:.0f} ms, AI routing on after {ready:.2f}s "
+              f"(median of 3, models {runs[-1][2]['state']})")
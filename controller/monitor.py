@@ -9,6 +9,7 @@ from ryu.controller.handler import CONFIG_DISPATCHER, MAIN_DISPATCHER, DEAD_DISP
 from ryu.controller.handler import set_ev_cls
 from ryu.ofproto import ofproto_v1_3
 from ryu.lib import hub
+from ryu.topology import event as topo_event
 from ryu.lib.packet import packet, ethernet, ipv4, tcp, udp
 
 import time
@@ -18,9 +19,22 @@ import os
 from datetime import datetime
 from collections import defaultdict
 
+import numpy as np
+
 import sys
 sys.path.append('..')
-from environment.config import DATA_COLLECTION, CONTROLLER
+from environment.config import DATA_COLLECTION, CONTROLLER, TRAFFIC_CLASSIFICATION, HEAVY_HITTERS, PATHS, SHARDING
+from controller.link_index import LinkIndex
+from controller.stats_store import PortStatsStore, COUNTERS, UTILIZATION
+from controller.metrics import timed
+from controller.poll_scheduler import PollScheduler
+from controller.flow_tracker import FlowTracker
+from controller.heavy_hitters import HeavyHitterSketch
+from controller.latency import LatencyProber
+from controller.packet_parser import ETH_TYPE_PROBE
+
+
+_PROBE_ETH_TYPE = ETH_TYPE_PROBE.to_bytes(2, 'big')
 
 
 class NetworkMonitor(app_manager.RyuApp):
@@ -31,17 +45,52 @@ class NetworkMonitor(app_manager.RyuApp):
         self.datapaths = {}
         self.monitor_thread = hub.spawn(self._monitor)
         
-        # Data structures for statistics
-        self.port_stats = {}  # {dpid: {port_no: stats}}
-        self.flow_stats = {}  # {dpid: [flow_entries]}
-        self.port_speed = {}  # {dpid: {port_no: (tx_bytes, rx_bytes, timestamp)}}
-        self.link_latency = {}  # {(src_dpid, dst_dpid): latency}
+        # Link latency from timestamped probes, corrected by the echo RTTs of both ends
+        self.latency_prober = None
+        if DATA_COLLECTION['enable_latency_measurement']:
+            latency = DATA_COLLECTION['latency']
+            self.latency_prober = LatencyProber(
+                probe_interval=latency['probe_interval'],
+                probe_budget=latency['probe_budget'],
+                echo_interval=latency['echo_interval'],
+                alpha=latency['ewma_alpha'],
+                rtt_alpha=latency['ewma_alpha'],
+                max_age=latency['max_probe_age']
+            )
+        # {(src_dpid, dst_dpid): latency in ms}, updated in place by the prober
+        self.link_latency = self.latency_prober.latency if self.latency_prober else {}
+        
+        # Incremented whenever new port statistics arrive
+        self.stats_epoch = 0
+        self._stats_listeners = []
+        
+        # Port statistics history, one column per port in the stable order of link_index
+        # (saved next to the DQN weights so a port keeps its column across restarts;
+        # one file per shard, each shard only sees the ports of the switches it owns)
+        index_name = 'link_index.json'
+        if SHARDING['enabled']:
+            index_name = f"link_index_shard{os.environ.get(SHARDING['shard_id_env'], '0')}.json"
+        self.link_index = LinkIndex(DATA_COLLECTION['max_links'],
+                                    os.path.join(PATHS['models'], index_name))
+        self.stats_store = PortStatsStore(self.link_index, DATA_COLLECTION['stats_retention'],
+                                          DATA_COLLECTION['link_capacity_mbps'])
+        # Latest utilization per port (a row of the store, updated in place)
+        self.link_utilization = self.stats_store.latest[UTILIZATION]
+        
+        # Sharded deployment: only switches this shard owns are polled
+        self.datapath_filter = None  # callable(dpid) -> bool
         
         # Traffic matrix
         self.traffic_matrix = defaultdict(lambda: defaultdict(int))
         
-        # Flow tracking for elephant flow detection
-        self.flow_records = {}  # {flow_key: {'bytes': x, 'packets': y, 'start_time': t}}
+        # Per-flow rates keyed by rule cookie, for elephant flow detection
+        # (elephants sustain elephant_flow_threshold bytes per elephant_flow_duration);
+        # the sketch ranks them by recent rate so top-k queries skip the full table
+        self.heavy_hitters = HeavyHitterSketch(HEAVY_HITTERS['epsilon'], HEAVY_HITTERS['delta'],
+                                               HEAVY_HITTERS['candidates'], HEAVY_HITTERS['half_life'])
+        duration = TRAFFIC_CLASSIFICATION['elephant_flow_duration']
+        self.flow_tracker = FlowTracker(TRAFFIC_CLASSIFICATION['elephant_flow_threshold'] / duration,
+                                        duration, sketch=self.heavy_hitters)
         
         # Data collection configuration
         self.save_to_file = DATA_COLLECTION['save_to_file']
@@ -49,6 +98,22 @@ class NetworkMonitor(app_manager.RyuApp):
         self.data_dir = DATA_COLLECTION['data_directory']
         self.monitoring_interval = CONTROLLER['monitoring_interval']
         
+        # Switches are polled on staggered, adaptive intervals; samples are grouped
+        # into epochs of monitoring_interval seconds
+        polling = DATA_COLLECTION['polling']
+        self.poll_scheduler = PollScheduler(
+            base_interval=self.monitoring_interval,
+            min_interval=polling['min_interval'],
+            max_interval=polling['max_interval'],
+            hot_utilization=polling['hot_utilization'],
+            idle_utilization=polling['idle_utilization'],
+            change_rate=polling['change_rate'],
+            request_budget=polling['request_budget'],
+            requests_per_poll=int(DATA_COLLECTION['enable_port_stats']) +
+                              int(DATA_COLLECTION['enable_flow_stats'])
+        )
+        self._epoch_origin = time.monotonic()
+        
         # Create data directory if not exists
         os.makedirs(self.data_dir, exist_ok=True)
         
@@ -62,20 +127,50 @@ class NetworkMonitor(app_manager.RyuApp):
             if datapath.id not in self.datapaths:
                 self.logger.info('Register datapath: %016x', datapath.id)
                 self.datapaths[datapath.id] = datapath
+                self.poll_scheduler.add(datapath.id, time.monotonic())
         elif ev.state == DEAD_DISPATCHER:
             if datapath.id in self.datapaths:
                 self.logger.info('Unregister datapath: %016x', datapath.id)
                 del self.datapaths[datapath.id]
+                self.poll_scheduler.remove(datapath.id)
+                # Keep the slots so the columns are unchanged when the switch returns
+                self.stats_store.forget_switch(datapath.id)
+                self.flow_tracker.forget_switch(datapath.id)
+                if self.latency_prober is not None:
+                    self.latency_prober.forget_switch(datapath.id)
+
+    @property
+    def poll_epoch(self):
+        """Current polling epoch (monitoring_interval slots since start)"""
+        return int((time.monotonic() - self._epoch_origin) // self.monitoring_interval)
+
+    def add_stats_listener(self, callback):
+        """
+        Register callback(dpid, utilization) invoked after every port stats reply
+        utilization: {port_no: avg_utilization} for the ports updated by the reply
+        """
+        self._stats_listeners.append(callback)
 
     def _monitor(self):
         """Main monitoring loop"""
         last_save_time = time.time()
         
         while True:
-            for dp in self.datapaths.values():
-                self._request_stats(dp)
+            now = time.monotonic()
+            for dpid in self.poll_scheduler.due(now):
+                dp = self.datapaths.get(dpid)
+                if dp is not None and self._owned(dpid):
+                    self._request_stats(dp)
             
-            hub.sleep(self.monitoring_interval)
+            wait = self.poll_scheduler.next_wakeup(now)
+            if self.latency_prober is not None:
+                self._send_probes(now)
+                probe_wait = self.latency_prober.next_wakeup(now)
+                if probe_wait is not None:
+                    wait = probe_wait if wait is None else min(wait, probe_wait)
+            
+            # Wake up at least every second to pick up new switches and save on time
+            hub.sleep(1.0 if wait is None else min(wait, 1.0))
             
             # Periodically save data to file
             if self.save_to_file:
@@ -100,88 +195,124 @@ class NetworkMonitor(app_manager.RyuApp):
             req = parser.OFPFlowStatsRequest(datapath)
             datapath.send_msg(req)
 
+    def _owned(self, dpid):
+        return self.datapath_filter is None or self.datapath_filter(dpid)
+
+    def _send_probes(self, now):
+        """Send the echo requests and link probes that are due"""
+        prober = self.latency_prober
+        for dpid in prober.echo_due(now):
+            dp = self.datapaths.get(dpid)
+            if dp is not None:
+                dp.send_msg(dp.ofproto_parser.OFPEchoRequest(dp, data=prober.echo_data(time.monotonic())))
+        
+        # Sharded: the probe comes back as a PacketIn of the destination switch, which
+        # only reaches its owner, so the owner of dst probes the link (every shard can
+        # send the PacketOut, switches connect to all of them); the links of a
+        # shard's switches, discovered by its own LLDP PacketIns, are measured there
+        for src, src_port, dst in prober.due(now):
+            dp = self.datapaths.get(src)
+            if dp is None or dst not in self.datapaths or not self._owned(dst):
+                continue
+            ofproto = dp.ofproto
+            parser = dp.ofproto_parser
+            dp.send_msg(parser.OFPPacketOut(datapath=dp, buffer_id=ofproto.OFP_NO_BUFFER,
+                                            in_port=ofproto.OFPP_CONTROLLER,
+                                            actions=[parser.OFPActionOutput(src_port)],
+                                            data=prober.probe_frame(src, src_port, time.monotonic())))
+
+    @set_ev_cls(topo_event.EventLinkAdd)
+    def _link_add_handler(self, ev):
+        """Probe a discovered link (requires --observe-links)"""
+        link = ev.link
+        if self.latency_prober is not None:
+            self.latency_prober.add_link(link.src.dpid, link.src.port_no,
+                                         link.dst.dpid, link.dst.port_no, time.monotonic())
+
+    @set_ev_cls(topo_event.EventLinkDelete)
+    def _link_delete_handler(self, ev):
+        """Stop probing a link that went down"""
+        link = ev.link
+        if self.latency_prober is not None:
+            self.latency_prober.remove_link(link.src.dpid, link.dst.dpid)
+
+    @set_ev_cls(ofp_event.EventOFPEchoReply, MAIN_DISPATCHER)
+    def _echo_reply_handler(self, ev):
+        """Control channel RTT of a switch (replies to our echo requests only)"""
+        if self.latency_prober is not None:
+            self.latency_prober.on_echo_reply(ev.msg.datapath.id, ev.msg.data, time.monotonic())
+
+    @set_ev_cls(ofp_event.EventOFPPacketIn, MAIN_DISPATCHER)
+    def _packet_in_handler(self, ev):
+        """Latency probes returned by the far end of a link (other PacketIns are ignored)"""
+        now = time.monotonic()
+        msg = ev.msg
+        data = msg.data
+        if self.latency_prober is None or len(data) < 14 or data[12:14] != _PROBE_ETH_TYPE:
+            return
+        self.latency_prober.on_probe(data, msg.datapath.id, msg.match['in_port'], now)
+
     @set_ev_cls(ofp_event.EventOFPPortStatsReply, MAIN_DISPATCHER)
+    @timed('port_stats_reply', 'Port stats reply handler latency')
     def _port_stats_reply_handler(self, ev):
         """Handle port statistics reply"""
-        body = ev.msg.body
         dpid = ev.msg.datapath.id
+        body = sorted((stat for stat in ev.msg.body if stat.port_no <= ofproto_v1_3.OFPP_MAX),
+                      key=lambda x: x.port_no)
         
         self.logger.debug('PortStats received from datapath: %016x', dpid)
         
-        if dpid not in self.port_stats:
-            self.port_stats[dpid] = {}
+        counters = [[getattr(stat, name) for name in COUNTERS] for stat in body]
+        ports, slots = self.stats_store.append(dpid, [stat.port_no for stat in body],
+                                               counters, time.time(), self.poll_epoch)
         
-        current_time = time.time()
+        # Ports seen for the first time only have their counters stored
+        latest = self.stats_store.latest
+        updated = dict(zip(ports.tolist(), latest[UTILIZATION, slots].tolist()))
+        for port_no, tx_rate, rx_rate in zip(ports.tolist(), latest[0, slots].tolist(),
+                                             latest[1, slots].tolist()):
+            self.logger.info('Port %s of Switch %016x: TX %.2f Mbps, RX %.2f Mbps',
+                             port_no, dpid, tx_rate * 8e-6, rx_rate * 8e-6)
         
-        for stat in sorted(body, key=lambda x: x.port_no):
-            port_no = stat.port_no
-            
-            # Calculate bandwidth utilization
-            if dpid in self.port_speed and port_no in self.port_speed[dpid]:
-                old_tx, old_rx, old_time = self.port_speed[dpid][port_no]
-                time_diff = current_time - old_time
-                
-                if time_diff > 0:
-                    tx_speed = (stat.tx_bytes - old_tx) * 8 / time_diff / 1000000  # Mbps
-                    rx_speed = (stat.rx_bytes - old_rx) * 8 / time_diff / 1000000  # Mbps
-                    
-                    self.port_stats[dpid][port_no] = {
-                        'tx_bytes': stat.tx_bytes,
-                        'rx_bytes': stat.rx_bytes,
-                        'tx_packets': stat.tx_packets,
-                        'rx_packets': stat.rx_packets,
-                        'tx_errors': stat.tx_errors,
-                        'rx_errors': stat.rx_errors,
-                        'tx_dropped': stat.tx_dropped,
-                        'rx_dropped': stat.rx_dropped,
-                        'tx_speed_mbps': tx_speed,
-                        'rx_speed_mbps': rx_speed,
-                        'timestamp': current_time
-                    }
-                    
-                    self.logger.info('Port %s of Switch %016x: TX %.2f Mbps, RX %.2f Mbps',
-                                   port_no, dpid, tx_speed, rx_speed)
-            
-            # Update speed tracking
-            if dpid not in self.port_speed:
-                self.port_speed[dpid] = {}
-            self.port_speed[dpid][port_no] = (stat.tx_bytes, stat.rx_bytes, current_time)
+        self.poll_scheduler.on_reply(dpid, updated, time.monotonic())
+        self.stats_epoch += 1
+        
+        for callback in self._stats_listeners:
+            callback(dpid, updated)
 
     @set_ev_cls(ofp_event.EventOFPFlowStatsReply, MAIN_DISPATCHER)
+    @timed('flow_stats_reply', 'Flow stats reply handler latency')
     def _flow_stats_reply_handler(self, ev):
-        """Handle flow statistics reply"""
-        body = ev.msg.body
-        dpid = ev.msg.datapath.id
+        """Handle flow statistics reply (one part of a multipart reply)"""
+        msg = ev.msg
+        dpid = msg.datapath.id
         
         self.logger.debug('FlowStats received from datapath: %016x', dpid)
         
-        flows = []
-        for stat in sorted([flow for flow in body if flow.priority == 1],
-                          key=lambda flow: (flow.match.get('in_port', 0),
-                                          flow.match.get('eth_dst', '0'))):
-            
-            flow_info = {
-                'dpid': dpid,
-                'table_id': stat.table_id,
-                'duration_sec': stat.duration_sec,
-                'priority': stat.priority,
-                'idle_timeout': stat.idle_timeout,
-                'hard_timeout': stat.hard_timeout,
-                'packet_count': stat.packet_count,
-                'byte_count': stat.byte_count,
-                'match': stat.match,
-                'instructions': stat.instructions,
-                'timestamp': time.time()
-            }
-            
-            flows.append(flow_info)
-            
-            # Detect elephant flows
-            if stat.byte_count > 1000000:  # > 1MB
-                self.logger.warning('Elephant flow detected on switch %016x: %d bytes',
-                                  dpid, stat.byte_count)
-        
-        self.flow_stats[dpid] = flows
+        more = bool(msg.flags & ofproto_v1_3.OFPMPF_REPLY_MORE)
+        for _, cookie in self.flow_tracker.update(dpid, msg.body, time.time(), more):
+            flow = self.flow_tracker.get(dpid, cookie)
+            self.logger.warning('Elephant flow detected on switch %016x: cookie %#x, %.2f Mbps for %.0f s',
+                                dpid, cookie, flow['byte_rate'] * 8e-6, flow['duration_sec'])
+
+    @set_ev_cls(ofp_event.EventOFPFlowRemoved, MAIN_DISPATCHER)
+    def _flow_removed_handler(self, ev):
+        """Forget a tracked flow removed by its switch"""
+        msg = ev.msg
+        self.flow_tracker.remove(msg.datapath.id, msg.cookie, msg.reason)
+
+    @property
+    def flow_stats(self):
+        """Tracked flows per switch: {dpid: [flow]} (see FlowTracker.flows)"""
+        flows = {}
+        for flow in self.flow_tracker.flows():
+            flows.setdefault(flow['dpid'], []).append(flow)
+        return flows
+
+    @property
+    def port_stats(self):
+        """Newest sample of every port: {dpid: {port_no: stats}} (built from stats_store)"""
+        return self.stats_store.snapshot()
 
     def get_network_state(self):
         """
@@ -194,10 +325,19 @@ class NetworkMonitor(app_manager.RyuApp):
             'port_stats': self.port_stats,
             'flow_stats': self.flow_stats,
             'traffic_matrix': dict(self.traffic_matrix),
-            'link_latency': self.link_latency
+            'link_latency': self.link_latency,
+            'avg_delay': self.latency_prober.average() if self.latency_prober else 0.0
         }
         return state
 
+    def get_latency_statistics(self):
+        """Probe rate, measured links and latency spread (None if latency measurement is off)"""
+        return self.latency_prober.get_statistics() if self.latency_prober else None
+
+    def get_polling_statistics(self):
+        """Polling intervals, request rate and stats freshness per switch"""
+        return self.poll_scheduler.get_statistics(time.monotonic())
+
     def get_bandwidth_utilization(self):
         """
         Calculate bandwidth utilization for all links
@@ -205,41 +345,72 @@ class NetworkMonitor(app_manager.RyuApp):
         """
         utilization = {}
         
-        for dpid, ports in self.port_stats.items():
-            utilization[dpid] = {}
-            for port_no, stats in ports.items():
-                if 'tx_speed_mbps' in stats and 'rx_speed_mbps' in stats:
-                    # Assume 10 Mbps link capacity (configurable)
-                    link_capacity = 10.0
-                    tx_util = (stats['tx_speed_mbps'] / link_capacity) * 100
-                    rx_util = (stats['rx_speed_mbps'] / link_capacity) * 100
-                    utilization[dpid][port_no] = {
-                        'tx_utilization': tx_util,
-                        'rx_utilization': rx_util,
-                        'avg_utilization': (tx_util + rx_util) / 2
-                    }
+        slots = np.flatnonzero(self.stats_store.sample_count()[:len(self.link_index)])
+        latest = self.stats_store.latest
+        for slot, tx_rate, rx_rate in zip(slots.tolist(), latest[0, slots].tolist(),
+                                          latest[1, slots].tolist()):
+            dpid, port_no = self.link_index.key(slot)
+            utilization.setdefault(dpid, {})[port_no] = self._utilization(
+                {'tx_speed_mbps': tx_rate * 8e-6, 'rx_speed_mbps': rx_rate * 8e-6})
         
         return utilization
 
-    def get_elephant_flows(self, threshold_bytes=1000000):
+    def get_state_vector(self, size):
         """
-        Identify elephant flows (flows with large byte counts)
+        Per-port average utilization in link_index order, for the DQN
         Args:
-            threshold_bytes: minimum bytes to be considered elephant flow
-        Returns: list of elephant flows
+            size: vector length (at most DATA_COLLECTION['max_links'])
+        Returns: view of the first `size` columns of link_utilization (not a copy;
+                 it changes in place as port stats arrive)
+        """
+        return self.link_utilization[:size]
+
+    @staticmethod
+    def _utilization(stats):
+        """Utilization percentages of one port from its measured speeds"""
+        link_capacity = DATA_COLLECTION['link_capacity_mbps']
+        tx_util = (stats['tx_speed_mbps'] / link_capacity) * 100
+        rx_util = (stats['rx_speed_mbps'] / link_capacity) * 100
+        return {
+            'tx_utilization': tx_util,
+            'rx_utilization': rx_util,
+            'avg_utilization': (tx_util + rx_util) / 2
+        }
+
+    def get_top_flows(self, k=10):
+        """
+        Flows with the highest recent rate, from the heavy-hitter sketch (O(k))
+        Args:
+            k: number of flows
+        Returns: list of {'dpid', 'cookie', 'rate_mbps', 'flow'} in decreasing rate
+                 order; rate_mbps may overestimate by the sketch's error bound, flow
+                 is the FlowTracker state (None once the rule is gone)
+        """
+        return [{'dpid': dpid, 'cookie': cookie, 'rate_mbps': rate * 8e-6,
+                 'flow': self.flow_tracker.get(dpid, cookie)}
+                for (dpid, cookie), rate in self.heavy_hitters.top(k, time.time())]
+
+    def get_elephant_flows(self):
+        """
+        Identify elephant flows (rate sustained above the elephant threshold, see FlowTracker)
+        among the heavy-hitter candidates, so the query does not scan every tracked flow
+        Returns: list of elephant flows, highest recent rate first
         """
         elephant_flows = []
         
-        for dpid, flows in self.flow_stats.items():
-            for flow in flows:
-                if flow['byte_count'] >= threshold_bytes:
-                    elephant_flows.append({
-                        'dpid': dpid,
-                        'match': flow['match'],
-                        'byte_count': flow['byte_count'],
-                        'packet_count': flow['packet_count'],
-                        'duration': flow['duration_sec']
-                    })
+        for (dpid, cookie), _ in self.heavy_hitters.top():
+            flow = self.flow_tracker.get(dpid, cookie)
+            if flow is None or not flow['elephant']:
+                continue
+            elephant_flows.append({
+                'dpid': flow['dpid'],
+                'cookie': flow['cookie'],
+                'match': flow['match'],
+                'byte_count': flow['byte_count'],
+                'packet_count': flow['packet_count'],
+                'byte_rate': flow['byte_rate'],
+                'duration': flow['duration_sec']
+            })
         
         return elephant_flows
 
@@ -280,20 +451,30 @@ class NetworkMonitor(app_manager.RyuApp):
         
         self.logger.info('Statistics saved to %s', self.data_dir)
 
-    def get_traffic_data_for_prediction(self, window_size=10):
+    def get_traffic_data_for_prediction(self, window_size=10, links=None, min_observed=None):
         """
-        Get traffic data formatted for LSTM prediction
+        Per-link utilization history formatted for LSTM prediction
+        One sample per polling epoch, the last `window_size` epochs up to the
+        current one; epochs a link missed are interpolated from its measured
+        neighbours (see PortStatsStore.aligned).
         Args:
             window_size: number of time steps
-        Returns: list of traffic values for each time step
+            links: [(dpid, port_no)] to return (default every port seen)
+            min_observed: measured epochs a link needs to be returned
+                          (default half the window)
+        Returns: (links, data): list of (dpid, port_no) and a float32 array
+                 (len(links), window_size), oldest step first
         """
-        # This will be used by the traffic predictor
-        # Returns bandwidth utilization over time
-        traffic_data = []
-        
-        utilization = self.get_bandwidth_utilization()
-        for dpid, ports in utilization.items():
-            for port_no, util in ports.items():
-                traffic_data.append(util['avg_utilization'])
+        if min_observed is None:
+            min_observed = (window_size + 1) // 2
+        if links is None:
+            keys = [key for key, _ in self.link_index.items()]
+            slots = list(range(len(keys)))
+        else:
+            found = [(link, self.link_index.slot(*link, create=False)) for link in links]
+            keys = [link for link, slot in found if slot is not None]
+            slots = [slot for _, slot in found if slot is not None]
         
-        return traffic_data
+        values, observed = self.stats_store.aligned('utilization', self.poll_epoch, window_size, slots)
+        keep = np.flatnonzero(observed.sum(axis=0) >= max(min_observed, 1))
+        return [keys[i] for i in keep.tolist()], np.ascontiguousarray(values[:, keep].T)
@@ -0,0 +1,271 @@
+"""
+Packet Parser - Phân tích header gói tin nhanh cho PacketIn
+Decode Ethernet/VLAN/ARP/IPv4/TCP/UDP một lần tại offset cố định, dùng chung cho mọi module
+"""
+
+import struct
+import socket
+
+# EtherTypes
+ETH_TYPE_IP = 0x0800
+ETH_TYPE_ARP = 0x0806
+ETH_TYPE_8021Q = 0x8100
+ETH_TYPE_8021AD = 0x88a8
+ETH_TYPE_LLDP = 0x88cc
+ETH_TYPE_PROBE = 0x88b5  # IEEE local experimental, latency probes (latency.py)
+
+# IP protocol numbers
+IPPROTO_ICMP = 1
+IPPROTO_TCP = 6
+IPPROTO_UDP = 17
+
+# ARP opcodes
+ARP_REQUEST = 1
+ARP_REPLY = 2
+
+ETH_HEADER_LEN = 14
+VLAN_HEADER_LEN = 4
+ARP_LEN = 28  # Ethernet/IPv4 ARP
+MAX_VLAN_TAGS = 2
+
+_unpack_u16 = struct.Struct('!H').unpack_from
+_unpack_ports = struct.Struct('!HH').unpack_from
+
+
+class PacketHeaders:
+    """
+    Compact header record decoded once per PacketIn
+    Fields not present in the packet are None. For ARP, ip_src/ip_dst are
+    the sender and target protocol addresses and arp_op the opcode. `known`
+    is False when the EtherType is not one the fast parser decodes; `pkt`
+    then gives the full Ryu packet (parsed lazily, only when a consumer
+    asks for it).
+    """
+    
+    __slots__ = ('eth_dst', 'eth_src', 'ethertype', 'vlan_id',
+                 'ip_src', 'ip_dst', 'ip_proto', 'src_port', 'dst_port',
+                 'arp_op', 'known', '_data', '_pkt')
+    
+    def __init__(self, data, eth_dst, eth_src, ethertype, vlan_id=None,
+                 ip_src=None, ip_dst=None, ip_proto=None,
+                 src_port=None, dst_port=None, known=True, arp_op=None):
+        self.eth_dst = eth_dst
+        self.eth_src = eth_src
+        self.ethertype = ethertype
+        self.vlan_id = vlan_id
+        self.ip_src = ip_src
+        self.ip_dst = ip_dst
+        self.ip_proto = ip_proto
+        self.src_port = src_port
+        self.dst_port = dst_port
+        self.arp_op = arp_op
+        self.known = known
+        self._data = data
+        self._pkt = None
+    
+    @property
+    def pkt(self):
+        """Full Ryu packet, parsed on first access"""
+        if self._pkt is None:
+            from ryu.lib.packet import packet
+            self._pkt = packet.Packet(bytes(self._data))
+        return self._pkt
+    
+    def flow_key(self):
+        """5-tuple plus MAC pair identifying the flow"""
+        return (self.eth_src, self.eth_dst, self.ip_src, self.ip_dst,
+                self.ip_proto, self.src_port, self.dst_port)
+    
+    @classmethod
+    def from_packet(cls, pkt):
+        """
+        Build a header record from an already parsed Ryu packet
+        Args:
+            pkt: ryu.lib.packet.packet.Packet
+        Returns:
+            PacketHeaders or None if the packet has no Ethernet header
+        """
+        from ryu.lib.packet import ethernet, vlan, arp, ipv4, tcp, udp
+        
+        eth = pkt.get_protocol(ethernet.ethernet)
+        if eth is None:
+            return None
+        
+        ethertype = eth.ethertype
+        vlan_id = None
+        vlan_pkt = pkt.get_protocol(vlan.vlan)
+        if vlan_pkt is not None:
+            vlan_id = vlan_pkt.vid
+            ethertype = vlan_pkt.ethertype
+        
+        headers = cls(pkt.data, eth.dst, eth.src, ethertype, vlan_id)
+        headers._pkt = pkt
+        
+        arp_pkt = pkt.get_protocol(arp.arp)
+        if arp_pkt is not None:
+            headers.ip_src = arp_pkt.src_ip
+            headers.ip_dst = arp_pkt.dst_ip
+            headers.arp_op = arp_pkt.opcode
+        
+        ip = pkt.get_protocol(ipv4.ipv4)
+        if ip is not None:
+            headers.ip_src = ip.src
+            headers.ip_dst = ip.dst
+            headers.ip_proto = ip.proto
+            l4 = pkt.get_protocol(tcp.tcp) or pkt.get_protocol(udp.udp)
+            if l4 is not None:
+                headers.src_port = l4.src_port
+                headers.dst_port = l4.dst_port
+        
+        return headers
+
+
+def parse_packet(data):
+    """
+    Decode L2-L4 headers at fixed offsets without building protocol objects
+    Args:
+        data: raw frame bytes (msg.data of a PacketIn)
+    Returns:
+        PacketHeaders, or None if the frame is shorter than an Ethernet header
+    """
+    buf = memoryview(data)
+    length = len(buf)
+    if length < ETH_HEADER_LEN:
+        return None
+    
+    eth_dst = buf[0:6].hex(':')
+    eth_src = buf[6:12].hex(':')
+    ethertype = _unpack_u16(buf, 12)[0]
+    offset = ETH_HEADER_LEN
+    
+    # 802.1Q / 802.1ad tags
+    vlan_id = None
+    tags = 0
+    while ethertype in (ETH_TYPE_8021Q, ETH_TYPE_8021AD) and tags < MAX_VLAN_TAGS:
+        if length < offset + VLAN_HEADER_LEN:
+            return PacketHeaders(data, eth_dst, eth_src, ethertype, known=False)
+        if vlan_id is None:
+            vlan_id = _unpack_u16(buf, offset)[0] & 0x0fff
+        ethertype = _unpack_u16(buf, offset + 2)[0]
+        offset += VLAN_HEADER_LEN
+        tags += 1
+    
+    if ethertype == ETH_TYPE_ARP:
+        if length < offset + ARP_LEN:
+            return PacketHeaders(data, eth_dst, eth_src, ethertype, vlan_id, known=False)
+        return PacketHeaders(data, eth_dst, eth_src, ethertype, vlan_id,
+                             socket.inet_ntoa(buf[offset + 14:offset + 18]),
+                             socket.inet_ntoa(buf[offset + 24:offset + 28]),
+                             arp_op=_unpack_u16(buf, offset + 6)[0])
+    
+    if ethertype != ETH_TYPE_IP:
+        known = ethertype in (ETH_TYPE_LLDP, ETH_TYPE_PROBE)
+        return PacketHeaders(data, eth_dst, eth_src, ethertype, vlan_id, known=known)
+    
+    # IPv4
+    if length < offset + 20:
+        return PacketHeaders(data, eth_dst, eth_src, ethertype, vlan_id, known=False)
+    
+    ihl = (buf[offset] & 0x0f) * 4
+    ip_proto = buf[offset + 9]
+    frag = _unpack_u16(buf, offset + 6)[0] & 0x1fff
+    ip_src = socket.inet_ntoa(buf[offset + 12:offset + 16])
+    ip_dst = socket.inet_ntoa(buf[offset + 16:offset + 20])
+    
+    src_port = dst_port = None
+    l4_offset = offset + ihl
+    # Only the first fragment carries the L4 header
+    if frag == 0 and ip_proto in (IPPROTO_TCP, IPPROTO_UDP) and length >= l4_offset + 4:
+        src_port, dst_port = _unpack_ports(buf, l4_offset)
+    
+    return PacketHeaders(data, eth_dst, eth_src, ethertype, vlan_id,
+                         ip_src, ip_dst, ip_proto, src_port, dst_port)
+
+
+def build_arp(opcode, src_mac, src_ip, dst_mac, dst_ip, eth_dst=None):
+    """
+    Build an Ethernet/IPv4 ARP frame
+    Args:
+        opcode: ARP_REQUEST or ARP_REPLY
+        src_mac, src_ip: sender hardware and protocol address
+        dst_mac, dst_ip: target hardware and protocol address
+        eth_dst: Ethernet destination (default dst_mac)
+    Returns:
+        frame bytes (42 bytes, unpadded)
+    """
+    eth = (bytes.fromhex((eth_dst or dst_mac).replace(':', '')) +
+           bytes.fromhex(src_mac.replace(':', '')) + struct.pack('!H', ETH_TYPE_ARP))
+    return eth + struct.pack('!HHBBH6s4s6s4s', 1, ETH_TYPE_IP, 6, 4, opcode,
+                             bytes.fromhex(src_mac.replace(':', '')), socket.inet_aton(src_ip),
+                             bytes.fromhex(dst_mac.replace(':', '')), socket.inet_aton(dst_ip))
+
+
+def _build_frame(src_mac, dst_mac, ip_proto, src_port, dst_port, vlan_id=None, payload=64):
+    """Build a synthetic Ethernet/IPv4/L4 frame for benchmarking"""
+    eth = bytes.fromhex(dst_mac.replace(':', '')) + bytes.fromhex(src_mac.replace(':', ''))
+    if vlan_id is not None:
+        eth += struct.pack('!HH', ETH_TYPE_8021Q, vlan_id)
+    eth += struct.pack('!H', ETH_TYPE_IP)
+    
+    if ip_proto == IPPROTO_TCP:
+        l4 = struct.pack('!HHIIBBHHH', src_port, dst_port, 1, 0, 5 << 4, 0x02, 65535, 0, 0)
+    else:
+        l4 = struct.pack('!HHHH', src_port, dst_port, 8 + payload, 0)
+    body = l4 + bytes(payload)
+    
+    ip = struct.pack('!BBHHHBBH4s4s', 0x45, 0, 20 + len(body), 0, 0, 64, ip_proto, 0,
+                     socket.inet_aton('10.0.0.1'), socket.inet_aton('10.0.0.2'))
+    return eth + ip + body
+
+
+if __name__ == "__main__":
+    # Benchmark: PacketIn parsing work before (Ryu Packet + get_protocol per consumer)
+    # and after (single fixed-offset decode shared by all consumers)
+    import time
+    
+    frames = [
+        _build_frame('00:00:00:00:00:01', '00:00:00:00:00:03', IPPROTO_TCP, 40000, 80),
+        _build_frame('00:00:00:00:00:02', '00:00:00:00:00:04', IPPROTO_UDP, 40001, 5060),
+        _build_frame('00:00:00:00:00:05', '00:00:00:00:00:07', IPPROTO_TCP, 40002, 22),
+        _build_frame('00:00:00:00:00:06', '00:00:00:00:00:08', IPPROTO_UDP, 40003, 53, vlan_id=10),
+    ]
+    iterations = 50000
+    
+    def run_fast():
+        for i in range(iterations):
+            headers = parse_packet(frames[i & 3])
+            # packet_in_handler, _is_elephant_flow and classify_traffic
+            _ = headers.ethertype, headers.eth_src, headers.eth_dst
+            _ = headers.ip_proto == IPPROTO_TCP and headers.dst_port
+            _ = headers.ip_proto, headers.dst_port
+    
+    start = time.perf_counter()
+    run_fast()
+    fast_rate = iterations / (time.perf_counter() - start)
+    print(f"Fast parser: {fast_rate:,.0f} PacketIn/s")
+    
+    try:
+        from ryu.lib.packet import packet, ethernet, ipv4, tcp, udp
+    except ImportError:
+        print("Ryu not installed - skipping baseline")
+    else:
+        def run_ryu():
+            for i in range(iterations):
+                pkt = packet.Packet(frames[i & 3])
+                # packet_in_handler
+                eth = pkt.get_protocol(ethernet.ethernet)
+                _ = eth.ethertype, eth.src, eth.dst
+                # _is_elephant_flow
+                pkt.get_protocol(ethernet.ethernet)
+                pkt.get_protocol(tcp.tcp)
+                # classify_traffic
+                pkt.get_protocol(ethernet.ethernet)
+                pkt.get_protocol(ipv4.ipv4)
+                pkt.get_protocol(tcp.tcp)
+                pkt.get_protocol(udp.udp)
+        
+        start = time.perf_counter()
+        run_ryu()
+        ryu_rate = iterations / (time.perf_counter() - start)
+        print(f"Ryu parser:  {ryu_rate:,.0f} PacketIn/s")
+        print(f"Speedup:     {fast_rate / ryu_rate:.1f}x")
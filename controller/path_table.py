@@ -0,0 +1,313 @@
+"""
+Path Table - Bảng k đường đi ngắn nhất giữa các switch
+Tính trước k-shortest paths cho mọi cặp switch và cập nhật tăng dần khi link thay đổi
+"""
+
+from collections import defaultdict
+from itertools import islice
+
+import networkx as nx
+
+
+class PathTable:
+    """
+    Precomputed k-shortest paths between every pair of switches
+    Paths are stored once and referenced by integer path id:
+        hops[path_id]      -> tuple of dpids (src ... dst)
+        out_ports[path_id] -> tuple of output ports, one per hop except the last
+    pair_paths[(src, dst)] lists the path ids of a pair, shortest first, so a
+    DQN action indexes a real path in O(1).
+    """
+    
+    def __init__(self, graph, k=4):
+        """
+        Args:
+            graph: networkx DiGraph of switches; edges carry the 'port' attribute
+            k: number of paths kept per switch pair
+        """
+        self.graph = graph
+        self.k = k
+        
+        self.hops = []
+        self.out_ports = []
+        self.pair_paths = {}  # {(src, dst): (path_id, ...)}
+        self.link_paths = defaultdict(set)  # {(u, v): {path_id}}
+        self._free_ids = []
+        
+        # Pairs invalidated by topology changes but not recomputed yet
+        self.dirty_pairs = set()
+        # Whole table out of date (e.g. during topology bring-up)
+        self.stale = False
+    
+    # Lookup
+    
+    def get_paths(self, src, dst):
+        """Path ids between two switches, shortest first"""
+        paths = self.pair_paths.get((src, dst))
+        if paths is None:
+            if not (self.stale or (src, dst) in self.dirty_pairs):
+                return ()
+            self._refresh_pair(src, dst)
+            paths = self.pair_paths.get((src, dst), ())
+        return paths
+    
+    def get_path(self, src, dst, index):
+        """
+        Path id selected by an action index
+        Args:
+            src, dst: switch dpids
+            index: action/path index (wraps around if the pair has fewer paths)
+        Returns:
+            path id or None if dst is unreachable
+        """
+        paths = self.get_paths(src, dst)
+        if not paths:
+            return None
+        return paths[index % len(paths)]
+    
+    def first_hop_port(self, src, dst, index=0):
+        """Output port on `src` for the selected path, or None"""
+        path_id = self.get_path(src, dst, index)
+        if path_id is None:
+            return None
+        return self.out_ports[path_id][0]
+    
+    # Maintenance
+    
+    def rebuild(self):
+        """Recompute the table for every switch pair"""
+        self._reset()
+        self.stale = True
+        self.refresh()
+    
+    def refresh(self, limit=None):
+        """
+        Recompute every pair invalidated since the last refresh
+        Args:
+            limit: maximum number of pairs to compute in this call
+        Returns:
+            True once nothing is left to recompute
+        """
+        for count, (src, dst) in enumerate(self._pending_pairs()):
+            if limit is not None and count >= limit:
+                return False
+            self._refresh_pair(src, dst)
+        
+        self.stale = False
+        return True
+    
+    def _pending_pairs(self):
+        """Pairs that still need computing"""
+        if self.stale:
+            nodes = list(self.graph.nodes)
+            return ((src, dst) for src in nodes for dst in nodes
+                    if src != dst and (src, dst) not in self.pair_paths)
+        return list(self.dirty_pairs)
+    
+    def _reset(self):
+        """Drop every stored path"""
+        self.hops = []
+        self.out_ports = []
+        self.pair_paths = {}
+        self.link_paths = defaultdict(set)
+        self._free_ids = []
+        self.dirty_pairs = set()
+        self.stale = False
+    
+    def _mark_stale(self):
+        """Drop the table and recompute lazily (cheaper than targeted updates when empty)"""
+        self._reset()
+        self.stale = True
+    
+    def link_added(self, u, v, defer=False):
+        """
+        Update pairs whose k-shortest paths can use the new link u -> v
+        A pair (s, d) is affected only if dist(s, u) + 1 + dist(v, d) is no longer
+        than its current k-th path, or if it has fewer than k paths.
+        Args:
+            defer: only mark affected pairs dirty; they are recomputed on
+                   refresh() or on their next lookup
+        """
+        if self.stale or not self.pair_paths:
+            # Nothing worth updating in place (topology bring-up)
+            self._mark_stale()
+            if not defer:
+                self.refresh()
+            return
+        
+        to_u = nx.single_source_shortest_path_length(self.graph.reverse(copy=False), u)
+        from_v = nx.single_source_shortest_path_length(self.graph, v)
+        
+        for s, dist_su in to_u.items():
+            for d, dist_vd in from_v.items():
+                if s == d or (s, d) in self.dirty_pairs:
+                    continue
+                paths = self.pair_paths.get((s, d), ())
+                if len(paths) < self.k or \
+                        dist_su + 1 + dist_vd <= len(self.hops[paths[-1]]) - 1:
+                    self._invalidate_pair(s, d)
+        
+        if not defer:
+            self.refresh()
+    
+    def link_removed(self, u, v, defer=False):
+        """Recompute only the pairs that had a path over link u -> v"""
+        if self.stale:
+            self._mark_stale()
+            return
+        
+        affected = {(self.hops[pid][0], self.hops[pid][-1])
+                    for pid in self.link_paths.pop((u, v), ())}
+        for s, d in affected:
+            self._invalidate_pair(s, d)
+        
+        if not defer:
+            self.refresh()
+    
+    def switch_removed(self, dpid):
+        """Drop every pair that starts or ends at a removed switch"""
+        if self.stale:
+            self._mark_stale()
+            return
+        
+        for pair in [pair for pair in self.pair_paths if dpid in pair]:
+            self._release_pair(pair)
+        self.dirty_pairs = {pair for pair in self.dirty_pairs if dpid not in pair}
+    
+    def _invalidate_pair(self, src, dst):
+        """Release a pair's paths and mark it for recomputation"""
+        self._release_pair((src, dst))
+        self.dirty_pairs.add((src, dst))
+    
+    def _refresh_pair(self, src, dst):
+        """Recompute a dirty pair"""
+        self.dirty_pairs.discard((src, dst))
+        self._compute_pair(src, dst)
+    
+    def _compute_pair(self, src, dst):
+        """(Re)compute the k shortest simple paths of one pair"""
+        self._release_pair((src, dst))
+        
+        try:
+            paths = list(islice(nx.shortest_simple_paths(self.graph, src, dst), self.k))
+        except nx.NetworkXNoPath:
+            # Remember unreachable pairs so lookups stay O(1)
+            self.pair_paths[(src, dst)] = ()
+            return
+        except nx.NodeNotFound:
+            return
+        
+        path_ids = []
+        for hops in paths:
+            ports = tuple(self.graph[a][b]['port'] for a, b in zip(hops, hops[1:]))
+            if self._free_ids:
+                path_id = self._free_ids.pop()
+                self.hops[path_id] = tuple(hops)
+                self.out_ports[path_id] = ports
+            else:
+                path_id = len(self.hops)
+                self.hops.append(tuple(hops))
+                self.out_ports.append(ports)
+            
+            for link in zip(hops, hops[1:]):
+                self.link_paths[link].add(path_id)
+            path_ids.append(path_id)
+        
+        self.pair_paths[(src, dst)] = tuple(path_ids)
+    
+    def _release_pair(self, pair):
+        """Free the path ids held by a pair"""
+        for path_id in self.pair_paths.pop(pair, ()):
+            hops = self.hops[path_id]
+            for link in zip(hops, hops[1:]):
+                paths = self.link_paths.get(link)
+                if paths is not None:
+                    paths.discard(path_id)
+                    if not paths:
+                        del self.link_paths[link]
+            self.hops[path_id] = None
+            self.out_ports[path_id] = None
+            self._free_ids.append(path_id)
+    
+    def get_statistics(self):
+        """Get table size"""
+        return {
+            'pairs': sum(1 for paths in self.pair_paths.values() if paths),
+            'paths': len(self.hops) - len(self._free_ids),
+            'dirty_pairs': len(self.dirty_pairs),
+            'k': self.k
+        }
+
+
+def build_fattree_graph(k=4):
+    """
+    Build the switch graph of a k-ary fat-tree (same wiring as mininet_topo.create_fattree_topology)
+    Returns:
+        networkx DiGraph with 'port'/'dst_port' edge attributes
+    """
+    graph = nx.DiGraph()
+    next_port = defaultdict(lambda: k // 2 + 1)  # edge ports 1..k/2 go to hosts
+    
+    def connect(a, b):
+        port_a, port_b = next_port[a], next_port[b]
+        next_port[a] += 1
+        next_port[b] += 1
+        graph.add_edge(a, b, port=port_a, dst_port=port_b)
+        graph.add_edge(b, a, port=port_b, dst_port=port_a)
+    
+    half = k // 2
+    core = [1000 + i for i in range(half * half)]
+    graph.add_nodes_from(core)
+    for pod in range(k):
+        aggs = [2000 + pod * 100 + i for i in range(half)]
+        edges = [3000 + pod * 100 + i for i in range(half)]
+        graph.add_nodes_from(aggs + edges)
+        for edge_sw in edges:
+            for agg_sw in aggs:
+                connect(edge_sw, agg_sw)
+        for i, agg_sw in enumerate(aggs):
+            for j in range(half):
+                connect(agg_sw, core[i * half + j])
+    
+    return graph
+
+
+if __name__ == "__main__":
+    # Benchmark: full build, O(1) lookup and incremental link updates on fat-trees
+    import time
+    
+    for fat_k in (4, 8):
+        graph = build_fattree_graph(fat_k)
+        table = PathTable(graph, k=4)
+        
+        start = time.perf_counter()
+        table.rebuild()
+        build_time = time.perf_counter() - start
+        
+        pairs = list(table.pair_paths)
+        lookups = 200000
+        start = time.perf_counter()
+        for i in range(lookups):
+            src, dst = pairs[i % len(pairs)]
+            table.first_hop_port(src, dst, i & 3)
+        lookup_ns = (time.perf_counter() - start) / lookups * 1e9
+        
+        u, v = next(iter(graph.edges))
+        attrs = dict(graph[u][v])
+        start = time.perf_counter()
+        graph.remove_edge(u, v)
+        table.link_removed(u, v)
+        remove_time = time.perf_counter() - start
+        
+        start = time.perf_counter()
+        graph.add_edge(u, v, **attrs)
+        table.link_added(u, v)
+        add_time = time.perf_counter() - start
+        
+        stats = table.get_statistics()
+        print(f"Fat-tree k={fat_k}: {graph.number_of_nodes()} switches, "
+              f"{stats['pairs']} pairs, {stats['paths']} paths")
+        print(f"  Full build:    {build_time*1000:.1f} ms")
+        print(f"  Lookup:        {lookup_ns:.0f} ns")
+        print(f"  Link removed:  {remove_time*1000:.1f} ms")
+        print(f"  Link added:    {add_time*1000:.1f} ms")
@@ -0,0 +1,201 @@
+"""
+Multi-table Pipeline - Pipeline OpenFlow nhiều bảng
+Bảng 0 phân loại QoS theo cổng L4, bảng 1 ghi đè theo flow cho elephant định tuyến bằng DQN, bảng 2 chuyển tiếp theo đích
+"""
+
+from controller.packet_parser import ETH_TYPE_IP, IPPROTO_TCP
+
+CLASSIFY_TABLE = 0
+OVERRIDE_TABLE = 1
+FORWARD_TABLE = 2
+
+
+def port_range_masks(first, last):
+    """
+    Cover an inclusive L4 port range with (value, mask) prefix matches
+    Returns:
+        list of (value, mask)
+    """
+    prefixes = []
+    while first <= last:
+        # Largest aligned block starting at `first` that fits in the range
+        size = first & -first if first else 1 << 16
+        while size > last - first + 1:
+            size >>= 1
+        prefixes.append((first, 0xffff & ~(size - 1)))
+        first += size
+    return prefixes
+
+
+class MultiTablePipeline:
+    """
+    Three-table OpenFlow 1.3 layout
+        table 0  classification: L4 destination port -> write set_queue, goto 1
+        table 1  overrides:      (in_port, eth_src, eth_dst) -> write output (miss -> goto 2)
+        table 2  forwarding:     eth_dst -> write output (miss -> controller)
+    Actions are accumulated in the action set, so the queue set by table 0
+    applies to the output of either table. Overrides are looked up first:
+    a DQN-routed flow follows its own entries even on switches that have
+    no destination entry for it (ingress, transit off the shortest path). Rule count per switch grows as classes + destinations +
+    overridden flows instead of one entry per (source, destination) pair.
+    """
+    
+    def __init__(self, class_rules, queue_for_class, default_class='best_effort'):
+        """
+        Args:
+            class_rules: [(ip_proto, first_port, last_port, class)] (qos_manager.L4_CLASS_RULES)
+            queue_for_class: callable mapping a class name to a queue id
+            default_class: class of traffic no rule matches
+        """
+        self.class_rules = class_rules
+        self.queue_for_class = queue_for_class
+        self.default_class = default_class
+    
+    def base_flows(self, datapath, qos_enabled=True):
+        """
+        Static entries installed when a switch connects
+        Returns:
+            list of OFPFlowMod
+        """
+        ofproto = datapath.ofproto
+        parser = datapath.ofproto_parser
+        mods = []
+        
+        def flow(table_id, priority, match, inst):
+            mods.append(parser.OFPFlowMod(datapath=datapath, table_id=table_id,
+                                          priority=priority, match=match, instructions=inst))
+        
+        goto_override = parser.OFPInstructionGotoTable(OVERRIDE_TABLE)
+        
+        # Table 0: classification
+        if qos_enabled:
+            for ip_proto, first, last, qos_class in self.class_rules:
+                if qos_class == self.default_class:
+                    continue  # covered by the table-miss entry
+                queue_id = self.queue_for_class(qos_class)
+                port_field = 'tcp_dst' if ip_proto == IPPROTO_TCP else 'udp_dst'
+                for value, mask in port_range_masks(first, last):
+                    match = parser.OFPMatch(eth_type=ETH_TYPE_IP, ip_proto=ip_proto,
+                                            **{port_field: (value, mask) if mask != 0xffff else value})
+                    flow(CLASSIFY_TABLE, 10, match, [
+                        parser.OFPInstructionActions(ofproto.OFPIT_WRITE_ACTIONS,
+                                                     [parser.OFPActionSetQueue(queue_id)]),
+                        goto_override])
+            
+            flow(CLASSIFY_TABLE, 0, parser.OFPMatch(), [
+                parser.OFPInstructionActions(ofproto.OFPIT_WRITE_ACTIONS, [
+                    parser.OFPActionSetQueue(self.queue_for_class(self.default_class))]),
+                goto_override])
+        else:
+            flow(CLASSIFY_TABLE, 0, parser.OFPMatch(), [goto_override])
+        
+        # Table 1: no override - forward by destination
+        flow(OVERRIDE_TABLE, 0, parser.OFPMatch(), [parser.OFPInstructionGotoTable(FORWARD_TABLE)])
+        
+        # Table 2: unknown destinations go to the controller
+        flow(FORWARD_TABLE, 0, parser.OFPMatch(), [
+            parser.OFPInstructionActions(ofproto.OFPIT_APPLY_ACTIONS, [
+                parser.OFPActionOutput(ofproto.OFPP_CONTROLLER, ofproto.OFPCML_NO_BUFFER)])])
+        
+        return mods
+    
+    def forwarding_entry(self, datapath, in_port, eth_src, eth_dst, out_port, override=False):
+        """
+        Entry forwarding a flow out of out_port
+        Args:
+            override: per-flow entry in the override table (DQN-routed flows)
+                      instead of a destination entry shared by all sources
+        Returns:
+            (table_id, match, instructions)
+        """
+        ofproto = datapath.ofproto
+        parser = datapath.ofproto_parser
+        write_output = parser.OFPInstructionActions(ofproto.OFPIT_WRITE_ACTIONS,
+                                                    [parser.OFPActionOutput(out_port)])
+        
+        if override:
+            match = parser.OFPMatch(in_port=in_port, eth_src=eth_src, eth_dst=eth_dst)
+            return OVERRIDE_TABLE, match, [write_output]
+        
+        match = parser.OFPMatch(eth_dst=eth_dst)
+        return FORWARD_TABLE, match, [write_output]
+
+
+def count_rules(graph, k_paths=4, hosts_per_switch=None, elephant_fraction=0.05, num_classes=None):
+    """
+    Rule counts for all-to-all host traffic, single-table vs multi-table
+    Args:
+        graph: switch graph (path_table.build_fattree_graph)
+        hosts_per_switch: {dpid: number of hosts}
+        elephant_fraction: share of host pairs routed by the DQN over an alternate path
+        num_classes: classification entries in table 0 (+3 table-miss entries)
+    Returns:
+        {'single': (total, max per switch), 'multi': (total, max per switch)}
+    """
+    from collections import Counter
+    from controller.path_table import PathTable
+    
+    table = PathTable(graph, k=k_paths)
+    table.rebuild()
+    
+    hosts = [(dpid, i) for dpid, count in hosts_per_switch.items() for i in range(count)]
+    single = Counter()
+    destinations = {dpid: set() for dpid in graph.nodes}
+    overrides = Counter()
+    
+    elephant_every = int(1 / elephant_fraction) if elephant_fraction else 0
+    pair_index = 0
+    for src in hosts:
+        for dst in hosts:
+            if src == dst:
+                continue
+            pair_index += 1
+            if src[0] == dst[0]:
+                hops = (src[0],)
+                alternate = hops
+            else:
+                paths = table.get_paths(src[0], dst[0])
+                hops = table.hops[paths[0]]
+                alternate = table.hops[paths[pair_index % len(paths)]]
+            
+            # Single table: one (in_port, eth_src, eth_dst) entry per switch on the path
+            elephant = elephant_every and pair_index % elephant_every == 0
+            for dpid in (alternate if elephant else hops):
+                single[dpid] += 1
+            
+            # Multi-table: overrides along the alternate path of DQN-routed
+            # elephants, destination entries along the shortest path otherwise
+            if elephant and alternate != hops:
+                for dpid in alternate:
+                    overrides[dpid] += 1
+            else:
+                for dpid in hops:
+                    destinations[dpid].add(dst)
+    
+    base = num_classes + 3
+    multi = {dpid: base + len(destinations[dpid]) + overrides[dpid] for dpid in graph.nodes}
+    return {
+        'single': (sum(single.values()), max(single.values())),
+        'multi': (sum(multi.values()), max(multi.values()))
+    }
+
+
+if __name__ == "__main__":
+    # Rule-count comparison on fat-trees (k/2 hosts per edge switch, all-to-all traffic)
+    from controller.path_table import build_fattree_graph
+    from controller.qos_manager import L4_CLASS_RULES
+    
+    num_classes = sum(len(port_range_masks(first, last))
+                      for _, first, last, qos_class in L4_CLASS_RULES if qos_class != 'best_effort')
+    
+    for fat_k in (4, 8):
+        graph = build_fattree_graph(fat_k)
+        edges = [dpid for dpid in graph.nodes if dpid >= 3000]
+        counts = count_rules(graph, hosts_per_switch={dpid: fat_k // 2 for dpid in edges},
+                             num_classes=num_classes)
+        hosts = len(edges) * fat_k // 2
+        print(f"Fat-tree k={fat_k}: {graph.number_of_nodes()} switches, {hosts} hosts, "
+              f"5% DQN-routed elephants")
+        print(f"  Single table: {counts['single'][0]:>7} rules, max {counts['single'][1]:>5} per switch")
+        print(f"  Multi-table:  {counts['multi'][0]:>7} rules, max {counts['multi'][1]:>5} per switch "
+              f"({num_classes} classification entries per switch)")
@@ -7,13 +7,41 @@ from ryu.base import app_manager
 from ryu.controller import ofp_event
 from ryu.controller.handler import set_ev_cls
 from ryu.ofproto import ofproto_v1_3
-from ryu.lib.packet import packet, ethernet, ipv4, tcp, udp, ether_types
 import subprocess
 import json
 
 import sys
 sys.path.append('..')
 from environment.config import QOS, TRAFFIC_CLASSIFICATION
+from controller.packet_parser import PacketHeaders, ETH_TYPE_IP, IPPROTO_TCP, IPPROTO_UDP
+
+# Application classification by L4 destination port: (ip_proto, first_port, last_port, class)
+# Shared by classify_traffic and the classification table of the multi-table pipeline
+L4_CLASS_RULES = (
+    # HTTP/HTTPS - Web traffic
+    (IPPROTO_TCP, 80, 80, 'web'),
+    (IPPROTO_TCP, 443, 443, 'web'),
+    (IPPROTO_TCP, 8080, 8080, 'web'),
+    # FTP/SSH - File transfer
+    (IPPROTO_TCP, 20, 22, 'best_effort'),
+    # Database
+    (IPPROTO_TCP, 3306, 3306, 'web'),
+    (IPPROTO_TCP, 5432, 5432, 'web'),
+    (IPPROTO_TCP, 27017, 27017, 'web'),
+    # VoIP (SIP, RTP)
+    (IPPROTO_UDP, 5060, 5064, 'voip'),
+    (IPPROTO_UDP, 10000, 19999, 'voip'),
+    # DNS
+    (IPPROTO_UDP, 53, 53, 'web'),
+    # Video streaming (RTSP, etc.)
+    (IPPROTO_UDP, 554, 554, 'video'),
+    (IPPROTO_UDP, 1935, 1935, 'video'),
+)
+
+# {(ip_proto, dst_port): class} - O(1) lookup on the PacketIn path
+_PORT_CLASSES = {(proto, port): qos_class
+                 for proto, first, last, qos_class in L4_CLASS_RULES
+                 for port in range(first, last + 1)}
 
 
 class QoSManager(app_manager.RyuApp):
@@ -36,6 +64,9 @@ class QoSManager(app_manager.RyuApp):
         # Flow to QoS class mapping
         self.flow_qos_mapping = {}  # {flow_key: qos_class}
         
+        # Shared FlowModQueue (set by the controller); None = send immediately
+        self.flow_queue = None
+        
         self.logger.info("QoS Manager initialized")
     
     def configure_switch_qos(self, dpid, ports):
@@ -102,50 +133,22 @@ class QoSManager(app_manager.RyuApp):
         except Exception as e:
             self.logger.error(f"Error configuring queues: {e}")
     
-    def classify_traffic(self, pkt):
+    def classify_traffic(self, headers):
         """
         Classify traffic based on packet characteristics
         Args:
-            pkt: parsed packet
+            headers: PacketHeaders from parse_packet (a parsed Ryu packet is also accepted)
         Returns:
             QoS class name
         """
-        eth = pkt.get_protocol(ethernet.ethernet)
+        if not isinstance(headers, PacketHeaders):
+            headers = PacketHeaders.from_packet(headers)
+            if headers is None:
+                return 'best_effort'
         
-        # Check IP packet
-        if eth.ethertype == ether_types.ETH_TYPE_IP:
-            ip = pkt.get_protocol(ipv4.ipv4)
-            
-            if ip:
-                # Check TCP/UDP ports for application identification
-                tcp_pkt = pkt.get_protocol(tcp.tcp)
-                udp_pkt = pkt.get_protocol(udp.udp)
-                
-                if tcp_pkt:
-                    dst_port = tcp_pkt.dst_port
-                    
-                    # HTTP/HTTPS - Web traffic
-                    if dst_port in [80, 443, 8080]:
-                        return 'web'
-                    # FTP/SSH - File transfer
-                    elif dst_port in [20, 21, 22]:
-                        return 'best_effort'
-                    # Database
-                    elif dst_port in [3306, 5432, 27017]:
-                        return 'web'
-                
-                elif udp_pkt:
-                    dst_port = udp_pkt.dst_port
-                    
-                    # VoIP (SIP, RTP)
-                    if dst_port in range(5060, 5065) or dst_port in range(10000, 20000):
-                        return 'voip'
-                    # DNS
-                    elif dst_port == 53:
-                        return 'web'
-                    # Video streaming (RTSP, etc.)
-                    elif dst_port in [554, 1935]:
-                        return 'video'
+        # Check IP packet; TCP/UDP ports identify the application
+        if headers.ethertype == ETH_TYPE_IP and headers.dst_port is not None:
+            return _PORT_CLASSES.get((headers.ip_proto, headers.dst_port), 'best_effort')
         
         # Default to best effort
         return 'best_effort'
@@ -170,6 +173,8 @@ class QoSManager(app_manager.RyuApp):
             match: OpenFlow match
             queue_id: queue ID to use
             priority: flow priority
+        Returns:
+            Future confirming the flow (None without a flow queue)
         """
         ofproto = datapath.ofproto
         parser = datapath.ofproto_parser
@@ -191,8 +196,9 @@ class QoSManager(app_manager.RyuApp):
             hard_timeout=0
         )
         
-        datapath.send_msg(mod)
+        future = self._send(datapath, mod)
         self.logger.info(f"QoS flow installed on switch {datapath.id:016x} with queue {queue_id}")
+        return future
     
     def add_meter(self, datapath, meter_id, rate_kbps, burst_size_kb=100):
         """
@@ -202,6 +208,8 @@ class QoSManager(app_manager.RyuApp):
             meter_id: meter ID
             rate_kbps: rate limit in Kbps
             burst_size_kb: burst size in Kb
+        Returns:
+            Future confirming the meter (None without a flow queue)
         """
         ofproto = datapath.ofproto
         parser = datapath.ofproto_parser
@@ -223,7 +231,7 @@ class QoSManager(app_manager.RyuApp):
             bands=bands
         )
         
-        datapath.send_msg(req)
+        future = self._send(datapath, req)
         
         # Track meter
         dpid = datapath.id
@@ -236,6 +244,7 @@ class QoSManager(app_manager.RyuApp):
         }
         
         self.logger.info(f"Meter {meter_id} added to switch {dpid:016x}: {rate_kbps} Kbps")
+        return future
     
     def install_flow_with_meter(self, datapath, match, meter_id, out_port, priority=1):
         """
@@ -246,6 +255,8 @@ class QoSManager(app_manager.RyuApp):
             meter_id: meter ID
             out_port: output port
             priority: flow priority
+        Returns:
+            Future confirming the flow (None without a flow queue)
         """
         ofproto = datapath.ofproto
         parser = datapath.ofproto_parser
@@ -268,8 +279,20 @@ class QoSManager(app_manager.RyuApp):
             hard_timeout=0
         )
         
-        datapath.send_msg(mod)
+        future = self._send(datapath, mod)
         self.logger.info(f"Flow with meter {meter_id} installed on switch {datapath.id:016x}")
+        return future
+    
+    def _send(self, datapath, msg):
+        """
+        Send a FlowMod/MeterMod through the shared queue when available
+        Returns:
+            Future of the message, or None when sent directly
+        """
+        if self.flow_queue is not None:
+            return self.flow_queue.send(datapath, msg)
+        datapath.send_msg(msg)
+        return None
     
     def get_next_meter_id(self, dpid):
         """Get next available meter ID for a switch"""
@@ -286,22 +309,22 @@ class QoSManager(app_manager.RyuApp):
         Args:
             datapath: switch datapath
             pkt_in: PacketIn message
-            pkt: parsed packet
+            pkt: parsed packet (PacketHeaders or Ryu packet)
         """
+        if not isinstance(pkt, PacketHeaders):
+            pkt = PacketHeaders.from_packet(pkt)
+        
         # Classify traffic
         qos_class = self.classify_traffic(pkt)
         
         # Get appropriate queue
         queue_id = self.get_queue_id_for_class(qos_class)
         
-        # Extract match fields
-        eth = pkt.get_protocol(ethernet.ethernet)
-        
         parser = datapath.ofproto_parser
         match = parser.OFPMatch(
             in_port=pkt_in.match['in_port'],
-            eth_dst=eth.dst,
-            eth_src=eth.src
+            eth_dst=pkt.eth_dst,
+            eth_src=pkt.eth_src
         )
         
         # Install flow with QoS
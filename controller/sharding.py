@@ -0,0 +1,316 @@
+"""
+Sharding - Phân chia switch giữa nhiều tiến trình controller
+Băm nhất quán dpid lên các shard đang sống, đồng bộ topology và vị trí host qua kho trạng thái dùng chung
+"""
+
+import bisect
+import hashlib
+import time
+from collections import deque
+
+from ryu.lib import hub
+
+# State store namespaces
+NS_MEMBERS = 'members'  # {shard_id: last heartbeat (wall clock)}
+NS_LINKS = 'links'  # {"src:dst": [src_port, dst_port]}
+NS_HOSTS = 'hosts'  # {mac: [dpid, port]}
+
+
+class HashRing:
+    """Consistent hash ring of shard ids with virtual nodes"""
+    
+    def __init__(self, members=(), virtual_nodes=256):
+        """
+        Args:
+            members: shard ids on the ring
+            virtual_nodes: points per shard (smooths the partition sizes)
+        """
+        self.virtual_nodes = virtual_nodes
+        self.members = frozenset()
+        self._points = []
+        self._owners = []
+        self.set_members(members)
+    
+    @staticmethod
+    def _hash(value):
+        return int.from_bytes(hashlib.md5(str(value).encode()).digest()[:8], 'big')
+    
+    def set_members(self, members):
+        """Rebuild the ring; only the dpids of joining/leaving shards move"""
+        self.members = frozenset(members)
+        points = sorted((self._hash(f'{member}#{i}'), member)
+                        for member in self.members for i in range(self.virtual_nodes))
+        self._points = [point for point, _ in points]
+        self._owners = [member for _, member in points]
+    
+    def owner(self, dpid):
+        """Shard owning a switch (None if the ring is empty)"""
+        if not self._points:
+            return None
+        index = bisect.bisect(self._points, self._hash(f'dpid:{dpid}')) % len(self._points)
+        return self._owners[index]
+
+
+class ShardCoordinator:
+    """
+    Membership and state sharing of one controller shard
+    Every switch connects to all shards. The shard owning a dpid on the hash
+    ring of live shards handles its PacketIns and statistics; the others keep
+    an EQUAL-role connection they use only to write FlowMods, so a path
+    crossing partitions is installed by the shard that computed it. Shards
+    heartbeat into the state store; the ring is rebuilt when a shard joins or
+    its heartbeat expires. State published by one shard (links it discovered,
+    hosts learned on its edge ports) reaches the others through the store's
+    change sequence and is applied by the namespace subscribers. Writes
+    from event handlers are queued and stored by a writer green thread, so
+    a handler never waits on the store.
+    """
+    
+    def __init__(self, shard_id, store, virtual_nodes=256, heartbeat_interval=1.0,
+                 member_timeout=3.0, sync_interval=0.05, logger=None):
+        """
+        Args:
+            shard_id: id of this shard
+            store: StateStore shared by the shards
+            virtual_nodes: hash ring points per shard
+            heartbeat_interval: seconds between membership heartbeats
+            member_timeout: seconds without heartbeat before a shard is dropped
+            sync_interval: seconds between polls of the store change sequence
+            logger: logger for membership changes and errors
+        """
+        self.shard_id = str(shard_id)
+        self.store = store
+        self.heartbeat_interval = heartbeat_interval
+        self.member_timeout = member_timeout
+        self.sync_interval = sync_interval
+        self.logger = logger
+        
+        self.ring = HashRing([self.shard_id], virtual_nodes)
+        self._subscribers = {}  # {namespace: callback(key, value)}
+        self._ring_listeners = []
+        self._seq = 0
+        self._threads = []
+        self._outbox = deque()  # (namespace, key, value, deleted) in publish order
+        self._wakeup = hub.Event()
+        
+        # Statistics
+        self.published = 0
+        self.applied = 0
+        self.ring_changes = 0
+    
+    def start(self):
+        """Join the ring and start the heartbeat and sync threads"""
+        self._heartbeat()
+        self._threads = [hub.spawn(self._heartbeat_loop), hub.spawn(self._sync_loop),
+                         hub.spawn(self._write_loop)]
+    
+    def stop(self):
+        """Leave the ring"""
+        for thread in self._threads:
+            hub.kill(thread)
+        self._threads = []
+        self.store.delete(NS_MEMBERS, self.shard_id, origin=self.shard_id)
+    
+    # Ownership
+    
+    def owner(self, dpid):
+        return self.ring.owner(dpid)
+    
+    def owns(self, dpid):
+        """True if this shard handles the PacketIns and statistics of a switch"""
+        owner = self.ring.owner(dpid)
+        return owner is None or owner == self.shard_id
+    
+    def add_ring_listener(self, callback):
+        """Register callback() invoked after the set of live shards changed"""
+        self._ring_listeners.append(callback)
+    
+    # Shared state
+    
+    def subscribe(self, namespace, callback):
+        """
+        Apply the changes other shards write to a namespace
+        Args:
+            callback: callable(key, value); value None when the key was deleted
+        """
+        self._subscribers[namespace] = callback
+    
+    def publish(self, namespace, key, value):
+        self._outbox.append((namespace, key, value, False))
+        self._wakeup.set()
+    
+    def withdraw(self, namespace, key):
+        self._outbox.append((namespace, key, None, True))
+        self._wakeup.set()
+    
+    def _write_loop(self):
+        """Store queued publishes and withdrawals in order"""
+        while True:
+            self._wakeup.wait()
+            self._wakeup.clear()
+            while self._outbox:
+                namespace, key, value, deleted = self._outbox.popleft()
+                try:
+                    if deleted:
+                        self.store.delete(namespace, key, origin=self.shard_id)
+                    else:
+                        self.store.put(namespace, key, value, origin=self.shard_id)
+                    self.published += 1
+                except Exception as e:
+                    if self.logger:
+                        self.logger.error(f"Error publishing shard state: {e}")
+    
+    def sync(self):
+        """Apply every change written by other shards since the last sync"""
+        for seq, namespace, key, value, origin in self.store.changes_since(self._seq):
+            self._seq = seq
+            if origin == self.shard_id:
+                continue
+            callback = self._subscribers.get(namespace)
+            if callback is not None:
+                callback(key, value)
+                self.applied += 1
+    
+    def _sync_loop(self):
+        while True:
+            try:
+                self.sync()
+            except Exception as e:
+                if self.logger:
+                    self.logger.error(f"Error syncing shard state: {e}")
+            hub.sleep(self.sync_interval)
+    
+    # Membership
+    
+    def _heartbeat(self):
+        now = time.time()
+        self.store.put(NS_MEMBERS, self.shard_id, now, origin=self.shard_id)
+        live = {member for member, seen in self.store.items(NS_MEMBERS).items()
+                if now - seen <= self.member_timeout}
+        live.add(self.shard_id)
+        
+        if live != self.ring.members:
+            self.ring.set_members(live)
+            self.ring_changes += 1
+            if self.logger:
+                self.logger.info(f"Shard {self.shard_id}: live shards {sorted(live)}")
+            for callback in self._ring_listeners:
+                callback()
+    
+    def _heartbeat_loop(self):
+        while True:
+            hub.sleep(self.heartbeat_interval)
+            try:
+                self._heartbeat()
+            except Exception as e:
+                if self.logger:
+                    self.logger.error(f"Error in shard heartbeat: {e}")
+    
+    def get_statistics(self):
+        """Get shard membership and sync counters"""
+        return {
+            'shard_id': self.shard_id,
+            'live_shards': sorted(self.ring.members),
+            'ring_changes': self.ring_changes,
+            'published': self.published,
+            'queued': len(self._outbox),
+            'applied': self.applied,
+            'store_seq': self._seq
+        }
+
+
+def _benchmark_shard(shard_id, num_shards, store_path, events, ready, start, results):
+    """One shard process of the scaling benchmark"""
+    from controller.state_store import SQLiteStateStore
+    from controller.topology import TopologyGraph
+    from controller.packet_parser import parse_packet
+    
+    store = SQLiteStateStore(store_path)
+    ring = HashRing([str(i) for i in range(num_shards)])
+    
+    # Topology comes from the store, as in a real shard
+    topology = TopologyGraph(k_paths=4)
+    for key, (src_port, dst_port) in store.items(NS_LINKS).items():
+        src, dst = map(int, key.split(':'))
+        topology.add_link(src, dst, src_port, dst_port)
+    hosts = {mac: tuple(location) for mac, location in store.items(NS_HOSTS).items()}
+    
+    mine = [(dpid, frame) for dpid, frame in events if ring.owner(dpid) == str(shard_id)]
+    ready.put(shard_id)
+    start.wait()
+    
+    began = time.perf_counter()
+    cross_shard = 0
+    for dpid, frame in mine:
+        # PacketIn work of a shard: parse, host lookup, path lookup
+        headers = parse_packet(frame)
+        dst_dpid, _ = hosts[headers.eth_dst]
+        if dst_dpid != dpid:
+            paths = topology.path_table.get_paths(dpid, dst_dpid)
+            hops = topology.path_table.hops[paths[0]]
+            cross_shard += any(ring.owner(hop) != str(shard_id) for hop in hops)
+    results.put((shard_id, len(mine), cross_shard, time.perf_counter() - began))
+    store.close()
+
+
+if __name__ == "__main__":
+    # Scaling benchmark: PacketIns of a k=8 fat-tree (80 switches, 128 hosts)
+    # handled by 1..N shard processes sharing one SQLite state store
+    import os
+    import random
+    import tempfile
+    import multiprocessing
+    from controller.path_table import build_fattree_graph
+    from controller.packet_parser import _build_frame
+    from controller.state_store import SQLiteStateStore
+    
+    fat_k = 8
+    graph = build_fattree_graph(fat_k)
+    edges = sorted(dpid for dpid in graph.nodes if dpid >= 3000)
+    
+    store_path = os.path.join(tempfile.mkdtemp(), 'shard_state.db')
+    store = SQLiteStateStore(store_path)
+    for src, dst, data in graph.edges(data=True):
+        store.put(NS_LINKS, f'{src}:{dst}', [data['port'], data['dst_port']])
+    hosts = []
+    for dpid in edges:
+        for port in range(1, fat_k // 2 + 1):
+            mac = f'00:00:00:{dpid >> 8:02x}:{dpid & 0xff:02x}:{port:02x}'
+            store.put(NS_HOSTS, mac, [dpid, port])
+            hosts.append((mac, dpid, port))
+    
+    random.seed(1)
+    events = []
+    for _ in range(40000):
+        (src_mac, src_dpid, _), (dst_mac, _, _) = random.sample(hosts, 2)
+        events.append((src_dpid, _build_frame(src_mac, dst_mac, 6, random.randint(1024, 65535), 80)))
+    
+    ctx = multiprocessing.get_context('spawn')
+    print(f"Fat-tree k={fat_k}: {len(edges)} edge switches, {len(hosts)} hosts, "
+          f"{len(events)} PacketIns, {os.cpu_count()} CPU cores")
+    baseline = None
+    for num_shards in (1, 2, 4):
+        ready, results, start = ctx.Queue(), ctx.Queue(), ctx.Event()
+        procs = [ctx.Process(target=_benchmark_shard,
+                             args=(i, num_shards, store_path, events, ready, start, results))
+                 for i in range(num_shards)]
+        for proc in procs:
+            proc.start()
+        for _ in procs:
+            ready.get()
+        
+        began = time.perf_counter()
+        start.set()
+        shard_results = [results.get() for _ in procs]
+        elapsed = time.perf_counter() - began
+        for proc in procs:
+            proc.join()
+        
+        throughput = len(events) / elapsed
+        baseline = baseline or throughput
+        counts = [count for _, count, _, _ in shard_results]
+        cross = sum(c for _, _, c, _ in shard_results) / len(events)
+        print(f"  {num_shards} shard(s): {throughput:>8.0f} PacketIn/s (x{throughput / baseline:.2f}), "
+              f"largest partition {max(counts) / len(events) * 100:.0f}%, "
+              f"{cross * 100:.0f}% of paths cross shards")
+    store.close()
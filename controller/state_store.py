@@ -0,0 +1,197 @@
+"""
+State Store - Kho trạng thái dùng chung giữa các shard controller
+Lưu topology, vị trí host và thành viên shard dưới dạng key-value có số thứ tự thay đổi; backend trong tiến trình hoặc SQLite
+"""
+
+import json
+import os
+import sqlite3
+import threading
+
+from eventlet import patcher, tpool
+
+
+class StateStore:
+    """
+    Key-value store shared by controller shards
+    Values are JSON-serializable and grouped by namespace. Every write gets
+    a store-wide sequence number, and deletions are kept as tombstones, so
+    a shard can follow all changes incrementally with changes_since(). The
+    shard that wrote a change is recorded, which lets readers skip their own
+    writes.
+    """
+    
+    def put(self, namespace, key, value, origin=None):
+        """Write a value; returns its sequence number"""
+        raise NotImplementedError
+    
+    def delete(self, namespace, key, origin=None):
+        """Delete a value (tombstone); returns its sequence number"""
+        raise NotImplementedError
+    
+    def get(self, namespace, key, default=None):
+        """Current value of a key"""
+        raise NotImplementedError
+    
+    def items(self, namespace):
+        """
+        Live entries of a namespace
+        Returns:
+            {key: value}
+        """
+        raise NotImplementedError
+    
+    def changes_since(self, seq):
+        """
+        Changes written after a sequence number, oldest first
+        Returns:
+            list of (seq, namespace, key, value, origin); value None for deletions
+        """
+        raise NotImplementedError
+    
+    def close(self):
+        pass
+
+
+class MemoryStateStore(StateStore):
+    """In-process backend (tests, shards running as threads of one process)"""
+    
+    def __init__(self):
+        self._entries = {}  # {(namespace, key): (seq, value, origin)}
+        self._seq = 0
+        self._lock = threading.Lock()
+    
+    def put(self, namespace, key, value, origin=None):
+        with self._lock:
+            self._seq += 1
+            # Round-trip through JSON so both backends return the same types
+            self._entries[(namespace, key)] = (self._seq, json.loads(json.dumps(value)),
+                                               None if origin is None else str(origin))
+            return self._seq
+    
+    def delete(self, namespace, key, origin=None):
+        with self._lock:
+            self._seq += 1
+            self._entries[(namespace, key)] = (self._seq, None, None if origin is None else str(origin))
+            return self._seq
+    
+    def get(self, namespace, key, default=None):
+        entry = self._entries.get((namespace, key))
+        if entry is None or entry[1] is None:
+            return default
+        return entry[1]
+    
+    def items(self, namespace):
+        return {key: value for (ns, key), (_, value, _) in list(self._entries.items())
+                if ns == namespace and value is not None}
+    
+    def changes_since(self, seq):
+        changes = [(entry_seq, ns, key, value, origin)
+                   for (ns, key), (entry_seq, value, origin) in list(self._entries.items())
+                   if entry_seq > seq]
+        changes.sort()
+        return changes
+
+
+class SQLiteStateStore(StateStore):
+    """
+    SQLite backend shared by shard processes on one host
+    Each process opens its own connection to the same file (WAL mode).
+    Sequence numbers are assigned under the database write lock, so
+    readers always observe them in commit order. Database calls run in a
+    native thread (eventlet tpool): waiting up to `timeout` for another
+    shard's write lock only blocks the calling green thread, never the
+    controller's event loop.
+    """
+    
+    def __init__(self, path, timeout=5.0):
+        """
+        Args:
+            path: database file
+            timeout: seconds to wait for the write lock
+        """
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, timeout=timeout, isolation_level=None,
+                                     check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.execute('CREATE TABLE IF NOT EXISTS state ('
+                           'namespace TEXT NOT NULL, key TEXT NOT NULL, value TEXT, '
+                           'origin TEXT, seq INTEGER NOT NULL, PRIMARY KEY (namespace, key))')
+        self._conn.execute('CREATE INDEX IF NOT EXISTS state_seq ON state (seq)')
+        # Calls from different green threads run in different pool threads
+        self._lock = patcher.original('threading').Lock()
+    
+    def _call(self, func, *args):
+        """Run a database call in the native thread pool, one at a time"""
+        return tpool.execute(self._locked, func, *args)
+    
+    def _locked(self, func, *args):
+        with self._lock:
+            return func(*args)
+    
+    def _write(self, namespace, key, value, origin):
+        conn = self._conn
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            seq = conn.execute('SELECT COALESCE(MAX(seq), 0) + 1 FROM state').fetchone()[0]
+            conn.execute('INSERT OR REPLACE INTO state VALUES (?, ?, ?, ?, ?)',
+                         (namespace, key, value, None if origin is None else str(origin), seq))
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        return seq
+    
+    def put(self, namespace, key, value, origin=None):
+        return self._call(self._write, namespace, key, json.dumps(value), origin)
+    
+    def delete(self, namespace, key, origin=None):
+        return self._call(self._write, namespace, key, None, origin)
+    
+    def get(self, namespace, key, default=None):
+        return self._call(self._get, namespace, key, default)
+    
+    def items(self, namespace):
+        return self._call(self._items, namespace)
+    
+    def changes_since(self, seq):
+        return self._call(self._changes_since, seq)
+    
+    def _get(self, namespace, key, default):
+        row = self._conn.execute('SELECT value FROM state WHERE namespace = ? AND key = ?',
+                                 (namespace, key)).fetchone()
+        if row is None or row[0] is None:
+            return default
+        return json.loads(row[0])
+    
+    def _items(self, namespace):
+        rows = self._conn.execute('SELECT key, value FROM state '
+                                  'WHERE namespace = ? AND value IS NOT NULL', (namespace,))
+        return {key: json.loads(value) for key, value in rows}
+    
+    def _changes_since(self, seq):
+        rows = self._conn.execute('SELECT seq, namespace, key, value, origin FROM state '
+                                  'WHERE seq > ? ORDER BY seq', (seq,))
+        return [(row_seq, namespace, key, None if value is None else json.loads(value), origin)
+                for row_seq, namespace, key, value, origin in rows]
+    
+    def close(self):
+        self._call(self._conn.close)
+
+
+def create_store(backend='sqlite', path=None):
+    """
+    Build a state store backend
+    Args:
+        backend: 'memory' or 'sqlite'
+        path: database file ('sqlite')
+    """
+    if backend == 'memory':
+        return MemoryStateStore()
+    if backend == 'sqlite':
+        return SQLiteStateStore(path)
+    raise ValueError(f"Unknown state store backend: {backend}")
@@ -0,0 +1,298 @@
+"""
+Port Stats Store - Lưu chuỗi thời gian thống kê cổng bằng ring buffer NumPy
+Mảng cấp phát trước cho từng (dpid, port): tốc độ byte, packet, drop, error và mức sử dụng; truy vấn cửa sổ vector hóa
+"""
+
+import numpy as np
+
+# Counters of an OFPPortStats entry, in column order
+COUNTERS = ('tx_bytes', 'rx_bytes', 'tx_packets', 'rx_packets',
+            'tx_dropped', 'rx_dropped', 'tx_errors', 'rx_errors')
+
+# Series kept per sample: per-second rate of every counter, then utilization (%)
+FIELDS = COUNTERS + ('utilization',)
+FIELD_INDEX = {name: index for index, name in enumerate(FIELDS)}
+UTILIZATION = FIELD_INDEX['utilization']
+
+
+class PortStatsStore:
+    """
+    Fixed-size time series of port statistics
+    Every port has a column (its LinkIndex slot) in preallocated arrays of
+    shape (retention, capacity), one per field, plus sample times; each
+    column is a ring of the port's last `retention` samples. A sample holds
+    the per-second rates of the eight port counters over the last polling
+    interval and the link utilization derived from the byte rates, tagged
+    with the polling epoch it belongs to. The raw
+    counters of the last reply are kept to compute the next rates, so
+    memory is fixed at construction whatever the polling history.
+    Appending a reply is a handful of vectorized scatters; window() returns
+    the last N samples of every port as one (N, ports) array.
+    """
+    
+    def __init__(self, link_index, retention=64, link_capacity_mbps=10.0):
+        """
+        Args:
+            link_index: LinkIndex assigning the columns (its capacity bounds the ports)
+            retention: samples kept per port
+            link_capacity_mbps: link speed utilization is relative to
+        """
+        self.link_index = link_index
+        self.retention = retention
+        self.link_capacity_mbps = link_capacity_mbps
+        capacity = link_index.capacity
+        
+        self._series = np.zeros((len(FIELDS), retention, capacity), dtype=np.float32)
+        self._times = np.zeros((retention, capacity), dtype=np.float64)
+        self._epochs = np.full((retention, capacity), -1, dtype=np.int32)
+        self._count = np.zeros(capacity, dtype=np.int64)  # samples written per port
+        
+        # Counters of the previous reply (time 0: none since the switch connected)
+        self._counters = np.zeros((len(COUNTERS), capacity), dtype=np.uint64)
+        self._counter_time = np.zeros(capacity, dtype=np.float64)
+        
+        # Newest sample of every field (zeroed while a switch is disconnected)
+        self.latest = np.zeros((len(FIELDS), capacity), dtype=np.float32)
+    
+    def append(self, dpid, ports, counters, now, epoch=0):
+        """
+        Record one port stats reply
+        Args:
+            dpid: switch
+            ports: port numbers of the reply
+            counters: array-like (len(ports), len(COUNTERS)) in COUNTERS order
+            now: time of the reply
+            epoch: polling round the reply answers
+        Returns:
+            (ports, slots) arrays of the ports that got a sample (ports seen
+            for the first time only have their counters stored)
+        """
+        slots = [self.link_index.slot(dpid, port) for port in ports]
+        keep = [i for i, slot in enumerate(slots) if slot is not None]
+        if not keep:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+        
+        ports = np.asarray(ports, dtype=np.int64)[keep]
+        slots = np.asarray([slots[i] for i in keep], dtype=np.int64)
+        counters = np.asarray(counters, dtype=np.uint64)[keep].T
+        
+        previous = self._counter_time[slots]
+        elapsed = now - previous
+        fresh = (previous > 0) & (elapsed > 0)
+        old = self._counters[:, slots]
+        self._counters[:, slots] = counters
+        self._counter_time[slots] = now
+        if not fresh.any():
+            return ports[:0], slots[:0]
+        
+        # A counter lower than before was reset: no traffic counted for the interval
+        new, old = counters[:, fresh], old[:, fresh]
+        delta = np.where(new >= old, new - old, 0).astype(np.float64)
+        rates = delta / elapsed[fresh]
+        utilization = (rates[0] + rates[1]) * 4e-4 / self.link_capacity_mbps  # avg of tx/rx, %
+        
+        slots = slots[fresh]
+        rows = self._count[slots] % self.retention
+        values = np.vstack([rates, utilization]).astype(np.float32)
+        self._series[:, rows, slots] = values
+        self._times[rows, slots] = now
+        self._epochs[rows, slots] = epoch
+        self._count[slots] += 1
+        self.latest[:, slots] = values
+        return ports[fresh], slots
+    
+    def forget_switch(self, dpid):
+        """Switch disconnected: drop its counters and latest values, keep its history"""
+        slots = self.link_index.switch_slots(dpid)
+        self._counter_time[slots] = 0.0
+        self.latest[:, slots] = 0.0
+    
+    def _rows(self, n, count):
+        """Ring rows of the last n samples (oldest first) and which of them exist"""
+        steps = np.arange(n)[:, np.newaxis]
+        rows = (count - n + steps) % self.retention
+        valid = steps >= n - np.minimum(count, n)
+        return rows, valid
+    
+    def window(self, field, n, slots=None, fill=np.nan):
+        """
+        Last n samples of a field for many ports
+        Args:
+            field: name in FIELDS
+            n: samples (at most retention)
+            slots: columns to return (default every assigned slot, in slot order)
+            fill: value of samples a port does not have yet
+        Returns:
+            float32 array (n, ports), oldest sample first
+        """
+        n = min(n, self.retention)
+        if slots is None:
+            slots = np.arange(len(self.link_index))
+        rows, valid = self._rows(n, self._count[slots])
+        data = self._series[FIELD_INDEX[field]][rows, slots]
+        return np.where(valid, data, np.float32(fill))
+    
+    def aligned(self, field, last_epoch, n, slots=None):
+        """
+        One sample per polling epoch for many ports
+        Epochs a port has no sample for (lost reply, switch reconnecting,
+        reply not in yet) are interpolated linearly between the port's
+        measured neighbours and held flat before its first and after its
+        last measured sample in the range.
+        Args:
+            field: name in FIELDS
+            last_epoch: newest epoch of the window
+            n: epochs (last_epoch - n + 1 .. last_epoch, at most retention)
+            slots: columns to return (default every assigned slot, in slot order)
+        Returns:
+            (values, observed): float32 array (n, ports), oldest epoch first,
+            NaN for ports without any sample in the range; bool array of the
+            entries that were measured
+        """
+        n = min(n, self.retention)
+        if slots is None:
+            slots = np.arange(len(self.link_index))
+        slots = np.asarray(slots, dtype=np.int64)
+        rows, valid = self._rows(n, self._count[slots])
+        steps = np.arange(n)[:, np.newaxis]
+        columns = np.broadcast_to(np.arange(len(slots)), rows.shape)
+        
+        # Scatter the last n samples onto their epoch rows
+        offset = self._epochs[rows, slots] - (last_epoch - n + 1)
+        inside = valid & (offset >= 0) & (offset < n)
+        values = np.full((n, len(slots)), np.nan, dtype=np.float32)
+        observed = np.zeros((n, len(slots)), dtype=bool)
+        values[offset[inside], columns[inside]] = self._series[FIELD_INDEX[field]][rows, slots][inside]
+        observed[offset[inside], columns[inside]] = True
+        
+        # Nearest measured epoch before / after every entry
+        before = np.maximum.accumulate(np.where(observed, steps, -1), axis=0)
+        after = np.minimum.accumulate(np.where(observed, steps, n)[::-1], axis=0)[::-1]
+        low = np.take_along_axis(values, np.clip(before, 0, n - 1), axis=0)
+        high = np.take_along_axis(values, np.clip(after, 0, n - 1), axis=0)
+        both = (before >= 0) & (after < n)
+        weight = (steps - before) / np.maximum(after - before, 1)
+        filled = np.where(before >= 0, low, high)
+        filled = np.where(both, low + (high - low) * weight, filled)
+        return np.where(observed, values, filled).astype(np.float32), observed
+    
+    def times(self, n, slots=None):
+        """Sample times matching window() (0 where there is no sample)"""
+        n = min(n, self.retention)
+        if slots is None:
+            slots = np.arange(len(self.link_index))
+        rows, valid = self._rows(n, self._count[slots])
+        return np.where(valid, self._times[rows, slots], 0.0)
+    
+    def series(self, dpid, port, field, n):
+        """
+        Last samples of a field for one port
+        Returns:
+            float32 array of at most n samples, oldest first
+        """
+        slot = self.link_index.slot(dpid, port, create=False)
+        if slot is None:
+            return np.empty(0, dtype=np.float32)
+        n = min(n, self.retention, int(self._count[slot]))
+        rows = (self._count[slot] - n + np.arange(n)) % self.retention
+        return self._series[FIELD_INDEX[field], rows, slot]
+    
+    def snapshot(self):
+        """
+        Newest sample of every port that has one
+        Returns:
+            {dpid: {port: {raw counters of the last reply, tx/rx_speed_mbps,
+                           utilization, timestamp}}}
+        """
+        stats = {}
+        for (dpid, port), slot in self.link_index.items():
+            count = self._count[slot]
+            if not count:
+                continue
+            row = (count - 1) % self.retention
+            sample = {name: int(value) for name, value in zip(COUNTERS, self._counters[:, slot])}
+            sample['tx_speed_mbps'] = float(self._series[0, row, slot]) * 8e-6
+            sample['rx_speed_mbps'] = float(self._series[1, row, slot]) * 8e-6
+            sample['utilization'] = float(self._series[UTILIZATION, row, slot])
+            sample['timestamp'] = float(self._times[row, slot])
+            stats.setdefault(dpid, {})[port] = sample
+        return stats
+    
+    def sample_count(self, slots=None):
+        """Samples available per port (capped at retention)"""
+        count = self._count if slots is None else self._count[slots]
+        return np.minimum(count, self.retention)
+    
+    def memory_bytes(self):
+        """Bytes held by the preallocated arrays"""
+        return sum(array.nbytes for array in (self._series, self._times, self._epochs, self._count,
+                                              self._counters, self._counter_time, self.latest))
+    
+    def get_statistics(self):
+        """Get port count, samples held and memory"""
+        return {
+            'ports': len(self.link_index),
+            'capacity': self.link_index.capacity,
+            'retention': self.retention,
+            'samples': int(self.sample_count().sum()),
+            'memory_bytes': self.memory_bytes()
+        }
+
+
+if __name__ == "__main__":
+    # 10k ports polled every 5 s: append cost per switch reply, window query
+    # cost, and memory against the nested-dict samples kept by the monitor
+    import sys
+    import time
+    import tracemalloc
+    from controller.link_index import LinkIndex
+    
+    NUM_SWITCHES = 400
+    PORTS_PER_SWITCH = 25
+    ROUNDS = 80
+    
+    index = LinkIndex(NUM_SWITCHES * PORTS_PER_SWITCH)
+    store = PortStatsStore(index, retention=64)
+    rng = np.random.default_rng(1)
+    ports = list(range(1, PORTS_PER_SWITCH + 1))
+    totals = np.zeros((NUM_SWITCHES, PORTS_PER_SWITCH, len(COUNTERS)), dtype=np.uint64)
+    
+    append_time = 0.0
+    for step in range(ROUNDS):
+        now = 1000.0 + 5.0 * step
+        totals += rng.integers(0, 1 << 20, totals.shape, dtype=np.uint64)
+        for dpid in range(NUM_SWITCHES):
+            began = time.perf_counter()
+            store.append(dpid + 1, ports, totals[dpid], now, epoch=step)
+            append_time += time.perf_counter() - began
+    
+    began = time.perf_counter()
+    for _ in range(20):
+        window = store.window('utilization', 10)
+    window_ms = (time.perf_counter() - began) / 20 * 1000
+    
+    began = time.perf_counter()
+    for _ in range(20):
+        aligned, _ = store.aligned('utilization', ROUNDS - 1, 10)
+    aligned_ms = (time.perf_counter() - began) / 20 * 1000
+    
+    # Old layout: one dict of Python floats per port (latest sample only)
+    tracemalloc.start()
+    port_stats = {dpid: {port: {name: float(value) for name, value in
+                                zip(COUNTERS + ('tx_speed_mbps', 'rx_speed_mbps', 'timestamp'),
+                                    list(totals[dpid - 1, port - 1]) + [0.0, 0.0, now])}
+                         for port in ports} for dpid in range(1, NUM_SWITCHES + 1)}
+    dict_bytes = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    
+    stats = store.get_statistics()
+    print(f"{stats['ports']} ports, retention {stats['retention']} samples")
+    print(f"  Ring buffers:  {stats['memory_bytes'] / 1e6:.1f} MB fixed "
+          f"({stats['memory_bytes'] / stats['ports'] / stats['retention']:.0f} B/sample)")
+    print(f"  Nested dicts:  {dict_bytes / 1e6:.1f} MB for the latest sample only "
+          f"({dict_bytes / stats['ports']:.0f} B/sample)")
+    print(f"  append(): {append_time / (ROUNDS * NUM_SWITCHES) * 1e6:.0f} us per "
+          f"{PORTS_PER_SWITCH}-port reply")
+    print(f"  window('utilization', 10): {window.shape} in {window_ms:.2f} ms")
+    print(f"  aligned('utilization', epoch, 10): {aligned.shape} in {aligned_ms:.2f} ms")
+    sys.stdout.flush()
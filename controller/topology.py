@@ -0,0 +1,248 @@
+"""
+Topology Graph - Đồ thị topology cập nhật tăng dần
+Xử lý switch/link join-leave dưới dạng delta, kèm số phiên bản topology tăng đơn điệu
+"""
+
+from collections import deque
+
+import networkx as nx
+
+from controller.path_table import PathTable
+
+
+class TopologyGraph:
+    """
+    Switch graph maintained from topology deltas
+    Every effective change bumps `version`; caches and tables derived from the
+    topology can key on it. The path table is updated in deferred mode:
+    affected pairs are marked dirty and recomputed on refresh_paths() or on
+    their next lookup, so a burst of joins costs one recomputation.
+    """
+    
+    def __init__(self, k_paths=4):
+        """
+        Args:
+            k_paths: number of paths kept per switch pair
+        """
+        self.graph = nx.DiGraph()
+        self.version = 0
+        self.path_table = PathTable(self.graph, k=k_paths)
+        
+        # (dpid, port) pairs that connect to another switch
+        self.switch_ports = set()
+        
+        # All physical ports of each switch
+        self.ports = {}  # {dpid: set(port_no)}
+        
+        # Loop-free flooding: inter-switch ports on the broadcast tree
+        self._tree = {}  # {dpid: frozenset(port_no)}
+        self._tree_version = None
+        
+        self._listeners = []
+    
+    def add_listener(self, callback):
+        """Register callback(version) invoked after every topology change"""
+        self._listeners.append(callback)
+    
+    def _changed(self):
+        self.version += 1
+        for callback in self._listeners:
+            callback(self.version)
+    
+    def add_switch(self, dpid, ports=None):
+        """
+        Add a switch
+        Args:
+            ports: port numbers of the switch, if known
+        Returns:
+            True if the topology changed
+        """
+        if ports is not None:
+            self.ports[dpid] = set(ports)
+        if dpid in self.graph:
+            return False
+        
+        self.graph.add_node(dpid)
+        self._changed()
+        return True
+    
+    def remove_switch(self, dpid):
+        """Remove a switch together with its links"""
+        if dpid not in self.graph:
+            return False
+        
+        links = list(self.graph.in_edges(dpid)) + list(self.graph.out_edges(dpid))
+        for src, dst in links:
+            self.switch_ports.discard((src, self.graph[src][dst]['port']))
+        
+        self.graph.remove_node(dpid)
+        self.ports.pop(dpid, None)
+        for src, dst in links:
+            self.path_table.link_removed(src, dst, defer=True)
+        self.path_table.switch_removed(dpid)
+        
+        self._changed()
+        return True
+    
+    def add_link(self, src, dst, src_port, dst_port):
+        """
+        Add a unidirectional link src:src_port -> dst:dst_port
+        Returns:
+            True if the topology changed
+        """
+        if self.graph.has_edge(src, dst):
+            data = self.graph[src][dst]
+            if data['port'] == src_port and data['dst_port'] == dst_port:
+                return False
+            # Re-cabled: drop the old link first
+            self.remove_link(src, dst)
+        
+        self.graph.add_edge(src, dst, port=src_port, dst_port=dst_port)
+        self.switch_ports.add((src, src_port))
+        self.path_table.link_added(src, dst, defer=True)
+        
+        self._changed()
+        return True
+    
+    def remove_link(self, src, dst):
+        """Remove the link src -> dst"""
+        if not self.graph.has_edge(src, dst):
+            return False
+        
+        self.switch_ports.discard((src, self.graph[src][dst]['port']))
+        self.graph.remove_edge(src, dst)
+        self.path_table.link_removed(src, dst, defer=True)
+        
+        self._changed()
+        return True
+    
+    def refresh_paths(self):
+        """Recompute every path pair invalidated by earlier deltas"""
+        self.path_table.refresh()
+    
+    def is_switch_port(self, dpid, port):
+        """True if the port connects to another switch"""
+        return (dpid, port) in self.switch_ports
+    
+    def add_port(self, dpid, port):
+        self.ports.setdefault(dpid, set()).add(port)
+    
+    def remove_port(self, dpid, port):
+        self.ports.get(dpid, set()).discard(port)
+    
+    def broadcast_ports(self, dpid):
+        """Inter-switch ports of a switch that are on the broadcast tree"""
+        if self._tree_version != self.version:
+            self._tree = self._build_broadcast_tree()
+            self._tree_version = self.version
+        return self._tree.get(dpid, frozenset())
+    
+    def flood_ports(self, dpid):
+        """
+        Ports a broadcast leaves a switch through: its broadcast tree ports
+        and every port that does not connect to another switch
+        Returns:
+            sorted port list, or None if the switch's ports are unknown
+        """
+        ports = self.ports.get(dpid)
+        if not ports:
+            return None
+        host_ports = {port for port in ports if (dpid, port) not in self.switch_ports}
+        return sorted(host_ports | self.broadcast_ports(dpid))
+    
+    def _link_port(self, src, dst):
+        """Port of src facing dst (from either direction of the link)"""
+        if self.graph.has_edge(src, dst):
+            return self.graph[src][dst]['port']
+        return self.graph[dst][src]['dst_port']
+    
+    def _build_broadcast_tree(self):
+        """
+        Spanning forest of the switch graph
+        Breadth-first from the lowest dpid of every connected component, with
+        neighbors visited in dpid order, so all controllers (and shards)
+        derive the same tree from the same topology.
+        """
+        tree = {dpid: set() for dpid in self.graph}
+        visited = set()
+        for root in sorted(self.graph):
+            if root in visited:
+                continue
+            visited.add(root)
+            queue = deque([root])
+            while queue:
+                node = queue.popleft()
+                neighbors = set(self.graph.successors(node)) | set(self.graph.predecessors(node))
+                for neighbor in sorted(neighbors - visited):
+                    visited.add(neighbor)
+                    tree[node].add(self._link_port(node, neighbor))
+                    tree[neighbor].add(self._link_port(neighbor, node))
+                    queue.append(neighbor)
+        return {dpid: frozenset(ports) for dpid, ports in tree.items()}
+    
+    def get_statistics(self):
+        """Get topology size and version"""
+        return {
+            'version': self.version,
+            'switches': self.graph.number_of_nodes(),
+            'links': self.graph.number_of_edges()
+        }
+
+
+if __name__ == "__main__":
+    # Benchmark: bringing up a synthetic fat-tree one switch at a time,
+    # clear-and-rebuild on every join (old get_topology_data) vs deltas
+    import time
+    from controller.path_table import build_fattree_graph
+    
+    for fat_k in (4, 8, 16):
+        full = build_fattree_graph(fat_k)
+        join_order = list(full.nodes)
+        
+        # Old behaviour: each EventSwitchEnter re-reads every switch and link
+        graph = nx.DiGraph()
+        table = PathTable(graph, k=4)
+        rebuild_time = path_rebuild_time = 0.0
+        joined = set()
+        for dpid in join_order:
+            start = time.perf_counter()
+            joined.add(dpid)
+            switches = list(joined)
+            links = [(u, v, d) for u, v, d in full.edges(data=True)
+                     if u in joined and v in joined]
+            graph.clear()
+            graph.add_nodes_from(switches)
+            graph.add_edges_from(links)
+            rebuild_time += time.perf_counter() - start
+            
+            # Derived state is wiped too: the path table is rebuilt on every join
+            if fat_k == 4:
+                start = time.perf_counter()
+                table.rebuild()
+                path_rebuild_time += time.perf_counter() - start
+        
+        # New behaviour: switch + link deltas, one deferred path refresh
+        topology = TopologyGraph(k_paths=4)
+        start = time.perf_counter()
+        joined = set()
+        for dpid in join_order:
+            topology.add_switch(dpid)
+            joined.add(dpid)
+            for u, v, d in list(full.in_edges(dpid, data=True)) + list(full.out_edges(dpid, data=True)):
+                if u in joined and v in joined:
+                    topology.add_link(u, v, d['port'], d['dst_port'])
+        delta_time = time.perf_counter() - start
+        
+        start = time.perf_counter()
+        if fat_k <= 8:
+            topology.refresh_paths()
+        refresh_time = time.perf_counter() - start
+        
+        print(f"Fat-tree k={fat_k}: {full.number_of_nodes()} switches, "
+              f"{full.number_of_edges()} directed links, version {topology.version}")
+        print(f"  Clear-and-rebuild graph:  {rebuild_time*1000:.1f} ms")
+        if fat_k == 4:
+            print(f"  + path rebuild per join:  {path_rebuild_time*1000:.1f} ms")
+        print(f"  Incremental deltas:       {delta_time*1000:.1f} ms")
+        if fat_k <= 8:
+            print(f"  Deferred path refresh:    {refresh_time*1000:.1f} ms")
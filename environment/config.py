@@ -18,6 +18,16 @@ CONTROLLER = {
     'monitoring_interval': 5,  # seconds
     'flow_idle_timeout': 30,
     'flow_hard_timeout': 0,
+    'decision_cache_size': 4096,  # cached forwarding decisions
+    'decision_cache_ttl': 2,  # seconds - covers the FlowMod round trip
+    'path_refresh_delay': 0.5,  # seconds of topology quiet before recomputing paths
+    'path_refresh_chunk': 64,  # switch pairs computed per event-loop slice
+    'proactive_path_install': True,  # install rules on every hop from the first PacketIn
+    'path_install_timeout': 0.5,  # seconds to wait for downstream barrier replies
+    'flowmod_batch_size': 64,  # messages per switch before the queue flushes
+    'flowmod_flush_interval_ms': 1,  # max time a FlowMod waits to be batched
+    'flowmod_barrier_timeout': 2,  # seconds before an unconfirmed batch fails
+    'multi_table_pipeline': False,  # table 0 QoS classification, table 1 overrides, table 2 by destination
 }
 
 # AI Models Configuration
@@ -43,6 +53,28 @@ AI_MODELS = {
         'memory_size': 10000,
         'batch_size': 64,
         'target_update_frequency': 10,
+        'inference_batch_window_ms': 2,  # gather window for batched routing (0 = inline)
+        'inference_max_batch': 32,  # flush once this many requests are queued
+        'inference_max_delay_ms': 5,  # latency cap per routing request
+    },
+    'background_loading': True,  # answer switches at once, enable AI routing when the models are loaded
+    'warmup': True,  # run both models on a canned input before enabling AI routing (always on reloads)
+    'hot_reload': {
+        'enabled': True,  # reload the models when their weight files change
+        'poll_interval': 2.0,  # seconds between weight file checks
+    },
+    'inference_workers': {
+        'enabled': True,  # run DQN/LSTM inference in worker processes
+        'num_workers': 1,
+        'slots_per_worker': 64,  # concurrent requests per worker (shared-memory slots)
+        'request_timeout': 1.0,  # seconds
+    },
+    'scheduler': {
+        'congestion_threshold': 80.0,  # predicted utilization (%) considered congested
+        'prediction_steps': 5,
+        'min_spacing': 1.0,  # seconds between two prediction runs
+        'coalesce_window': 0.5,  # seconds a stats epoch waits for the rest of the polling round
+        'jump_threshold': 20.0,  # utilization change (points) that triggers a run at once
     },
     'traffic_classifier': {
         'model_type': 'random_forest',
@@ -95,6 +127,67 @@ TRAFFIC_CLASSIFICATION = {
     'ddos_detection_window': 10,  # seconds
 }
 
+# Top flows by rate from a Count-Min sketch fed with flow stats deltas
+HEAVY_HITTERS = {
+    'epsilon': 0.001,  # rate overestimate bound, as a fraction of the total rate
+    'delta': 0.01,  # probability of exceeding the bound
+    'candidates': 256,  # flows kept in the ranking (more than the expected elephants)
+    'half_life': 10,  # seconds; window of the recent rate
+}
+
+# Make-before-break rerouting of elephant flows on predicted congestion
+REROUTE = {
+    'enabled': True,
+    'max_reroutes_per_cycle': 8,  # churn cap: flows moved per cycle
+    'min_gain': 5.0,  # bottleneck utilization points a move must save
+    'hold_down': 30,  # seconds before a rerouted flow may move again
+    'phase_timeout': 2.0,  # seconds to wait for the barrier replies of a phase
+}
+
+# PacketIn Admission Control
+ADMISSION_CONTROL = {
+    'enabled': True,
+    'switch_rate': 2000,  # PacketIn/s handled per switch
+    'switch_burst': 4000,
+    'port_rate': 200,  # PacketIn/s handled per in_port
+    'port_burst': 400,
+    'policy': 'summarize',  # 'drop' (count only) or 'summarize' (periodic per-port report)
+    'summary_interval': 5,  # seconds
+    'mitigation': 'drop',  # temporary rule for flooding ports: 'drop', 'meter' or None
+    'mitigation_threshold': 500,  # shed PacketIns per second on a port before mitigating
+    'mitigation_duration': 30,  # seconds (hard timeout of the rule)
+    'mitigation_priority': 100,  # 'drop' rule, above every forwarding rule
+    'meter_priority': 1,  # 'meter' entry: below the path rules (2), above the table-miss
+}
+
+# Global host location table
+HOST_TABLE = {
+    'aging_time': 300,  # seconds without traffic before a host is forgotten
+    'aging_interval': 30,  # seconds between aging sweeps
+    'initial_capacity': 1024,  # rows preallocated (doubled when full)
+}
+
+# Broadcast handling
+BROADCAST = {
+    'arp_proxy': True,  # answer ARP requests for known hosts from the controller
+    'group_table': True,  # forward broadcasts along the broadcast tree with a group per switch
+    'group_id': 1,
+    'priority': 20,  # broadcast entries use priority..priority+2
+}
+
+# Sharded deployment: switches partitioned across controller processes
+SHARDING = {
+    'enabled': False,
+    'num_shards': 2,  # processes started by start.sh, shard i listens on CONTROLLER['port'] + i
+    'shard_id_env': 'SDN_SHARD_ID',  # environment variable holding a process's shard id
+    'store_backend': 'sqlite',  # 'sqlite' (shared by local processes) or 'memory' (single process)
+    'store_path': 'data/shard_state.db',
+    'virtual_nodes': 256,  # hash ring points per shard
+    'heartbeat_interval': 1.0,  # seconds
+    'member_timeout': 3.0,  # seconds without heartbeat before a shard's switches move
+    'sync_interval': 0.05,  # seconds between polls of the shared state
+}
+
 # Data Collection Configuration
 DATA_COLLECTION = {
     'enable_port_stats': True,
@@ -103,6 +196,26 @@ DATA_COLLECTION = {
     'save_to_file': True,
     'save_interval': 60,  # seconds
     'data_directory': 'data/collected/',
+    'max_links': 1024,  # switch ports with a stable column in the utilization arrays
+    'stats_retention': 64,  # port stats samples kept per port (ring buffer rows)
+    'link_capacity_mbps': 10.0,  # link speed port utilization is relative to
+    'polling': {
+        # Per-switch stats polling, staggered over CONTROLLER['monitoring_interval']
+        'min_interval': 1.0,  # seconds, switches near congestion or changing fast
+        'max_interval': 20.0,  # seconds, idle switches
+        'hot_utilization': 70.0,  # port utilization (%) polled faster
+        'idle_utilization': 5.0,  # port utilization (%) below which a switch backs off
+        'change_rate': 2.0,  # utilization points per second counted as changing fast
+        'request_budget': 200,  # stats requests per second across all switches
+    },
+    'latency': {
+        # Link latency probes (controller -> link -> controller, minus echo RTTs)
+        'probe_interval': 2.0,  # minimum seconds between probes of one link
+        'probe_budget': 100,  # probes per second across all links
+        'echo_interval': 2.0,  # seconds between echo requests to a switch
+        'ewma_alpha': 0.2,  # weight of a new sample in the smoothed latency / RTT
+        'max_probe_age': 2.0,  # seconds after which a probe counts as lost
+    },
     'csv_format': True,
     'influxdb': {
         'enabled': False,
@@ -144,6 +257,9 @@ LOGGING = {
 
 # Performance Metrics
 METRICS = {
+    'http_enabled': True,  # Prometheus text endpoint with handler latency histograms
+    'http_host': '127.0.0.1',
+    'http_port': 9750,  # shard i serves on http_port + i
     'window_size': 100,  # samples for moving average
     'report_interval': 30,  # seconds
     'metrics_to_track': [
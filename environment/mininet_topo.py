@@ -11,7 +11,24 @@ from mininet.link import TCLink
 
 import sys
 sys.path.append('..')
-from environment.config import TOPOLOGY, CONTROLLER as CTRL_CONFIG
+from environment.config import TOPOLOGY, SHARDING, CONTROLLER as CTRL_CONFIG
+
+
+def add_controllers(net):
+    """
+    Add the remote controller(s); one per shard when sharding is enabled
+    Shard i listens on CONTROLLER['port'] + i and every switch connects to all shards.
+    """
+    num_shards = SHARDING['num_shards'] if SHARDING['enabled'] else 1
+    return [
+        net.addController(
+            f'c{i}',
+            controller=RemoteController,
+            ip=CTRL_CONFIG['host'],
+            port=CTRL_CONFIG['port'] + i
+        )
+        for i in range(num_shards)
+    ]
 
 
 def create_simple_topology():
@@ -33,12 +50,7 @@ def create_simple_topology():
     )
     
     info('*** Adding controller\n')
-    controller = net.addController(
-        'c0',
-        controller=RemoteController,
-        ip=CTRL_CONFIG['host'],
-        port=CTRL_CONFIG['port']
-    )
+    add_controllers(net)
     
     info('*** Adding switches\n')
     switches = []
@@ -93,12 +105,7 @@ def create_fattree_topology(k=4):
     )
     
     info('*** Adding controller\n')
-    controller = net.addController(
-        'c0',
-        controller=RemoteController,
-        ip=CTRL_CONFIG['host'],
-        port=CTRL_CONFIG['port']
-    )
+    add_controllers(net)
     
     info('*** Creating Fat-Tree topology with k=%d\n' % k)
     
@@ -121,8 +121,16 @@ start_controller() {
     # Kill existing controller if any
     pkill -9 -f "ryu-manager" 2>/dev/null || true
     
-    # Start controller in background
-    nohup ryu-manager controller/main_controller.py > logs/controller.log 2>&1 &
+    # Start controller in background (one process per shard when sharding is enabled)
+    SHARDS=$(python -c "from environment.config import SHARDING; print(SHARDING['num_shards'] if SHARDING['enabled'] else 1)")
+    if [ "$SHARDS" -gt 1 ]; then
+        for ((i = 0; i < SHARDS; i++)); do
+            SDN_SHARD_ID=$i nohup ryu-manager --observe-links --ofp-tcp-listen-port $((6633 + i)) \
+                controller/main_controller.py > logs/controller_$i.log 2>&1 &
+        done
+    else
+        nohup ryu-manager --observe-links controller/main_controller.py > logs/controller.log 2>&1 &
+    fi
     
     sleep 3
     